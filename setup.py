@@ -24,9 +24,14 @@ setup(
         "openpyxl",
         "xlsxwriter",
     ],
+    extras_require={
+        "lxml": ["lxml"],
+        "parquet": ["pyarrow"],
+    },
     entry_points={
         "console_scripts": [
-            "iso20022-toolbox=swift_iso20022_toolbox.iso20022_toolbox:main",
+            "iso20022=swift_iso20022_toolbox.cli:main",
+            "iso20022-toolbox=swift_iso20022_toolbox.cli:run_ui",
         ]
     },
     include_package_data=True,
@@ -13,6 +13,9 @@ Features:
     - Legend: Column names and descriptions
     - Process_Metadata: Script name, timestamp, processing stats
     - Process_FilesList: Mapping of each file to its Restricted_Base_Message
+- The folder may also be a zip/tar/gzip archive of Excel files; members are read without extracting them.
+
+- Optional per-stage timings and counters (`--metrics-json`, `--metrics-prom`).
 
 Usage:
 - As a script (default folder: CBPRPlus_SR2025_Excel):
@@ -30,28 +33,39 @@ Output:
 - CBPRPlus_SR2025_Metadata_Aggregated.xlsx (with multiple sheets)
 """
 
-import os
-import pandas as pd
-from openpyxl import load_workbook
-
-
-
 import argparse
 
-def aggregate_excel_folder(folder='CBPRPlus_SR2025_Excel'):
+from swift_iso20022_toolbox import instrumentation
+from swift_iso20022_toolbox.instrumentation import get_instrumentation
+
+def aggregate_excel_folder(folder='CBPRPlus_SR2025_Excel', output_path='CBPRPlus_SR2025_Metadata_Aggregated.xlsx', fileobj=None):
+    """
+    Aggregate the Excel files of `folder` into `output_path` (a path or a binary file object).
+    `folder` may also be a zip/tar/gzip archive of Excel files, read without extracting it to disk;
+    with `fileobj`, `folder` is the name of an in-memory archive.
+    """
+    import io
     import os
     import pandas as pd
     from openpyxl import load_workbook
     from datetime import datetime
+    from swift_iso20022_toolbox.sources import read_sources
 
-    folder_path = os.path.join(os.path.dirname(__file__), folder)
+    inst = get_instrumentation()
+    folder_path = folder if fileobj is not None else os.path.join(os.path.dirname(__file__), folder)
     all_rows = []
 
-    for filename in os.listdir(folder_path):
+    # Each workbook is read once (from disk or from the archive) and kept in memory for the passes below
+    with inst.stage('read'):
+        excel_files = [(filename, content) for _, filename, content in read_sources(folder_path, ('.xlsx',), fileobj=fileobj)]
+
+    for filename, content in excel_files:
         if filename.endswith('.xlsx'):
-            file_path = os.path.join(folder_path, filename)
             try:
-                wb = load_workbook(file_path, data_only=True)
+                with inst.stage('read'):
+                    wb = load_workbook(io.BytesIO(content), data_only=True)
+                inst.add('files')
+                inst.add('bytes', len(content))
                 # --- Extract Metadata ---
                 metadata = {'Source_File': filename}
                 if 'General Information' in wb.sheetnames:
@@ -66,19 +80,21 @@ def aggregate_excel_folder(folder='CBPRPlus_SR2025_Excel'):
                     continue
                 # --- Extract Full_View Data ---
                 if 'Full_View' in wb.sheetnames:
-                    df_full_view = pd.read_excel(file_path, sheet_name='Full_View')
-                    for _, row in df_full_view.iterrows():
-                        row_dict = {}
-                        # Add Restricted_Base_Message first
-                        row_dict['Restricted_Base_Message'] = metadata.get('Restricted_Base_Message')
-                        # Add Full_View data
-                        row_dict.update(row.to_dict())
-                        # Add remaining metadata (excluding Restricted_Base_Message)
-                        for k, v in metadata.items():
-                            if k not in ('Restricted_Base_Message', 'Source_File'):
-                                row_dict[k] = v
-                        row_dict['Source_File'] = filename
-                        all_rows.append(row_dict)
+                    with inst.stage('read'):
+                        df_full_view = pd.read_excel(io.BytesIO(content), sheet_name='Full_View')
+                    with inst.stage('aggregate'):
+                        for _, row in df_full_view.iterrows():
+                            row_dict = {}
+                            # Add Restricted_Base_Message first
+                            row_dict['Restricted_Base_Message'] = metadata.get('Restricted_Base_Message')
+                            # Add Full_View data
+                            row_dict.update(row.to_dict())
+                            # Add remaining metadata (excluding Restricted_Base_Message)
+                            for k, v in metadata.items():
+                                if k not in ('Restricted_Base_Message', 'Source_File'):
+                                    row_dict[k] = v
+                            row_dict['Source_File'] = filename
+                            all_rows.append(row_dict)
                 else:
                     print(f"Warning: 'Full_View' tab not found in {filename}")
             except Exception as e:
@@ -86,7 +102,9 @@ def aggregate_excel_folder(folder='CBPRPlus_SR2025_Excel'):
 
     # Create DataFrame and export
     if all_rows:
-        df = pd.DataFrame(all_rows)
+        with inst.stage('aggregate'):
+            df = pd.DataFrame(all_rows)
+        inst.add('rows', len(df))
         # Remove specific columns if they exist
         if 'Usage_Guideline_Description' in df.columns:
             df = df.drop(columns=['Usage_Guideline_Description'])
@@ -102,12 +120,13 @@ def aggregate_excel_folder(folder='CBPRPlus_SR2025_Excel'):
         # Prepare the Legend sheet (from the first file)
         legend_data = []
         first_file = None
-        for filename in os.listdir(folder_path):
+        for filename, content in excel_files:
             if filename.endswith('.xlsx'):
-                first_file = os.path.join(folder_path, filename)
+                first_file = content
                 break
         if first_file:
-            wb = load_workbook(first_file, data_only=True)
+            with inst.stage('read'):
+                wb = load_workbook(io.BytesIO(first_file), data_only=True)
             if 'General Information' in wb.sheetnames:
                 ws = wb['General Information']
                 for row in ws.iter_rows(min_row=22, max_row=46, min_col=2, max_col=3, values_only=True):
@@ -126,11 +145,11 @@ def aggregate_excel_folder(folder='CBPRPlus_SR2025_Excel'):
 
         # Prepare Process_FilesList sheet from General Information metadata
         files_list = []
-        for filename in os.listdir(folder_path):
+        for filename, content in excel_files:
             if filename.endswith('.xlsx'):
-                file_path = os.path.join(folder_path, filename)
                 try:
-                    wb = load_workbook(file_path, data_only=True)
+                    with inst.stage('read'):
+                        wb = load_workbook(io.BytesIO(content), data_only=True)
                     if 'General Information' in wb.sheetnames:
                         ws = wb['General Information']
                         restricted_base_message = None
@@ -144,17 +163,27 @@ def aggregate_excel_folder(folder='CBPRPlus_SR2025_Excel'):
         process_fileslist_df = pd.DataFrame(files_list)
 
         # Write to Excel with custom sheet names
-        with pd.ExcelWriter('CBPRPlus_SR2025_Metadata_Aggregated.xlsx', engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='CBPRPlus_XSD_Full_View', index=False)
-            legend_df.to_excel(writer, sheet_name='Legend', index=False)
-            process_metadata_df.to_excel(writer, sheet_name='Process_Metadata', index=False)
-            process_fileslist_df.to_excel(writer, sheet_name='Process_FilesList', index=False)
+        with inst.stage('write'):
+            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+                df.to_excel(writer, sheet_name='CBPRPlus_XSD_Full_View', index=False)
+                legend_df.to_excel(writer, sheet_name='Legend', index=False)
+                process_metadata_df.to_excel(writer, sheet_name='Process_Metadata', index=False)
+                process_fileslist_df.to_excel(writer, sheet_name='Process_FilesList', index=False)
         print('Aggregation complete. Output saved as CSV and Excel.')
+        return output_path
     else:
         print('No data extracted.')
+        return None
 
-if __name__ == "__main__":
+def main():
     parser = argparse.ArgumentParser(description="Aggregate ISO20022 Swift Payment Messages Excel Documentation")
-    parser.add_argument('--folder', type=str, default='CBPRPlus_SR2025_Excel', help='Folder containing Excel files (default: CBPRPlus_SR2025_Excel)')
+    parser.add_argument('--folder', type=str, default='CBPRPlus_SR2025_Excel', help='Folder (or zip/tar/gzip archive) containing Excel files (default: CBPRPlus_SR2025_Excel)')
+    parser.add_argument('--metrics-json', type=str, default=None, help='Append run timings and counters as a JSON line to this file')
+    parser.add_argument('--metrics-prom', type=str, default=None, help='Write run timings and counters in Prometheus text format to this file')
     args = parser.parse_args()
+    inst = instrumentation.enable('aggregate_metadata') if args.metrics_json or args.metrics_prom else get_instrumentation()
     aggregate_excel_folder(args.folder)
+    instrumentation.export(inst, json_log=args.metrics_json, prometheus=args.metrics_prom)
+
+if __name__ == "__main__":
+    main()
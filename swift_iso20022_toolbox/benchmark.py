@@ -0,0 +1,421 @@
+"""
+ISO20022 Toolbox Benchmark Suite
+--------------------------------
+Times the toolbox entry points on a synthetic XML corpus and on the baseline `data/` folders, and saves
+the results as JSON so that runs can be compared for performance regressions.
+
+Benchmarks:
+- `parse_xml_to_xpath_and_value` per generated message type (pacs.008, pacs.009, camt.053, pain.001)
+- `parse_messages` on a generated bulk file of pacs.008 messages (10 x the preset message count)
+- `extract_metadata_from_xsd` on `data/sample_xsd_plain_baseline`
+- `aggregate_excel_folder` on `data/sample_xsd_excel_baseline`
+- With `--backends`: `parse_messages` per XML parser backend (etree, lxml, lxml-iterparse, expat) on the
+  same files, with the peak memory of a fresh interpreter per backend, and a check that every backend
+  returns the same rows and metadata as etree on the corpus and `data/sample_xml_edge_cases` (malformed
+  files: the same error outcome)
+- Cold start of the `iso20022` CLI (`--help` and a one-file `xpath --text-only` run) in fresh interpreters,
+  checked against `STARTUP_BUDGET_SECONDS` and against heavy modules being imported
+
+Benchmarks whose dependencies are missing (e.g. pandas) are recorded as skipped.
+
+Usage Example:
+    python -m swift_iso20022_toolbox.benchmark --size small --output bench_results.json
+    python -m swift_iso20022_toolbox.benchmark --corpus ./corpus --compare bench_results.json --tolerance 0.2
+    python -m swift_iso20022_toolbox.benchmark --size medium --backends
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, List
+
+from swift_iso20022_toolbox.generate_messages import MESSAGE_TYPES, generate_corpus
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+DEFAULT_XSD_FOLDER = os.path.join(DATA_FOLDER, 'sample_xsd_plain_baseline')
+DEFAULT_EXCEL_FOLDER = os.path.join(DATA_FOLDER, 'sample_xsd_excel_baseline')
+DEFAULT_EDGE_CASE_FOLDER = os.path.join(DATA_FOLDER, 'sample_xml_edge_cases')
+
+# Corpus presets: messages per single-transaction type, entries in the camt.053 statement
+SIZES = {
+    'small': {'messages': 20, 'entries': 100},
+    'medium': {'messages': 200, 'entries': 5000},
+    'large': {'messages': 2000, 'entries': 100000},
+}
+
+# Cold-start budget for one small CLI invocation (interpreter start included)
+STARTUP_BUDGET_SECONDS = 0.25
+HEAVY_MODULES = ('pandas', 'openpyxl', 'streamlit')
+
+
+def _time_call(func: Callable, repeat: int):
+    """Run `func` `repeat` times with stdout silenced; return (timings, last result)."""
+    timings = []
+    result = None
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(max(repeat, 1)):
+            with contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                result = func()
+                timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def _record(name: str, timings: List[float], rows: int = 0, files: int = 0, size_bytes: int = 0) -> dict:
+    best = min(timings)
+    return {
+        'name': name,
+        'status': 'ok',
+        'files': files,
+        'rows': rows,
+        'bytes': size_bytes,
+        'seconds_min': best,
+        'seconds_median': statistics.median(timings),
+        'repeat': len(timings),
+        'rows_per_sec': rows / best if best else None,
+        'mb_per_sec': size_bytes / 1e6 / best if best and size_bytes else None,
+    }
+
+
+def _skipped(name: str, error: Exception) -> dict:
+    return {'name': name, 'status': 'skipped', 'reason': f"{type(error).__name__}: {error}"}
+
+
+def bench_xpath(files: List[str], name: str, repeat: int = 3) -> dict:
+    """Time parse_xml_to_xpath_and_value over a list of XML files."""
+    from swift_iso20022_toolbox.xml_to_xpath import parse_xml_to_xpath_and_value
+
+    def run():
+        return sum(len(parse_xml_to_xpath_and_value(path)[0]) for path in files)
+
+    timings, rows = _time_call(run, repeat)
+    return _record(name, timings, rows=rows, files=len(files), size_bytes=sum(os.path.getsize(p) for p in files))
+
+
+def bench_messages(files: List[str], name: str, repeat: int = 3) -> dict:
+    """Time parse_messages (per-message splitting) over a list of XML files."""
+    from swift_iso20022_toolbox.xml_to_xpath import parse_messages
+
+    def run():
+        return sum(len(result[0]) for path in files for result in parse_messages(path))
+
+    timings, rows = _time_call(run, repeat)
+    return _record(name, timings, rows=rows, files=len(files), size_bytes=sum(os.path.getsize(p) for p in files))
+
+
+def _peak_memory_mb(files: List[str], backend: str) -> float:
+    """
+    Growth of the peak RSS (MB) of a fresh interpreter while parse_messages runs over `files` with `backend`
+    (after the imports). The peak is VmHWM where /proc is available: on Linux, ru_maxrss keeps the parent's
+    peak from before the exec, which hides the growth.
+    """
+    probe = (
+        "import json, resource, sys\n"
+        "from swift_iso20022_toolbox.xml_backends import get_backend\n"
+        "from swift_iso20022_toolbox.xml_to_xpath import parse_messages\n"
+        "files, backend = json.loads(sys.argv[1])\n"
+        "get_backend(backend)\n"
+        "def peak_kb():\n"
+        "    try:\n"
+        "        with open('/proc/self/status') as f:\n"
+        "            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))\n"
+        "    except (OSError, StopIteration):\n"
+        "        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform == 'darwin' else 1)\n"
+        "before = peak_kb()\n"
+        "for path in files:\n"
+        "    for _ in parse_messages(path, backend=backend):\n"
+        "        pass\n"
+        "print((peak_kb() - before) / 1024)\n"
+    )
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_root, env.get('PYTHONPATH')]))
+    completed = subprocess.run([sys.executable, '-c', probe, json.dumps([files, backend])], env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, check=False)
+    try:
+        return float(completed.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return None
+
+
+def bench_backends(files: List[str], name: str, repeat: int = 3) -> List[dict]:
+    """Time parse_messages over the same files with every XML parser backend (missing ones are skipped)."""
+    from swift_iso20022_toolbox.xml_backends import BACKENDS, get_backend
+    from swift_iso20022_toolbox.xml_to_xpath import parse_messages
+    records = []
+    for backend in BACKENDS:
+        record_name = f"{name}[{backend}]"
+        try:
+            get_backend(backend)
+        except ImportError as e:
+            records.append(_skipped(record_name, e))
+            continue
+
+        def run():
+            return sum(len(result[0]) for path in files for result in parse_messages(path, backend=backend))
+
+        timings, rows = _time_call(run, repeat)
+        record = _record(record_name, timings, rows=rows, files=len(files), size_bytes=sum(os.path.getsize(p) for p in files))
+        record['peak_rss_mb'] = _peak_memory_mb(files, backend)
+        records.append(record)
+    return records
+
+
+def check_backends(files: List[str]) -> dict:
+    """
+    Compare the messages of every available backend with those of etree, file by file, with and without
+    whitespace stripping. For files etree cannot parse, only the error outcome is compared.
+    """
+    import xml.etree.ElementTree as ET
+    from swift_iso20022_toolbox.xml_backends import available_backends
+    from swift_iso20022_toolbox.xml_to_xpath import iter_messages
+
+    def extract(path, backend, strip_space):
+        try:
+            return [m.results(strip_space) for m in iter_messages(path, strip_space=strip_space, backend=backend)], False
+        except ET.ParseError:
+            return None, True
+
+    backends = available_backends()
+    mismatches = []
+    for path in files:
+        for strip_space in (True, False):
+            expected, expected_error = extract(path, 'etree', strip_space)
+            for backend in backends:
+                if backend == 'etree':
+                    continue
+                actual, error = extract(path, backend, strip_space)
+                if error != expected_error or actual != expected:
+                    mismatches.append({'file': path, 'backend': backend, 'strip_space': strip_space})
+    return {'backends': backends, 'files': len(files), 'mismatches': mismatches}
+
+
+def bench_xsd_metadata(folder: str = DEFAULT_XSD_FOLDER, repeat: int = 3) -> dict:
+    """Time extract_metadata_from_xsd on a folder of XSD files."""
+    name = 'extract_metadata_from_xsd'
+    try:
+        from swift_iso20022_toolbox.extract_xsd_versions import extract_metadata_from_xsd
+    except ImportError as e:
+        return _skipped(name, e)
+    files = [os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith('.xsd')]
+    try:
+        # pandas is imported lazily by the extractor itself
+        timings, df = _time_call(lambda: extract_metadata_from_xsd(folder, 100), repeat)
+    except ImportError as e:
+        return _skipped(name, e)
+    return _record(name, timings, rows=len(df), files=len(files), size_bytes=sum(os.path.getsize(p) for p in files))
+
+
+def bench_aggregate(folder: str = DEFAULT_EXCEL_FOLDER, repeat: int = 1) -> dict:
+    """Time aggregate_excel_folder on a folder of Excel files (output is written to a temporary directory)."""
+    name = 'aggregate_excel_folder'
+    try:
+        from swift_iso20022_toolbox.aggregate_metadata import aggregate_excel_folder
+    except ImportError as e:
+        return _skipped(name, e)
+    folder = os.path.abspath(folder)
+    files = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.xlsx')]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            timings, _ = _time_call(lambda: aggregate_excel_folder(folder), repeat)
+        except ImportError as e:
+            return _skipped(name, e)
+        finally:
+            os.chdir(cwd)
+    return _record(name, timings, files=len(files), size_bytes=sum(os.path.getsize(p) for p in files))
+
+
+def bench_cli_startup(name: str, args: List[str], repeat: int = 5) -> dict:
+    """
+    Time `python -m swift_iso20022_toolbox.cli <args>` in fresh interpreters and check which heavy modules
+    the command imported. The median is compared against STARTUP_BUDGET_SECONDS.
+    """
+    probe = (
+        "import runpy, sys, json\n"
+        "sys.argv = ['iso20022'] + json.loads(sys.argv[1])\n"
+        "try:\n"
+        "    runpy.run_module('swift_iso20022_toolbox.cli', run_name='__main__')\n"
+        "finally:\n"
+        f"    sys.stderr.write(json.dumps(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)))\n"
+    )
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_root, env.get('PYTHONPATH')]))
+    timings = []
+    heavy = []
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, '-c', probe, json.dumps(args)], env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, check=False,
+        )
+        timings.append(time.perf_counter() - start)
+        try:
+            heavy = json.loads(completed.stderr.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            heavy = []
+    record = _record(name, timings)
+    record['budget_seconds'] = STARTUP_BUDGET_SECONDS
+    record['within_budget'] = record['seconds_median'] <= STARTUP_BUDGET_SECONDS
+    record['heavy_modules_loaded'] = heavy
+    return record
+
+
+def _environment() -> dict:
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, check=False,
+        ).stdout.strip()
+    except OSError:
+        revision = ''
+    return {
+        'run_datetime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'git_revision': revision,
+    }
+
+
+def run_benchmarks(corpus: str = None, size: str = 'small', repeat: int = 3,
+                   xsd_folder: str = DEFAULT_XSD_FOLDER, excel_folder: str = DEFAULT_EXCEL_FOLDER,
+                   backends: bool = False) -> dict:
+    """
+    Run all benchmarks and return the results document.
+    Without `corpus`, a synthetic corpus of the given `size` preset is generated in a temporary directory.
+    With `backends`, the XML parser backends are benchmarked and checked against each other.
+    """
+    results = []
+    backend_check = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if corpus is None:
+            preset = SIZES[size]
+            corpus = os.path.join(tmp_dir, 'corpus')
+            for msg_type in MESSAGE_TYPES:
+                if MESSAGE_TYPES[msg_type][1]:
+                    generate_corpus(corpus, [msg_type], messages=1, entries=preset['entries'], xsd_folder=xsd_folder)
+                else:
+                    generate_corpus(corpus, [msg_type], messages=preset['messages'], xsd_folder=xsd_folder)
+            corpus_info = {'source': 'generated', 'size': size}
+            corpus_info.update(preset)
+        else:
+            corpus_info = {'source': os.path.abspath(corpus)}
+        files = sorted(os.path.join(corpus, f) for f in os.listdir(corpus) if f.lower().endswith('.xml'))
+        groups = {}
+        for path in files:
+            groups.setdefault(os.path.basename(path).split('_', 1)[0], []).append(path)
+        for group, group_files in sorted(groups.items()):
+            results.append(bench_xpath(group_files, f"parse_xml_to_xpath_and_value[{group}]", repeat))
+        if corpus_info['source'] == 'generated':
+            bulk = os.path.join(tmp_dir, 'bulk')
+            bulk_files = generate_corpus(bulk, ['pacs.008'], messages=preset['messages'] * 10,
+                                         xsd_folder=xsd_folder, per_file=preset['messages'] * 10)
+            results.append(bench_messages(bulk_files, 'parse_messages[pacs.008 bulk]', repeat))
+            if backends:
+                results.extend(bench_backends(bulk_files, 'parse_messages[pacs.008 bulk]', repeat))
+        if backends:
+            results.extend(bench_backends(files, 'parse_messages[corpus]', repeat))
+            edge_cases = sorted(os.path.join(DEFAULT_EDGE_CASE_FOLDER, f) for f in os.listdir(DEFAULT_EDGE_CASE_FOLDER)
+                                if f.lower().endswith('.xml'))
+            backend_check = check_backends(files + edge_cases)
+        results.append(bench_cli_startup('cli_startup[--help]', ['--help']))
+        if files:
+            output = os.path.join(tmp_dir, 'startup_xpaths.txt')
+            single = os.path.join(tmp_dir, 'single')
+            os.makedirs(single)
+            with open(files[0], 'rb') as src, open(os.path.join(single, os.path.basename(files[0])), 'wb') as dst:
+                dst.write(src.read())
+            results.append(bench_cli_startup('cli_startup[xpath --text-only]', ['xpath', single, output, '--text-only']))
+        results.append(bench_xsd_metadata(xsd_folder, repeat))
+        results.append(bench_aggregate(excel_folder, 1))
+    document = {'environment': _environment(), 'corpus': corpus_info, 'results': results}
+    if backend_check is not None:
+        document['backend_check'] = backend_check
+    return document
+
+
+def compare_results(current: dict, baseline: dict, tolerance: float = 0.2) -> List[dict]:
+    """Return the benchmarks whose best time regressed by more than `tolerance` (0.2 = 20%) against a baseline run."""
+    previous = {r['name']: r for r in baseline.get('results', []) if r.get('status') == 'ok'}
+    regressions = []
+    for result in current.get('results', []):
+        before = previous.get(result['name'])
+        if result.get('status') != 'ok' or before is None:
+            continue
+        ratio = result['seconds_min'] / before['seconds_min'] if before['seconds_min'] else 1.0
+        result['baseline_seconds_min'] = before['seconds_min']
+        result['ratio'] = ratio
+        if ratio > 1.0 + tolerance:
+            regressions.append(result)
+    return regressions
+
+
+def save_results(results: dict, output_path: str):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+
+def print_results(results: dict):
+    print(f"{'Benchmark':<50} {'Files':>6} {'Rows':>10} {'Best (s)':>10} {'Rows/s':>12} {'MB/s':>8} {'Ratio':>7} {'Peak MB':>8}")
+    for r in results['results']:
+        if r['status'] != 'ok':
+            print(f"{r['name']:<50} skipped ({r['reason']})")
+            continue
+        rows_per_sec = f"{r['rows_per_sec']:.0f}" if r['rows_per_sec'] else '-'
+        mb_per_sec = f"{r['mb_per_sec']:.2f}" if r['mb_per_sec'] else '-'
+        ratio = f"{r['ratio']:.2f}" if 'ratio' in r else '-'
+        peak = f"{r['peak_rss_mb']:.1f}" if r.get('peak_rss_mb') is not None else '-'
+        print(f"{r['name']:<50} {r['files']:>6} {r['rows']:>10} {r['seconds_min']:>10.4f} {rows_per_sec:>12} {mb_per_sec:>8} {ratio:>7} {peak:>8}")
+    check = results.get('backend_check')
+    if check is not None:
+        print(f"\nBackend equivalence ({', '.join(check['backends'])}) on {check['files']} files: "
+              f"{len(check['mismatches'])} mismatch(es)")
+        for mismatch in check['mismatches']:
+            print(f"  {mismatch['backend']}: {mismatch['file']} (strip_space={mismatch['strip_space']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ISO20022 toolbox entry points.")
+    parser.add_argument('--corpus', type=str, default=None, help='Folder of XML files named <type>_<n>.xml (default: generate one)')
+    parser.add_argument('--size', type=str, default='small', choices=list(SIZES), help='Generated corpus size preset')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per benchmark (best time is reported)')
+    parser.add_argument('--xsd-folder', type=str, default=DEFAULT_XSD_FOLDER, help='Folder containing XSD files')
+    parser.add_argument('--excel-folder', type=str, default=DEFAULT_EXCEL_FOLDER, help='Folder containing Excel files')
+    parser.add_argument('--backends', action='store_true', help='Benchmark and cross-check the XML parser backends')
+    parser.add_argument('--output', type=str, default='bench_results.json', help='Output JSON file')
+    parser.add_argument('--compare', type=str, default=None, help='Previous results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown ratio before flagging a regression')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.corpus, args.size, args.repeat, args.xsd_folder, args.excel_folder, args.backends)
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+    print_results(results)
+    save_results(results, args.output)
+    print(f"\nBenchmark results written to: {args.output}")
+    over_budget = [r['name'] for r in results['results'] if r.get('within_budget') is False or r.get('heavy_modules_loaded')]
+    if over_budget:
+        print(f"CLI startup over budget ({STARTUP_BUDGET_SECONDS}s) or loading heavy modules: {', '.join(over_budget)}")
+    if results.get('backend_check', {}).get('mismatches'):
+        print("XML parser backends disagree; see the mismatches above")
+        sys.exit(1)
+    if regressions:
+        print(f"Performance regressions (> {args.tolerance:.0%} slower): {', '.join(r['name'] for r in regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+ISO20022 Toolbox Command Line
+-----------------------------
+Single `iso20022` entry point with one subcommand per tool. Only the module of the selected subcommand
+is imported, and heavy dependencies (pandas, openpyxl, streamlit) are loaded only on the code paths that
+need them, so small shell-pipeline runs start fast.
+
+Subcommands:
+- xpath      XPath extraction (xml_to_xpath); add `--text-only` to skip the pandas CSV/XLSX export
+- xsd-meta   XSD metadata extraction (extract_xsd_versions); `--format text` avoids pandas
+- aggregate  Excel documentation aggregation (aggregate_metadata)
+- ui         Streamlit GUI, started in-process
+- serve      Local extraction service
+- watch      Watch-folder ingestion daemon
+- store      SQLite extract store: load and query by MsgId, BizMsgIdr, UETR, type or field
+- dedup      Duplicate message detection against a persistent identifier index
+- profile    Corpus profile: XPath fill rates, value lengths and distinct counts per message type
+- diff       Release diff of XSDs and MyStandards Full_View exports
+- generate   Synthetic message generator
+- bench      Benchmark suite
+- regress    Regression harness: golden outputs and time/memory budgets
+
+Usage Example:
+    iso20022 xpath ./messages xpaths.txt --text-only
+    iso20022 xsd-meta --folder ./data/sample_xsd_plain_baseline --format text
+    iso20022 ui
+"""
+import os
+import sys
+from importlib import import_module
+
+# Subcommand -> (module, help). Modules are imported only when their subcommand runs.
+COMMANDS = {
+    'xpath': ('swift_iso20022_toolbox.xml_to_xpath', 'Extract XPaths, values and AppHdr metadata from XML files'),
+    'xsd-meta': ('swift_iso20022_toolbox.extract_xsd_versions', 'Extract header metadata from XSD files'),
+    'aggregate': ('swift_iso20022_toolbox.aggregate_metadata', 'Aggregate MyStandards Excel documentation files'),
+    'ui': (None, 'Launch the Streamlit GUI'),
+    'serve': ('swift_iso20022_toolbox.service', 'Run the local extraction service'),
+    'watch': ('swift_iso20022_toolbox.watch', 'Watch a drop folder and extract new or changed XML files'),
+    'store': ('swift_iso20022_toolbox.store', 'Load extracts into an SQLite store and query them'),
+    'dedup': ('swift_iso20022_toolbox.dedup', 'Flag duplicate messages by BizMsgIdr, MsgId and UETR'),
+    'profile': ('swift_iso20022_toolbox.corpus_profile', 'Profile XPath fill rates, value lengths and distinct values'),
+    'diff': ('swift_iso20022_toolbox.schema_diff', 'Compare two releases of XSDs and MyStandards Full_View exports'),
+    'generate': ('swift_iso20022_toolbox.generate_messages', 'Generate synthetic ISO20022 messages'),
+    'bench': ('swift_iso20022_toolbox.benchmark', 'Run the benchmark suite'),
+    'regress': ('swift_iso20022_toolbox.regression', 'Check outputs against golden files and time/memory budgets'),
+}
+VERSION = '0.1.0'
+
+
+def usage() -> str:
+    lines = ["Usage: iso20022 <command> [options]", "", "Commands:"]
+    for name, (_, help_text) in COMMANDS.items():
+        lines.append(f"  {name:<10} {help_text}")
+    lines += ["", "Run 'iso20022 <command> --help' for the options of a command."]
+    return '\n'.join(lines)
+
+
+def run_ui(args=None):
+    """Start the Streamlit GUI in this process (no `streamlit run` subprocess)."""
+    from streamlit.web import cli as streamlit_cli
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'iso20022_toolbox.py')
+    sys.argv = ['streamlit', 'run', app_path] + list(sys.argv[1:] if args is None else args)
+    sys.exit(streamlit_cli.main())
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return
+    if argv[0] == '--version':
+        print(f"iso20022 {VERSION}")
+        return
+    command, args = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"Unknown command: {command}\n\n{usage()}")
+        sys.exit(2)
+    if command == 'ui':
+        run_ui(args)
+        return
+    module = import_module(COMMANDS[command][0])
+    # The tool modules parse sys.argv themselves
+    sys.argv = [f"iso20022 {command}"] + args
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+ISO20022 Corpus Profile
+-----------------------
+Streaming profile of a message corpus: per message type and XPath_strip, how often an element occurs, in how
+many messages (fill rate), how long its values are and how many distinct values it has, computed in one pass
+over the XPath walker output without holding the extracts in memory.
+
+Features:
+- Per (message type, XPath_strip): occurrences, messages containing the element, fill rate (share of the
+  messages of that type), non-empty values, min/max/average value length and a value-length histogram in
+  power-of-two buckets (LENGTH_BUCKETS).
+- Distinct values are counted with a HyperLogLog sketch (2^12 registers, about 1.6% standard error). Up to
+  SPARSE_LIMIT distinct values are kept as exact 64-bit hashes, so code lists and currencies are counted
+  exactly; the DistinctExact column tells which counts are estimates.
+- Profiles are mergeable: counters add up and sketches merge register by register, so profiles of separate
+  folders, days or machines (saved with `--profile`) merge into one report without re-reading any message.
+  Value hashes are BLAKE2b, stable across processes and Python versions.
+- The report is written with the output sinks (csv, xlsx, txt, jsonl, parquet; see sinks.py).
+
+Usage Example:
+    python -m swift_iso20022_toolbox.corpus_profile run ./archive/2025-06-10 profile.csv --profile day10.json --workers 4
+    python -m swift_iso20022_toolbox.corpus_profile merge day09.json day10.json --output june.csv --profile june.json
+    profile = CorpusProfile()
+    for results, *metadata in parse_sources('./messages'):
+        profile.add_message(results, metadata)
+    profile.merge(CorpusProfile.load('day09.json'))
+"""
+import argparse
+import base64
+import json
+import math
+import os
+import sys
+import time
+from hashlib import blake2b
+from typing import Iterable, List
+
+from swift_iso20022_toolbox import instrumentation
+from swift_iso20022_toolbox.instrumentation import get_instrumentation
+from swift_iso20022_toolbox.store import message_type
+
+PROFILE_VERSION = 1
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+_RANK_BITS = 64 - HLL_PRECISION
+_RANK_MASK = (1 << _RANK_BITS) - 1
+# Distinct values counted exactly (as hashes) before a sketch switches to HyperLogLog registers
+SPARSE_LIMIT = 256
+# Value-length histogram: bucket i holds lengths with bit_length i (0, 1, 2-3, 4-7, ...); the last is open-ended
+LENGTH_BUCKETS = ['0', '1', '2-3', '4-7', '8-15', '16-31', '32-63', '64-127', '128+']
+REPORT_COLUMNS = ['MsgType', 'XPath_strip', 'Occurrences', 'Messages', 'FillRate', 'Values', 'DistinctValues',
+                  'DistinctExact', 'MinLength', 'MaxLength', 'AvgLength'] + [f"Len{label}" for label in LENGTH_BUCKETS]
+REPORT_COLUMN_TYPES = {'MsgType': 'code'}
+DEFAULT_REPORT_FORMATS = ['csv', 'xlsx']
+
+
+def value_hash(value: str) -> int:
+    """64-bit hash of a value, stable across processes (unlike hash())."""
+    return int.from_bytes(blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class DistinctSketch:
+    """Distinct-value counter: exact hash set up to SPARSE_LIMIT values, then HyperLogLog registers."""
+    __slots__ = ('hashes', 'registers')
+
+    def __init__(self):
+        self.hashes = set()
+        self.registers = None
+
+    def add(self, value: str):
+        self.add_hash(value_hash(value))
+
+    def add_hash(self, hashed: int):
+        if self.registers is None:
+            self.hashes.add(hashed)
+            if len(self.hashes) > SPARSE_LIMIT:
+                self._densify()
+            return
+        index = hashed >> _RANK_BITS
+        rank = _RANK_BITS - (hashed & _RANK_MASK).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def _densify(self):
+        self.registers = bytearray(HLL_REGISTERS)
+        hashes, self.hashes = self.hashes, set()
+        for hashed in hashes:
+            self.add_hash(hashed)
+
+    @property
+    def exact(self) -> bool:
+        return self.registers is None
+
+    def merge(self, other: 'DistinctSketch'):
+        if other.registers is None:
+            for hashed in other.hashes:
+                self.add_hash(hashed)
+            return
+        if self.registers is None:
+            self._densify()
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        """Number of distinct values (exact while sparse)."""
+        if self.registers is None:
+            return len(self.hashes)
+        total = sum(2.0 ** -rank for rank in self.registers)
+        estimate = HLL_ALPHA * HLL_REGISTERS * HLL_REGISTERS / total
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * HLL_REGISTERS and zeros:
+            # Small-range correction (linear counting)
+            estimate = HLL_REGISTERS * math.log(HLL_REGISTERS / zeros)
+        return int(round(estimate))
+
+    def to_dict(self) -> dict:
+        if self.registers is None:
+            return {'hashes': sorted(self.hashes)}
+        return {'registers': base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'DistinctSketch':
+        sketch = cls()
+        if 'registers' in data:
+            sketch.registers = bytearray(base64.b64decode(data['registers']))
+        else:
+            sketch.hashes = set(data['hashes'])
+        return sketch
+
+
+class FieldProfile:
+    """Counters of one XPath_strip within one message type."""
+    __slots__ = ('occurrences', 'messages', 'values', 'length_total', 'min_length', 'max_length', 'histogram',
+                 'distinct')
+
+    def __init__(self):
+        self.occurrences = 0
+        self.messages = 0
+        self.values = 0
+        self.length_total = 0
+        self.min_length = None
+        self.max_length = None
+        self.histogram = [0] * len(LENGTH_BUCKETS)
+        self.distinct = DistinctSketch()
+
+    def add_value(self, value: str):
+        length = len(value)
+        self.length_total += length
+        if self.min_length is None or length < self.min_length:
+            self.min_length = length
+        if self.max_length is None or length > self.max_length:
+            self.max_length = length
+        self.histogram[min(length.bit_length(), len(LENGTH_BUCKETS) - 1)] += 1
+        if length:
+            self.values += 1
+            self.distinct.add(value)
+
+    def merge(self, other: 'FieldProfile'):
+        self.occurrences += other.occurrences
+        self.messages += other.messages
+        self.values += other.values
+        self.length_total += other.length_total
+        lengths = [length for length in (self.min_length, other.min_length) if length is not None]
+        self.min_length = min(lengths) if lengths else None
+        lengths = [length for length in (self.max_length, other.max_length) if length is not None]
+        self.max_length = max(lengths) if lengths else None
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        self.distinct.merge(other.distinct)
+
+    def to_dict(self) -> dict:
+        return {'occurrences': self.occurrences, 'messages': self.messages, 'values': self.values,
+                'length_total': self.length_total, 'min_length': self.min_length, 'max_length': self.max_length,
+                'histogram': self.histogram, 'distinct': self.distinct.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'FieldProfile':
+        field = cls()
+        for name in ('occurrences', 'messages', 'values', 'length_total', 'min_length', 'max_length', 'histogram'):
+            setattr(field, name, data[name])
+        field.distinct = DistinctSketch.from_dict(data['distinct'])
+        return field
+
+
+class CorpusProfile:
+    """Per message type: message count and FieldProfile per XPath_strip (in order of first occurrence)."""
+
+    def __init__(self):
+        self.messages = {}  # message type -> number of messages
+        self.fields = {}  # message type -> {XPath_strip: FieldProfile}
+
+    def add_message(self, results: list, metadata: Iterable):
+        """Add one message: rows and metadata as yielded by parse_messages / parse_sources."""
+        msg_type = message_type(next(iter(metadata), None)) or 'unknown'
+        self.messages[msg_type] = self.messages.get(msg_type, 0) + 1
+        fields = self.fields.get(msg_type)
+        if fields is None:
+            fields = self.fields[msg_type] = {}
+        seen = set()
+        for row in results:
+            xpath_strip = row[1]
+            if not xpath_strip:
+                continue
+            field = fields.get(xpath_strip)
+            if field is None:
+                field = fields[xpath_strip] = FieldProfile()
+            field.occurrences += 1
+            if xpath_strip not in seen:
+                seen.add(xpath_strip)
+                field.messages += 1
+            field.add_value(row[2] or '')
+
+    def merge(self, other: 'CorpusProfile') -> 'CorpusProfile':
+        """Add the counts and sketches of `other` to this profile (returns self)."""
+        for msg_type, count in other.messages.items():
+            self.messages[msg_type] = self.messages.get(msg_type, 0) + count
+            fields = self.fields.setdefault(msg_type, {})
+            for xpath_strip, other_field in other.fields.get(msg_type, {}).items():
+                field = fields.get(xpath_strip)
+                if field is None:
+                    field = fields[xpath_strip] = FieldProfile()
+                field.merge(other_field)
+        return self
+
+    def rows(self) -> List[list]:
+        """Report rows (REPORT_COLUMNS), by message type."""
+        rows = []
+        for msg_type in sorted(self.fields):
+            messages = self.messages[msg_type]
+            for xpath_strip, field in self.fields[msg_type].items():
+                rows.append([msg_type, xpath_strip, field.occurrences, field.messages,
+                             round(field.messages / messages, 4) if messages else 0.0, field.values,
+                             field.distinct.estimate(), field.distinct.exact, field.min_length, field.max_length,
+                             round(field.length_total / field.occurrences, 2) if field.occurrences else 0.0]
+                            + field.histogram)
+        return rows
+
+    def save(self, path: str):
+        """Write the profile (counters and sketches) as JSON, atomically."""
+        data = {'version': PROFILE_VERSION, 'hll_precision': HLL_PRECISION, 'sparse_limit': SPARSE_LIMIT,
+                'types': {msg_type: {'messages': self.messages[msg_type],
+                                     'fields': {xpath_strip: field.to_dict() for xpath_strip, field in fields.items()}}
+                          for msg_type, fields in self.fields.items()}}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'CorpusProfile':
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f), path)
+
+    @classmethod
+    def from_dict(cls, data: dict, name: str = 'profile') -> 'CorpusProfile':
+        """Profile from the JSON data written by save()."""
+        if data.get('version') != PROFILE_VERSION or data.get('hll_precision') != HLL_PRECISION:
+            raise ValueError(f"Unsupported profile file: {name} (version {data.get('version')}, "
+                             f"precision {data.get('hll_precision')})")
+        profile = cls()
+        for msg_type, entry in data['types'].items():
+            profile.messages[msg_type] = entry['messages']
+            profile.fields[msg_type] = {xpath_strip: FieldProfile.from_dict(field)
+                                        for xpath_strip, field in entry['fields'].items()}
+        return profile
+
+
+def profile_sources(path: str, workers: int = 1, backend: str = None, selection=None, fileobj=None) -> CorpusProfile:
+    """Profile every message of a file, folder or archive (see sources.parse_sources)."""
+    from swift_iso20022_toolbox.sources import parse_sources
+    inst = get_instrumentation()
+    profile = CorpusProfile()
+    for results, *metadata in parse_sources(path, workers=workers, fileobj=fileobj, backend=backend, selection=selection):
+        # With a selection, a message without selected rows still counts towards the fill rates; only the
+        # empty result of a file that failed to parse (no rows, no metadata) is left out
+        if results or any(metadata):
+            with inst.stage('profile'):
+                profile.add_message(results, metadata)
+    return profile
+
+
+def write_report(profile: CorpusProfile, output_file: str, formats: List[str] = None) -> List[str]:
+    """Write the report rows in `formats` next to `output_file`; return the files written."""
+    from swift_iso20022_toolbox.sinks import open_sinks
+    # The txt format takes the output file name itself; keep it from overwriting e.g. profile.csv
+    output_file = os.path.splitext(output_file)[0] + '.txt'
+    with get_instrumentation().stage('write'):
+        sink = open_sinks(output_file, formats or DEFAULT_REPORT_FORMATS, REPORT_COLUMNS, column_types=REPORT_COLUMN_TYPES)
+        sink.write_many(profile.rows())
+        sink.close()
+    return sink.files()
+
+
+def main():
+    from swift_iso20022_toolbox.sinks import parse_formats
+    parser = argparse.ArgumentParser(description="Profile XPath occurrence, fill rates, value lengths and distinct values per message type.")
+    commands = parser.add_subparsers(dest='command')
+    run = commands.add_parser('run', help='Profile the messages of a file, folder or archive')
+    run.add_argument('input', type=str, help='XML file, folder or archive')
+    run.add_argument('output', type=str, help='Report file (e.g. profile.csv); other formats are written next to it')
+    run.add_argument('--profile', type=str, default=None, help='Also save the mergeable profile (JSON) to this file')
+    run.add_argument('--workers', type=int, default=1, help='Worker processes for parsing')
+    run.add_argument('--backend', type=str, default=None, help='XML parser backend (see xml_backends)')
+    run.add_argument('--select', type=str, default=None, help='Only profile these XPath_strip patterns (comma-separated or @file)')
+    merge = commands.add_parser('merge', help='Merge saved profiles into one report')
+    merge.add_argument('profiles', nargs='+', help='Profile files written with --profile')
+    merge.add_argument('--output', type=str, required=True, help='Report file (e.g. profile.csv)')
+    merge.add_argument('--profile', type=str, default=None, help='Also save the merged profile to this file')
+    for command in (run, merge):
+        command.add_argument('--format', type=str, default=','.join(DEFAULT_REPORT_FORMATS), help='Report formats (csv, xlsx, txt, jsonl, parquet)')
+        command.add_argument('--metrics-json', type=str, default=None, help='Append run timings and counters as a JSON line to this file')
+        command.add_argument('--metrics-prom', type=str, default=None, help='Write run timings and counters in Prometheus text format to this file')
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return
+    try:
+        formats = parse_formats(args.format)
+    except ValueError as e:
+        print(e)
+        sys.exit(2)
+
+    inst = instrumentation.enable('corpus_profile') if args.metrics_json or args.metrics_prom else get_instrumentation()
+    start = time.perf_counter()
+    if args.command == 'run':
+        selection = None
+        if args.select is not None:
+            from swift_iso20022_toolbox.selection import parse_patterns
+            selection = parse_patterns(args.select)
+        profile = profile_sources(args.input, workers=args.workers, backend=args.backend, selection=selection)
+    else:
+        profile = CorpusProfile()
+        for path in args.profiles:
+            with inst.stage('merge'):
+                profile.merge(CorpusProfile.load(path))
+    if args.profile:
+        profile.save(args.profile)
+    files = write_report(profile, args.output, formats)
+    fields = sum(len(fields) for fields in profile.fields.values())
+    print(f"{sum(profile.messages.values())} message(s) of {len(profile.messages)} type(s), {fields} XPath(s) profiled "
+          f"in {time.perf_counter() - start:.2f}s")
+    print(f"Profile report written to: {', '.join(files + ([args.profile] if args.profile else []))}")
+    instrumentation.export(inst, json_log=args.metrics_json, prometheus=args.metrics_prom)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+ISO20022 Duplicate Message Index
+--------------------------------
+Persistent duplicate detection for resent messages: every parsed message's identifiers (BizMsgIdr, MsgId and
+UETRs) are checked against an on-disk hash index of all identifiers seen before, and duplicates are tagged.
+
+Features:
+- Open-addressing hash table (linear probing) of 16-byte BLAKE2b digests in a memory-mapped file: a lookup
+  touches one or two pages, and only the pages actually used are held in memory, so the index scales to
+  hundreds of millions of identifiers without loading them into RAM.
+- Optional Bloom filter front (`<index>.bloom`, 2 bytes per slot, memory-mapped): identifiers that were never
+  seen are answered without touching the table. New identifiers are buffered and written to the table in
+  slot order on flush, so table pages are only read for (likely) duplicates.
+- Identifier scope: BizMsgIdr per sender (AppHdr Fr), MsgId per sender and message type, UETR per message type
+  (the same UETR in a pacs.008 and its camt.054 notification is not a duplicate).
+- The table doubles when it is 75% full; pass `--capacity` up front for large histories to avoid rehashing.
+- The index is written on flush and close; identifiers of an interrupted run that were not flushed are not
+  recorded.
+
+Usage Example:
+    python -m swift_iso20022_toolbox.dedup check dedup.idx ./inbound --workers 4
+    python -m swift_iso20022_toolbox.dedup check dedup.idx ./replay --no-record
+    python -m swift_iso20022_toolbox.dedup stats dedup.idx
+    python xml_to_xpath.py ./inbound xpaths.txt --dedup dedup.idx
+    python -m swift_iso20022_toolbox.watch ./inbound ./xpath_output --dedup dedup.idx
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from hashlib import blake2b
+from typing import List, Tuple
+
+from swift_iso20022_toolbox import instrumentation
+from swift_iso20022_toolbox.instrumentation import get_instrumentation
+from swift_iso20022_toolbox.store import UETR_TAG, message_type
+
+MAGIC = b'ISODUPX1'
+HEADER = struct.Struct('<8sIIQ')  # magic, version, log2(slots), count
+HEADER_SIZE = 64
+VERSION = 1
+SLOT_SIZE = 16
+EMPTY_SLOT = bytes(SLOT_SIZE)
+MAX_LOAD = 0.75
+DEFAULT_CAPACITY = 1 << 20
+BLOOM_BITS_PER_SLOT = 16
+BLOOM_HASHES = 7
+FLUSH_SIZE = 65536
+IDENTIFIER_KINDS = ('BizMsgIdr', 'MsgId', 'UETR')
+
+
+def message_identifiers(results: list, metadata: tuple) -> List[Tuple[str, str]]:
+    """Return the (kind, scoped value) identifiers of one message, as checked by DuplicateIndex."""
+    xsd, msgid, fr, to, credt, bizmsgidr, bizsvc = metadata[:7]
+    msg_type = message_type(xsd)
+    identifiers = []
+    if bizmsgidr:
+        identifiers.append(('BizMsgIdr', f"{fr}|{bizmsgidr}"))
+    if msgid:
+        identifiers.append(('MsgId', f"{fr}|{msg_type}|{msgid}"))
+    uetrs = sorted({row[2] for row in results if row[2] and row[1].endswith(UETR_TAG)})
+    identifiers.extend(('UETR', f"{msg_type}|{uetr}") for uetr in uetrs)
+    return identifiers
+
+
+def _digest(kind: str, value: str) -> bytes:
+    digest = blake2b(f"{kind}\0{value}".encode('utf-8'), digest_size=SLOT_SIZE).digest()
+    # An all-zero slot marks an empty slot
+    return digest if digest != EMPTY_SLOT else b'\1' + digest[1:]
+
+
+def _map_file(path: str, size: int) -> tuple:
+    """Open (creating or extending as needed) a file of `size` bytes and return (file, mmap)."""
+    handle = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+    if os.path.getsize(path) < size:
+        handle.truncate(size)
+    return handle, mmap.mmap(handle.fileno(), size)
+
+
+class _HashTable:
+    """Memory-mapped open-addressing set of 16-byte digests."""
+
+    def __init__(self, path: str, slot_bits: int):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE
+        if exists:
+            with open(path, 'rb') as f:
+                magic, version, slot_bits, self.count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not a duplicate index file: {path}")
+        else:
+            self.count = 0
+        self.slot_bits = slot_bits
+        self.slots = 1 << slot_bits
+        self.mask = self.slots - 1
+        self.handle, self.mm = _map_file(path, HEADER_SIZE + self.slots * SLOT_SIZE)
+        if not exists:
+            self.write_header()
+
+    def write_header(self):
+        self.mm[:HEADER.size] = HEADER.pack(MAGIC, VERSION, self.slot_bits, self.count)
+
+    def _find(self, digest: bytes) -> tuple:
+        """Return (found, offset of the digest or of the empty slot where it belongs)."""
+        mm = self.mm
+        slot = int.from_bytes(digest[:8], 'little') & self.mask
+        while True:
+            offset = HEADER_SIZE + slot * SLOT_SIZE
+            current = mm[offset:offset + SLOT_SIZE]
+            if current == digest:
+                return True, offset
+            if current == EMPTY_SLOT:
+                return False, offset
+            slot = (slot + 1) & self.mask
+
+    def contains(self, digest: bytes) -> bool:
+        return self._find(digest)[0]
+
+    def insert_many(self, digests, in_slot_order: bool = False) -> int:
+        """
+        Insert digests not yet present, in slot order (sequential page access); return the number added.
+        Digests already in slot order (`in_slot_order`) are streamed instead of being sorted in memory.
+        """
+        added = 0
+        mask = self.mask
+        if not in_slot_order:
+            digests = sorted(digests, key=lambda d: int.from_bytes(d[:8], 'little') & mask)
+        for digest in digests:
+            found, offset = self._find(digest)
+            if not found:
+                self.mm[offset:offset + SLOT_SIZE] = digest
+                added += 1
+        self.count += added
+        self.write_header()
+        return added
+
+    def digests(self):
+        mm = self.mm
+        for offset in range(HEADER_SIZE, HEADER_SIZE + self.slots * SLOT_SIZE, SLOT_SIZE):
+            digest = mm[offset:offset + SLOT_SIZE]
+            if digest != EMPTY_SLOT:
+                yield digest
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.mm.flush()
+        self.mm.close()
+        self.handle.close()
+
+
+class _BloomFilter:
+    """Memory-mapped Bloom filter with double hashing over the second half of the digest."""
+
+    def __init__(self, path: str, bits: int):
+        self.path = path
+        self.bits = bits
+        self.mask = bits - 1
+        self.handle, self.mm = _map_file(path, bits // 8)
+
+    def _positions(self, digest: bytes):
+        h1 = int.from_bytes(digest[8:12], 'little')
+        h2 = int.from_bytes(digest[12:16], 'little') | 1
+        mask = self.mask
+        return [(h1 + i * h2) & mask for i in range(BLOOM_HASHES)]
+
+    def might_contain(self, digest: bytes) -> bool:
+        mm = self.mm
+        return all(mm[p >> 3] & (1 << (p & 7)) for p in self._positions(digest))
+
+    def add(self, digest: bytes):
+        mm = self.mm
+        for p in self._positions(digest):
+            mm[p >> 3] |= 1 << (p & 7)
+
+    def close(self):
+        self.mm.flush()
+        self.mm.close()
+        self.handle.close()
+
+
+class DuplicateIndex:
+    """Persistent set of message identifiers; `check_message` tags a message's identifiers seen before."""
+
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY, bloom: bool = True):
+        self.path = path
+        self.bloom_path = path + '.bloom'
+        slot_bits = max(10, (int(capacity / MAX_LOAD) - 1).bit_length())
+        self.table = _HashTable(path, slot_bits)
+        self.bloom = self._open_bloom() if bloom else None
+        self.pending = set()
+
+    def _open_bloom(self) -> _BloomFilter:
+        bits = self.table.slots * BLOOM_BITS_PER_SLOT
+        rebuild = not os.path.exists(self.bloom_path) or os.path.getsize(self.bloom_path) != bits // 8
+        if rebuild and os.path.exists(self.bloom_path):
+            os.remove(self.bloom_path)
+        bloom = _BloomFilter(self.bloom_path, bits)
+        if rebuild and self.table.count:
+            for digest in self.table.digests():
+                bloom.add(digest)
+        return bloom
+
+    def __len__(self) -> int:
+        return self.table.count + len(self.pending)
+
+    def _lookup(self, digest: bytes) -> bool:
+        if digest in self.pending:
+            return True
+        if self.bloom is not None and not self.bloom.might_contain(digest):
+            return False
+        return self.table.contains(digest)
+
+    def contains(self, kind: str, value: str) -> bool:
+        return self._lookup(_digest(kind, value))
+
+    def seen(self, kind: str, value: str, record: bool = True) -> bool:
+        """Return True if the identifier was seen before; otherwise record it (unless `record` is False)."""
+        digest = _digest(kind, value)
+        if self._lookup(digest):
+            return True
+        if record:
+            self.pending.add(digest)
+            if self.bloom is not None:
+                self.bloom.add(digest)
+            if len(self.pending) >= FLUSH_SIZE:
+                self.flush()
+        return False
+
+    def check_message(self, results: list, metadata: tuple, record: bool = True) -> List[str]:
+        """Return the identifier kinds (BizMsgIdr, MsgId, UETR) of a message that were seen before, recording the new ones."""
+        return self.check_identifiers(message_identifiers(results, metadata), record)
+
+    def check_identifiers(self, identifiers: List[Tuple[str, str]], record: bool = True) -> List[str]:
+        """Like check_message, for identifiers collected with message_identifiers (e.g. by a worker process)."""
+        inst = get_instrumentation()
+        with inst.stage('dedup'):
+            duplicates = []
+            for kind, value in identifiers:
+                if self.seen(kind, value, record) and kind not in duplicates:
+                    duplicates.append(kind)
+        inst.add('dedup_checked')
+        if duplicates:
+            inst.add('duplicates')
+        return duplicates
+
+    def _grow(self):
+        """Rehash into a table with twice as many slots (and a matching Bloom filter)."""
+        old = self.table
+        tmp_path = self.path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        grown = _HashTable(tmp_path, old.slot_bits + 1)
+        # A digest in old slot s belongs in new slot s or s + old.slots: walking the old table in slot order
+        # fills both halves of the new one front to back, without holding the digests in memory
+        grown.insert_many(old.digests(), in_slot_order=True)
+        grown.close()
+        old.close()
+        os.replace(tmp_path, self.path)
+        self.table = _HashTable(self.path, grown.slot_bits)
+        if self.bloom is not None:
+            self.bloom.close()
+            os.remove(self.bloom_path)
+            self.bloom = self._open_bloom()
+            for digest in self.pending:
+                self.bloom.add(digest)
+
+    def flush(self):
+        """Write buffered identifiers to the table (growing it first if it would exceed MAX_LOAD)."""
+        while self.table.count + len(self.pending) > MAX_LOAD * self.table.slots:
+            self._grow()
+        if self.pending:
+            self.table.insert_many(self.pending)
+            self.pending = set()
+            if self.bloom is None and os.path.exists(self.bloom_path):
+                # The Bloom filter no longer covers the table; it is rebuilt when next opened
+                os.remove(self.bloom_path)
+        self.table.flush()
+        if self.bloom is not None:
+            self.bloom.mm.flush()
+
+    def close(self):
+        self.flush()
+        self.table.close()
+        if self.bloom is not None:
+            self.bloom.close()
+
+    def stats(self) -> dict:
+        return {
+            'identifiers': len(self),
+            'slots': self.table.slots,
+            'load': round(len(self) / self.table.slots, 4),
+            'index_bytes': os.path.getsize(self.path),
+            'bloom_bytes': os.path.getsize(self.bloom_path) if self.bloom is not None else 0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag duplicate messages (BizMsgIdr, MsgId, UETR) against a persistent index.")
+    commands = parser.add_subparsers(dest='command')
+    check = commands.add_parser('check', help='Check the messages of a file, folder or archive and record their identifiers')
+    check.add_argument('index', type=str, help='Duplicate index file (created if missing)')
+    check.add_argument('input', type=str, help='XML file, folder or archive')
+    check.add_argument('--workers', type=int, default=1, help='Worker processes for parsing')
+    check.add_argument('--no-record', action='store_true', help='Only check; do not add new identifiers to the index')
+    check.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY, help='Expected number of identifiers (new index only)')
+    check.add_argument('--no-bloom', action='store_true', help='Look up every identifier in the table (no Bloom filter front)')
+    check.add_argument('--metrics-json', type=str, default=None, help='Append run timings and counters as a JSON line to this file')
+    check.add_argument('--metrics-prom', type=str, default=None, help='Write run timings and counters in Prometheus text format to this file')
+    commands.add_parser('stats', help='Print index size and load').add_argument('index', type=str, help='Duplicate index file')
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        from swift_iso20022_toolbox.sources import parse_sources
+        inst = instrumentation.enable('dedup') if args.metrics_json or args.metrics_prom else get_instrumentation()
+        index = DuplicateIndex(args.index, capacity=args.capacity, bloom=not args.no_bloom)
+        start = time.perf_counter()
+        messages = duplicates = 0
+        print("File | MsgId | BizMsgIdr | Duplicate")
+        for results, *metadata in parse_sources(args.input, workers=args.workers):
+            if not results:
+                continue
+            messages += 1
+            found = index.check_message(results, tuple(metadata), record=not args.no_record)
+            if found:
+                duplicates += 1
+                print(f"{results[0][3]} | {metadata[1]} | {metadata[5]} | {','.join(found)}")
+        index.close()
+        print(f"{duplicates} duplicate(s) in {messages} message(s), {time.perf_counter() - start:.2f}s")
+        instrumentation.export(inst, json_log=args.metrics_json, prometheus=args.metrics_prom)
+    elif args.command == 'stats':
+        if not os.path.exists(args.index):
+            print(f"Index not found: {args.index}")
+            sys.exit(1)
+        index = DuplicateIndex(args.index)
+        for key, value in index.stats().items():
+            print(f"{key}: {value}")
+        index.close()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+ISO20022 External Merge Sort
+----------------------------
+Sorting of extractor rows within a fixed memory budget, for `xml_to_xpath --sort` on directory-wide runs.
+
+Features:
+- Rows are buffered until the (estimated) memory budget is reached, then sorted and spilled to a temporary
+  run file; the sorted output is a k-way merge (heapq.merge) of the runs and the remaining buffer.
+- Runs are written as pickled chunks, so the metadata tuple shared by the rows of a message is stored once
+  per chunk. When there are more than MAX_MERGE_FAN_IN runs, they are first merged into larger runs, which
+  bounds the number of open files and read buffers.
+- Sort keys: xpath, xpath_strip, file (rows of a file keep their document order) and msgid. The sort is
+  stable, like sorted(): rows with equal keys keep their input order.
+- The sorted rows can be iterated several times (e.g. for the console and the output file); runs are deleted
+  on close() or when the sorter is garbage collected.
+
+Usage Example:
+    from swift_iso20022_toolbox.external_sort import ExternalSorter
+    with ExternalSorter(key='msgid', memory_mb=256) as sorter:
+        for row, metadata in rows:
+            sorter.add((row, metadata))
+        for row, metadata in sorter:
+            ...
+    python xml_to_xpath.py ./archive xpaths.txt --sort --sort-key file --sort-memory 512 --text-only
+"""
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Iterable, Iterator
+
+from swift_iso20022_toolbox.instrumentation import get_instrumentation
+
+# Key functions on (row, metadata) items; row = (xpath, xpath_strip, value, file_path, file_name)
+SORT_KEYS = {
+    'xpath': lambda item: item[0][0],
+    'xpath_strip': lambda item: item[0][1],
+    'file': lambda item: item[0][3],
+    'msgid': lambda item: item[1][1] or '',
+}
+DEFAULT_SORT_KEY = 'xpath'
+DEFAULT_MEMORY_MB = 256
+MAX_MERGE_FAN_IN = 64
+# Items per pickled chunk of a run file
+CHUNK_SIZE = 4096
+# Estimated per-item overhead in memory (tuple, string headers and list slot), on top of the string lengths
+ITEM_OVERHEAD = 300
+
+
+def _item_size(item: tuple) -> int:
+    return ITEM_OVERHEAD + sum(len(field) for field in item[0] if field)
+
+
+def _write_run(path: str, items: Iterable[tuple]):
+    with open(path, 'wb') as f:
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= CHUNK_SIZE:
+                pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                chunk = []
+        if chunk:
+            pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read_run(path: str) -> Iterator[tuple]:
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                chunk = pickle.load(f)
+            except EOFError:
+                return
+            yield from chunk
+
+
+class ExternalSorter:
+    """Stable sort of (row, metadata) items that spills sorted runs to disk beyond `memory_mb`."""
+
+    def __init__(self, key: str = DEFAULT_SORT_KEY, memory_mb: float = DEFAULT_MEMORY_MB, tmp_dir: str = None):
+        self._work_dir = None
+        if key not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {key} (available: {', '.join(SORT_KEYS)})")
+        self.key = SORT_KEYS[key]
+        self.budget = int(memory_mb * 1024 * 1024)
+        self.tmp_dir = tmp_dir
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._runs = []
+        self._run_files = 0
+        self._sorted = False
+        self.count = 0
+
+    def add(self, item: tuple):
+        """Add a (row, metadata) item."""
+        self._sorted = False
+        self._buffer.append(item)
+        self._buffer_bytes += _item_size(item)
+        self.count += 1
+        if self._buffer_bytes >= self.budget:
+            self._spill()
+
+    def extend(self, items: Iterable[tuple]):
+        for item in items:
+            self.add(item)
+
+    def _new_run_path(self) -> str:
+        if self._work_dir is None:
+            self._work_dir = tempfile.mkdtemp(prefix='iso20022_sort_', dir=self.tmp_dir)
+        self._run_files += 1
+        return os.path.join(self._work_dir, f"run_{self._run_files:06d}.pkl")
+
+    def _spill(self):
+        inst = get_instrumentation()
+        with inst.stage('sort_spill'):
+            self._buffer.sort(key=self.key)
+            path = self._new_run_path()
+            _write_run(path, self._buffer)
+            self._runs.append(path)
+        inst.add('sort_runs')
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    def _reduce_runs(self):
+        """Merge runs in order, MAX_MERGE_FAN_IN at a time, until one final merge can open them all."""
+        while len(self._runs) > MAX_MERGE_FAN_IN:
+            group, rest = self._runs[:MAX_MERGE_FAN_IN], self._runs[MAX_MERGE_FAN_IN:]
+            path = self._new_run_path()
+            _write_run(path, heapq.merge(*[_read_run(run) for run in group], key=self.key))
+            for run in group:
+                os.remove(run)
+            # The merged run replaces its group in front, which keeps equal keys in input order
+            self._runs = [path] + rest
+
+    def __iter__(self) -> Iterator[tuple]:
+        """Yield the items in key order."""
+        if not self._sorted:
+            self._buffer.sort(key=self.key)
+            self._sorted = True
+        if not self._runs:
+            return iter(self._buffer)
+        self._reduce_runs()
+        # The buffer holds the last items, so it merges after the runs
+        return heapq.merge(*[_read_run(run) for run in self._runs], self._buffer, key=self.key)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        """Delete the run files."""
+        if self._work_dir is not None:
+            shutil.rmtree(self._work_dir, ignore_errors=True)
+            self._work_dir = None
+        self._runs = []
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        self.close()
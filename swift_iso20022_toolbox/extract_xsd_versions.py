@@ -15,6 +15,9 @@ Features:
     - <xs:schema ...> tag (full tag, wherever it appears)
     - xs_schema_xsd: the value between ':xsd:' and the next double-quote in the schema tag
 - Outputs a reference DataFrame and saves it as both `xsd_reference.csv` and `xsd_reference.xlsx`.
+- Optional per-stage timings and counters (`--metrics-json`, `--metrics-prom`).
+- `--format text` prints the records as pipe-separated text without importing pandas.
+- `--folder` may also be a zip/tar/gzip archive of XSD files; members are read without extracting them.
 
 Requirements:
 - Python 3.7+
@@ -24,11 +27,14 @@ Requirements:
 Usage Example:
     python extract_xsd_versions.py --folder ./sample_xsd_plain --lines 100
 """
-import os
+import io
+import itertools
 import re
-import pandas as pd
 import argparse
 
+from swift_iso20022_toolbox import instrumentation
+from swift_iso20022_toolbox.instrumentation import get_instrumentation
+
 # Fields to extract and their regex patterns
 FIELDS = {
     'group': re.compile(r'^Group:\s*(.+)$', re.MULTILINE | re.IGNORECASE),
@@ -39,64 +45,116 @@ FIELDS = {
     'url': re.compile(r'^URL:\s*(.+)$', re.MULTILINE | re.IGNORECASE),
 }
 
-def extract_metadata_from_xsd(folder: str = './sample_xsd_plain', n_lines: int = 100):
+XS_SCHEMA_PATTERN = re.compile(r'<xs:schema[^>]*>', re.IGNORECASE)
+
+def extract_xsd(tag):
+    """Return the value between ':xsd:' and the next double-quote in an <xs:schema ...> tag."""
+    if not tag:
+        return None
+    match = re.search(r':xsd:([^\"]+)', tag)
+    return match.group(1) if match else None
+
+def build_xsd_record(fname: str, lines: list, read_full) -> dict:
+    """
+    Build the metadata record of one XSD from its first header lines.
+    `read_full` is called to get the whole file content only if the <xs:schema ...> tag is not in `lines`.
+    """
+    inst = get_instrumentation()
+    with inst.stage('metadata'):
+        content = ''.join(lines)
+        record = {'file_name': fname}
+        for key, pattern in FIELDS.items():
+            match = pattern.search(content)
+            record[key] = match.group(1).strip() if match else None
+        # Try to find the <xs:schema ...> tag in first n_lines
+        schema_line = None
+        for line in lines:
+            match = XS_SCHEMA_PATTERN.search(line)
+            if match:
+                schema_line = match.group(0)
+                break
+    # Fallback: if not found, read the whole file and try again
+    if not schema_line:
+        with inst.stage('read'):
+            file_content = read_full()
+        inst.add('bytes', len(file_content))
+        with inst.stage('metadata'):
+            match = XS_SCHEMA_PATTERN.search(file_content)
+            if match:
+                schema_line = match.group(0)
+    record['xs_schema_tag'] = schema_line
+    return record
+
+def extract_xsd_record(fname: str, text: str, n_lines: int = 100) -> dict:
+    """Return the metadata record (including xs_schema_xsd) of one XSD given as text."""
+    record = build_xsd_record(fname, text.splitlines(True)[:n_lines], lambda: text)
+    xsd_record = {'xs_schema_xsd': extract_xsd(record['xs_schema_tag'])}
+    xsd_record.update(record)
+    return xsd_record
+
+def extract_xsd_records(folder: str = './sample_xsd_plain', n_lines: int = 100, fileobj=None) -> list:
+    """
+    Return the metadata records of all XSD files in a folder (plain dicts, no pandas needed).
+    `folder` may also be a zip/tar/gzip archive of XSD files (or a folder containing some); archive members
+    are read straight from the archive. With `fileobj`, `folder` is the name of an in-memory archive.
+    """
+    from swift_iso20022_toolbox.sources import iter_sources
+    inst = get_instrumentation()
     records = []
-    xs_schema_pattern = re.compile(r'<xs:schema[^>]*>', re.IGNORECASE)
-    for fname in os.listdir(folder):
-        if fname.lower().endswith('.xsd'):
-            file_path = os.path.join(folder, fname)
-            # Read first n_lines for metadata
-            with open(file_path, encoding='utf-8', errors='replace') as f:
-                lines = [next(f) for _ in range(n_lines)]
-                content = ''.join(lines)
-            record = {'file_name': fname}
-            for key, pattern in FIELDS.items():
-                match = pattern.search(content)
-                record[key] = match.group(1).strip() if match else None
-            # Try to find the <xs:schema ...> tag in first n_lines
-            schema_line = None
-            for line in lines:
-                match = xs_schema_pattern.search(line)
-                if match:
-                    schema_line = match.group(0)
-                    break
-            # Fallback: if not found, read the whole file and try again
-            if not schema_line:
-                try:
-                    with open(file_path, encoding='utf-8', errors='replace') as f:
-                        file_content = f.read()
-                except Exception:
-                    file_content = ''
-                match = xs_schema_pattern.search(file_content)
-                if match:
-                    schema_line = match.group(0)
-            record['xs_schema_tag'] = schema_line
-            records.append(record)
-    df = pd.DataFrame(records)
-    # Extract xs_schema_xsd from xs_schema_tag
-    def extract_xsd(tag):
-        if not tag:
-            return None
-        match = re.search(r':xsd:([^\"]+)', tag)
-        return match.group(1) if match else None
-    df.insert(0, 'xs_schema_xsd', df['xs_schema_tag'].apply(extract_xsd))
-    return df
-
-def extract_metadata_and_save(folder: str, n_lines: int, output_path: str):
-    ref_df = extract_metadata_from_xsd(folder, n_lines)
-    ref_df.to_excel(output_path, index=False)
+    for _, fname, binary in iter_sources(folder, ('.xsd',), recursive=False, fileobj=fileobj):
+        f = io.TextIOWrapper(binary, encoding='utf-8', errors='replace')
+        # Read first n_lines for metadata
+        with inst.stage('read'):
+            lines = list(itertools.islice(f, n_lines))
+        inst.add('files')
+        inst.add('bytes', sum(len(line) for line in lines))
+        # The rest of the file is only read if the <xs:schema ...> tag is not in the header lines
+        record = build_xsd_record(fname, lines, lambda: ''.join(lines) + f.read())
+        xsd_record = {'xs_schema_xsd': extract_xsd(record['xs_schema_tag'])}
+        xsd_record.update(record)
+        records.append(xsd_record)
+        f.detach()
+    inst.add('rows', len(records))
+    return records
+
+def extract_metadata_from_xsd(folder: str = './sample_xsd_plain', n_lines: int = 100, fileobj=None):
+    import pandas as pd
+    records = extract_xsd_records(folder, n_lines, fileobj=fileobj)
+    with get_instrumentation().stage('frame'):
+        return pd.DataFrame(records)
+
+def extract_metadata_and_save(folder: str, n_lines: int, output_path: str, fileobj=None):
+    ref_df = extract_metadata_from_xsd(folder, n_lines, fileobj=fileobj)
+    with get_instrumentation().stage('write'):
+        ref_df.to_excel(output_path, index=False)
     return ref_df
 
 def main():
     parser = argparse.ArgumentParser(description="Extract metadata from XSD files.")
-    parser.add_argument('--folder', type=str, default='./sample_xsd_plain', help='Folder containing XSD files')
+    parser.add_argument('--folder', type=str, default='./sample_xsd_plain', help='Folder (or zip/tar/gzip archive) containing XSD files')
     parser.add_argument('--lines', type=int, default=40, help='Number of header lines to read from each XSD file')
     parser.add_argument('--output', type=str, default='xsd_reference.xlsx', help='Output Excel file path')
+    parser.add_argument('--format', type=str, default='excel', choices=['excel', 'text'], help='excel: write Excel and CSV files; text: print records to stdout')
+    parser.add_argument('--metrics-json', type=str, default=None, help='Append run timings and counters as a JSON line to this file')
+    parser.add_argument('--metrics-prom', type=str, default=None, help='Write run timings and counters in Prometheus text format to this file')
     args = parser.parse_args()
+    inst = instrumentation.enable('extract_xsd_versions') if args.metrics_json or args.metrics_prom else get_instrumentation()
+
+    if args.format == 'text':
+        records = extract_xsd_records(args.folder, args.lines)
+        with inst.stage('write'):
+            if records:
+                print(' | '.join(records[0]))
+            for record in records:
+                print(' | '.join('' if value is None else str(value) for value in record.values()))
+        instrumentation.export(inst, json_log=args.metrics_json, prometheus=args.metrics_prom)
+        return
 
     ref_df = extract_metadata_and_save(args.folder, args.lines, args.output)
     print(ref_df)
-    ref_df.to_csv('xsd_reference.csv', index=False)
+    with inst.stage('write'):
+        ref_df.to_csv('xsd_reference.csv', index=False)
+    instrumentation.export(inst, json_log=args.metrics_json, prometheus=args.metrics_prom)
 
 if __name__ == "__main__":
     main()
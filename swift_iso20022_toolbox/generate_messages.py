@@ -0,0 +1,277 @@
+"""
+Synthetic ISO20022 Message Generator
+-----------------------------------
+Generates synthetic CBPR+ messages (AppHdr + Document) from the baseline XSD files, for testing and
+benchmarking the toolbox on corpora of any size.
+
+Features:
+- Supported message types: pacs.008, pacs.009, camt.053 and pain.001 (see `MESSAGE_TYPES`).
+- Elements are emitted in schema order from the compiled XSD (`xsd_schema`), with values derived from
+  the simple type facets (enumerations, patterns, lengths, decimals, dates), so messages follow the usage guideline.
+- `--profile` controls how many optional elements are filled: `minimal` (mandatory only), `typical`
+  (mandatory plus the commonly used fields in `TYPICAL_OPTIONAL`) or `full` (every optional element).
+- `--entries` repeats the repeatable body element of the message (e.g. camt.053 statement entries `Ntry`).
+  CBPR+ restricts pacs.008, pacs.009 and pain.001 to a single transaction, so those are scaled with `--messages`.
+- `--per-file N` writes bulk files holding up to N AppHdr/Document pairs in one envelope, as produced by
+  batch channels.
+- Output is streamed to disk, so very large messages (hundreds of thousands of entries) use constant memory.
+
+Usage Example:
+    python -m swift_iso20022_toolbox.generate_messages --type pacs.008 --messages 1000 --output ./corpus
+    python -m swift_iso20022_toolbox.generate_messages --type camt.053 --entries 100000 --output ./corpus
+    python -m swift_iso20022_toolbox.generate_messages --type pacs.008 --messages 10000 --per-file 5000 --output ./bulk
+"""
+import argparse
+import os
+import random
+import uuid
+from datetime import date, timedelta
+from typing import Iterator, List
+from xml.sax.saxutils import escape, quoteattr
+
+from swift_iso20022_toolbox.xsd_schema import CompiledSchema, SchemaNode, find_xsd_files, load_schema
+
+DEFAULT_XSD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'sample_xsd_plain_baseline')
+
+# Message type -> (usage guideline file token, repeatable element scaled by --entries)
+MESSAGE_TYPES = {
+    'pacs.008': ('CBPRPlus-pacs_008_001_08_FIToFICustomerCreditTransfer', None),
+    'pacs.009': ('CBPRPlus-pacs_009_001_08_FinancialInstitutionCreditTransfer', None),
+    'camt.053': ('CBPRPlus-camt_053_001_08_BankToCustomerStatement', '/Document/BkToCstmrStmt/Stmt/Ntry'),
+    'pain.001': ('CBPRPlus-pain_001_001_09_CustomerCreditTransferInitiation', None),
+}
+
+APPHDR_NAMESPACE = 'urn:iso:std:iso:20022:tech:xsd:head.001.001.02'
+ENVELOPE_TAG = 'Envelope'
+BUSINESS_SERVICE = 'swift.cbprplus.02'
+
+# Optional elements filled in by the `typical` profile
+TYPICAL_OPTIONAL = {
+    'UETR', 'EndToEndId', 'InstrId', 'TxId', 'ChrgBr', 'IntrBkSttlmDt', 'SttlmPrty', 'BICFI', 'Nm',
+    'Ctry', 'TwnNm', 'IBAN', 'Ccy', 'Ustrd', 'RmtInf', 'PmtTpInf', 'InstrPrty', 'SvcLvl', 'Cd',
+    'AcctSvcrRef', 'BookgDt', 'ValDt', 'Dt', 'DtTm', 'NtryRef', 'NtryDtls', 'TxDtls', 'Refs', 'AmtDtls',
+    'Amt', 'InstdAmt', 'TxAmt', 'RltdPties', 'RltdAgts', 'DbtrAgt', 'CdtrAgt', 'Dbtr', 'Cdtr',
+    'DbtrAcct', 'CdtrAcct', 'ElctrncSeqNb', 'LglSeqNb', 'Bal', 'CdtDbtInd', 'Sts',
+}
+# Preferred branch for choices, when present; otherwise the first declared branch is used
+PREFERRED_CHOICES = ('BICFI', 'IBAN', 'Cd', 'Dt', 'Ustrd')
+
+SAMPLE_BICS = ('BANKGB2LXXX', 'BANKDEFFXXX', 'BANKFRPPXXX', 'BANKUS33XXX', 'BANKCHZZXXX', 'BANKJPJTXXX')
+SAMPLE_IBANS = ('GB29NWBK60161331926819', 'DE89370400440532013000', 'FR1420041010050500013M02606')
+
+BIC_PATTERN = '[A-Z0-9]{4,4}[A-Z]{2,2}[A-Z0-9]{2,2}([A-Z0-9]{3,3}){0,1}'
+UUID_PATTERN = '[a-f0-9]{8}-[a-f0-9]{4}-4[a-f0-9]{3}-[89ab][a-f0-9]{3}-[a-f0-9]{12}'
+IBAN_PATTERN = '[A-Z]{2,2}[0-9]{2,2}[a-zA-Z0-9]{1,30}'
+# Fixed sample values for the remaining XSD patterns (free-text FIN-X patterns use the text generator)
+PATTERN_VALUES = {
+    '[A-Z]{3,3}': 'EUR',
+    '[A-Z]{2,2}': 'GB',
+    '[A-Z0-9]{18,18}[0-9]{2,2}': '5493001KJTIIGC8Y1R12',
+    '[A-Z]{2,2}[A-Z0-9]{9,9}[0-9]{1,1}': 'US0378331005',
+    '[a-zA-Z0-9]{4}': 'AB12',
+    '[a-z]{2,2}': 'en',
+    '[\\+]{0,1}[0-9]{1,15}': '1',
+    '[0-9]{8,28}': '12345678',
+    '[0-9]{3}': '123',
+    '[0-9]{3,4}': '123',
+    '[0-9]{2,3}': '12',
+    '[0-9]{2}': '12',
+    '[0-9]{1,5}': '1',
+    '[0-9]{1,3}': '1',
+    '[0-9]{1,15}': '1',
+    '[0-9]': '1',
+    '\\+[0-9]{1,3}-[0-9()+\\-]{1,30}': '+44-2071234567',
+}
+BASE_DATE = date(2025, 6, 1)
+
+
+class MessageGenerator:
+    """Streams synthetic messages for one compiled usage guideline schema."""
+
+    def __init__(self, schema: CompiledSchema, profile: str = 'typical', seed: int = 0, repeat_path: str = None):
+        if profile not in ('minimal', 'typical', 'full'):
+            raise ValueError(f"Unknown profile: {profile}")
+        self.schema = schema
+        self.profile = profile
+        self.repeat_path = repeat_path
+        self.rng = random.Random(seed)
+
+    def _include(self, node: SchemaNode) -> bool:
+        if node.min_occurs >= 1 or node.path == self.repeat_path:
+            return True
+        if self.profile == 'full':
+            return True
+        return self.profile == 'typical' and node.name in TYPICAL_OPTIONAL
+
+    def _select_children(self, node: SchemaNode) -> List[SchemaNode]:
+        if node.children and all(child.choice for child in node.children):
+            for preferred in PREFERRED_CHOICES:
+                for child in node.children:
+                    if child.name == preferred:
+                        return [child]
+            return [node.children[0]]
+        return [child for child in node.children if self._include(child)]
+
+    def _value(self, name: str, simple, seq: int, item: int) -> str:
+        if name in ('MsgId', 'BizMsgIdr', 'PmtInfId'):
+            return f"MSG{seq:010d}"
+        if name in ('InstrId', 'EndToEndId', 'TxId', 'NtryRef', 'AcctSvcrRef'):
+            return f"{name[:3].upper()}{seq:08d}N{item:06d}"[:35]
+        if simple is None:
+            return ''
+        if simple.enumerations:
+            return simple.enumerations[0]
+        if simple.pattern == BIC_PATTERN:
+            return SAMPLE_BICS[(seq + item) % len(SAMPLE_BICS)]
+        if simple.pattern == UUID_PATTERN:
+            return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+        if simple.pattern == IBAN_PATTERN:
+            return SAMPLE_IBANS[(seq + item) % len(SAMPLE_IBANS)]
+        if simple.pattern in PATTERN_VALUES:
+            return PATTERN_VALUES[simple.pattern]
+        day = BASE_DATE + timedelta(days=(seq + item) % 28)
+        if simple.base == 'xs:date':
+            return day.isoformat()
+        if simple.base == 'xs:dateTime':
+            return f"{day.isoformat()}T10:{item % 60:02d}:{seq % 60:02d}+00:00"
+        if simple.base == 'xs:time':
+            return f"10:{item % 60:02d}:{seq % 60:02d}+00:00"
+        if simple.base == 'xs:gYearMonth':
+            return day.strftime('%Y-%m')
+        if simple.base == 'xs:boolean':
+            return 'true'
+        if simple.base == 'xs:decimal':
+            fraction = simple.fraction_digits if simple.fraction_digits is not None else 2
+            integer = (seq * 7919 + item * 104729) % 100000 + 1
+            if fraction >= 2:
+                return f"{integer}.{(seq + item) % 100:02d}"
+            return str(integer)
+        text = f"{name}{seq}"
+        if simple.max_length is not None:
+            text = text[-simple.max_length:]
+        if simple.min_length is not None and len(text) < simple.min_length:
+            text = text.ljust(simple.min_length, 'X')
+        return text
+
+    def _emit(self, node: SchemaNode, indent: str, seq: int, item: int, entries: int) -> Iterator[str]:
+        occurrences = entries if node.path == self.repeat_path else 1
+        for occurrence in range(occurrences):
+            child_item = occurrence if node.path == self.repeat_path else item
+            attributes = ''.join(
+                f" {attr_name}={quoteattr(self._value(attr_name, attr_type, seq, child_item))}"
+                for attr_name, attr_type, required in node.attributes if required
+            )
+            children = self._select_children(node)
+            if children:
+                yield f"{indent}<{node.name}{attributes}>\n"
+                for child in children:
+                    yield from self._emit(child, indent + '    ', seq, child_item, entries)
+                yield f"{indent}</{node.name}>\n"
+            else:
+                yield f"{indent}<{node.name}{attributes}>{escape(self._value(node.name, node.simple_type, seq, child_item))}</{node.name}>\n"
+
+    def render(self, seq: int = 0, entries: int = 1) -> Iterator[str]:
+        """Yield the XML text of one enveloped message (AppHdr + Document) in chunks."""
+        yield from self.render_bulk([seq], entries)
+
+    def render_bulk(self, seqs: List[int], entries: int = 1) -> Iterator[str]:
+        """Yield the XML text of one envelope holding an AppHdr + Document pair per sequence number."""
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield f"<{ENVELOPE_TAG}>\n"
+        for seq in seqs:
+            yield from self._render_message(seq, entries)
+        yield f"</{ENVELOPE_TAG}>\n"
+
+    def _render_message(self, seq: int, entries: int) -> Iterator[str]:
+        fr = SAMPLE_BICS[seq % len(SAMPLE_BICS)]
+        to = SAMPLE_BICS[(seq + 1) % len(SAMPLE_BICS)]
+        credt = BASE_DATE + timedelta(days=seq % 28)
+        yield f'    <AppHdr xmlns="{APPHDR_NAMESPACE}">\n'
+        yield f"        <Fr><FIId><FinInstnId><BICFI>{fr}</BICFI></FinInstnId></FIId></Fr>\n"
+        yield f"        <To><FIId><FinInstnId><BICFI>{to}</BICFI></FinInstnId></FIId></To>\n"
+        yield f"        <BizMsgIdr>MSG{seq:010d}</BizMsgIdr>\n"
+        yield f"        <MsgDefIdr>{self.schema.base_message}</MsgDefIdr>\n"
+        yield f"        <BizSvc>{BUSINESS_SERVICE}</BizSvc>\n"
+        yield f"        <CreDt>{credt.isoformat()}T09:30:00Z</CreDt>\n"
+        yield '    </AppHdr>\n'
+        root = self.schema.root
+        yield f'    <{root.name} xmlns="{self.schema.target_namespace}">\n'
+        for child in self._select_children(root):
+            yield from self._emit(child, '        ', seq, 0, entries)
+        yield f"    </{root.name}>\n"
+
+
+def find_message_xsd(msg_type: str, xsd_folder: str = DEFAULT_XSD_FOLDER) -> str:
+    """Return the usage guideline XSD for a supported message type."""
+    if msg_type not in MESSAGE_TYPES:
+        raise ValueError(f"Unsupported message type: {msg_type} (supported: {', '.join(MESSAGE_TYPES)})")
+    token = MESSAGE_TYPES[msg_type][0]
+    for path in find_xsd_files(xsd_folder):
+        if token in os.path.basename(path):
+            return path
+    raise FileNotFoundError(f"No XSD for {msg_type} ({token}) found in {xsd_folder}")
+
+
+def get_generator(msg_type: str, xsd_folder: str = DEFAULT_XSD_FOLDER, profile: str = 'typical', seed: int = 0) -> MessageGenerator:
+    schema = load_schema(find_message_xsd(msg_type, xsd_folder))
+    return MessageGenerator(schema, profile=profile, seed=seed, repeat_path=MESSAGE_TYPES[msg_type][1])
+
+
+def generate_message(msg_type: str, output_path: str, seq: int = 0, entries: int = 1,
+                     xsd_folder: str = DEFAULT_XSD_FOLDER, profile: str = 'typical', seed: int = 0) -> str:
+    """Write a single message to `output_path` and return the path."""
+    generator = get_generator(msg_type, xsd_folder, profile, seed)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.writelines(generator.render(seq, entries))
+    return output_path
+
+
+def generate_corpus(output_dir: str, msg_types: List[str] = None, messages: int = 1, entries: int = 1,
+                    xsd_folder: str = DEFAULT_XSD_FOLDER, profile: str = 'typical', seed: int = 0,
+                    per_file: int = 1) -> List[str]:
+    """
+    Write `messages` messages per message type into `output_dir` and return the file paths.
+    With `per_file` = 1, file names are `<type>_<seq>.xml`, e.g. `pacs.008_000001.xml`. With `per_file` > 1,
+    messages are grouped into bulk files of up to `per_file` AppHdr/Document pairs in one envelope,
+    named `<type>_bulk_<n>.xml`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for msg_type in msg_types or list(MESSAGE_TYPES):
+        generator = get_generator(msg_type, xsd_folder, profile, seed)
+        if per_file > 1:
+            for start in range(1, messages + 1, per_file):
+                path = os.path.join(output_dir, f"{msg_type}_bulk_{start // per_file + 1:06d}.xml")
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.writelines(generator.render_bulk(range(start, min(start + per_file, messages + 1)), entries))
+                paths.append(path)
+            continue
+        for seq in range(1, messages + 1):
+            path = os.path.join(output_dir, f"{msg_type}_{seq:06d}.xml")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.writelines(generator.render(seq, entries))
+            paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic ISO20022 CBPR+ messages from the baseline XSDs.")
+    parser.add_argument('--type', dest='types', action='append', choices=list(MESSAGE_TYPES),
+                        help='Message type to generate (repeatable, default: all supported types)')
+    parser.add_argument('--messages', type=int, default=1, help='Number of messages per message type')
+    parser.add_argument('--per-file', type=int, default=1, help='Messages per file (> 1 writes bulk envelope files)')
+    parser.add_argument('--entries', type=int, default=1, help='Repetitions of the repeatable body element (camt.053 Ntry)')
+    parser.add_argument('--profile', type=str, default='typical', choices=['minimal', 'typical', 'full'], help='Optional element fill level')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (UETR values)')
+    parser.add_argument('--xsd-folder', type=str, default=DEFAULT_XSD_FOLDER, help='Folder containing the usage guideline XSD files')
+    parser.add_argument('--output', type=str, default='./generated_corpus', help='Output directory')
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.output, args.types, args.messages, args.entries, args.xsd_folder, args.profile, args.seed,
+                            args.per_file)
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    print(f"Generated {len(paths)} message file(s), {total_bytes} bytes, in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@
 
 import streamlit as st
 import pandas as pd
+from swift_iso20022_toolbox import instrumentation
 
 # Reference
 # https://docs.kanaries.net/topics/Streamlit/streamlit-upload-file
@@ -18,7 +19,7 @@ st.title("SWIFT Payment ISO 20022 Toolbox v1.0")
 # Sidebar for navigation
 page = st.sidebar.radio(
     "Select a page",
-    ("CSV Upload", "XML Upload", "Aggregate Excel Metadata", "Extract XSD Metadata")
+    ("CSV Upload", "XML Upload", "Aggregate Excel Metadata", "Extract XSD Metadata", "Search Extract Store", "Corpus Profile", "Schema Release Diff")
 )
 
 if page == "CSV Upload":
@@ -42,28 +43,22 @@ if page == "CSV Upload":
 
 elif page == "XML Upload":
     st.header("XML File Upload")
-    uploaded_xml = st.file_uploader("Upload an XML file", type=['xml'])
+    uploaded_xml = st.file_uploader("Upload an XML file or an archive of XML files", type=['xml', 'zip', 'tar', 'gz', 'tgz'])
     if uploaded_xml is not None:
         st.write(f"Uploaded file name: {uploaded_xml.name}")
-        from swift_iso20022_toolbox import xml_to_xpath
-        import tempfile
+        from swift_iso20022_toolbox.sources import parse_sources
         import pandas as pd
         import io
         import xlsxwriter
 
-        # Save uploaded file to a temporary file (since xml_to_xpath expects a path)
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xml') as tmp_file:
-            tmp_file.write(uploaded_xml.read())
-            tmp_file_path = tmp_file.name
-
-        # Parse XML and get results
-        results, xsd, msgid, fr, to, credt, bizmsgidr, bizsvc = xml_to_xpath.parse_xml_to_xpath_and_value(tmp_file_path)
+        # Parse the upload in memory (archive members are streamed, nothing is written to disk)
+        rows = []
+        with instrumentation.instrumented('xml_to_xpath') as run_metrics:
+            for results, xsd, msgid, fr, to, credt, bizmsgidr, bizsvc in parse_sources(uploaded_xml.name, fileobj=io.BytesIO(uploaded_xml.getvalue())):
+                rows.extend(list(row) + [xsd, msgid, fr, to, credt, bizmsgidr, bizsvc] for row in results)
         # Prepare DataFrame
         columns = ["XPath", "XPath_strip", "Value", "File Path", "File Name", "XSD", "MsgId", "Fr", "To", "Credt", "BizMsgIdr", "BizSvc"]
-        df = pd.DataFrame([
-            list(row) + [xsd, msgid, fr, to, credt, bizmsgidr, bizsvc]
-            for row in results
-        ], columns=columns)
+        df = pd.DataFrame(rows, columns=columns)
         # Let the user choose which columns to display
         all_columns = df.columns.tolist()
         selected_columns = st.multiselect(
@@ -72,6 +67,8 @@ elif page == "XML Upload":
             default=all_columns
         )
         st.dataframe(df[selected_columns])
+        with st.expander("Performance summary"):
+            st.table(pd.DataFrame(instrumentation.summary_rows(run_metrics.snapshot())))
 
         # Download options
         csv_buffer = io.StringIO()
@@ -96,8 +93,7 @@ elif page == "Aggregate Excel Metadata":
     st.header("Aggregate ISO20022 XSD Compact View (Excel Files)")
     import os
     from swift_iso20022_toolbox import aggregate_metadata
-    import tempfile
-    import shutil
+    from swift_iso20022_toolbox.sources import memory_archive
     # List baseline files
     baseline_dir = os.path.join("data", "sample_xsd_excel_baseline")
     try:
@@ -157,33 +153,24 @@ elif page == "Aggregate Excel Metadata":
             st.write(f.name)
         if st.button("Run Aggregation"):
             with st.spinner("Aggregating metadata..."):
-                # Save uploaded files to a temp dir
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    for file in uploaded_excels:
-                        file_path = os.path.join(temp_dir, file.name)
-                        with open(file_path, "wb") as out_f:
-                            out_f.write(file.read())
-                    # Ensure output directory exists
-                    os.makedirs("data", exist_ok=True)
-                    # Run aggregation, output to custom file
-                    try:
-                        aggregate_metadata.aggregate_excel_folder(temp_dir)
-                        # Move result to ./data/ with custom name
-                        if os.path.exists("CBPRPlus_SR2025_Metadata_Aggregated.xlsx"):
-                            shutil.move(
-                                "CBPRPlus_SR2025_Metadata_Aggregated.xlsx",
-                                custom_agg_file
-                            )
-                        st.success("Custom aggregation complete! Download your result above.")
-                    except Exception as e:
-                        st.error(f"Aggregation failed: {e}")
+                # Ensure output directory exists
+                os.makedirs("data", exist_ok=True)
+                # Run aggregation on the uploads in memory (no temporary copies), output to custom file
+                try:
+                    uploads = memory_archive((file.name, file.getvalue()) for file in uploaded_excels)
+                    with instrumentation.instrumented('aggregate_metadata') as run_metrics:
+                        aggregate_metadata.aggregate_excel_folder('uploads.zip', output_path=custom_agg_file, fileobj=uploads)
+                    st.success("Custom aggregation complete! Download your result above.")
+                    with st.expander("Performance summary"):
+                        st.table(pd.DataFrame(instrumentation.summary_rows(run_metrics.snapshot())))
+                except Exception as e:
+                    st.error(f"Aggregation failed: {e}")
 
 elif page == "Extract XSD Metadata":
     st.header("Extract ISO20022 XSD Metadata (XSD Files)")
     import os
     from swift_iso20022_toolbox import extract_xsd_versions
-    import tempfile
-    import shutil
+    from swift_iso20022_toolbox.sources import memory_archive
     # List baseline files
     baseline_dir = os.path.join("data", "sample_xsd_plain_baseline")
     try:
@@ -237,45 +224,145 @@ elif page == "Extract XSD Metadata":
             st.write(f.name)
         if st.button("Run XSD Metadata Extraction"):
             with st.spinner("Extracting XSD metadata..."):
-                # Save uploaded files to a temp dir
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    for file in uploaded_xsds:
-                        file_path = os.path.join(temp_dir, file.name)
-                        with open(file_path, "wb") as out_f:
-                            out_f.write(file.read())
-                    # Ensure output directory exists
-                    os.makedirs("data", exist_ok=True)
-                    # Run extraction, output to custom file
-                    try:
-                        extract_xsd_versions.extract_metadata_and_save(temp_dir, 100, custom_xsd_metadata)
-                        st.success("Custom XSD metadata extraction complete! Download your result above.")
-                    except Exception as e:
-                        st.error(f"XSD metadata extraction failed: {e}")
-
-st.sidebar.markdown("---")
-st.sidebar.info("You can hide this sidebar using the arrow above.")
+                # Ensure output directory exists
+                os.makedirs("data", exist_ok=True)
+                # Run extraction on the uploads in memory (no temporary copies), output to custom file
+                try:
+                    uploads = memory_archive((file.name, file.getvalue()) for file in uploaded_xsds)
+                    with instrumentation.instrumented('extract_xsd_versions') as run_metrics:
+                        extract_xsd_versions.extract_metadata_and_save('uploads.zip', 100, custom_xsd_metadata, fileobj=uploads)
+                    st.success("Custom XSD metadata extraction complete! Download your result above.")
+                    with st.expander("Performance summary"):
+                        st.table(pd.DataFrame(instrumentation.summary_rows(run_metrics.snapshot())))
+                except Exception as e:
+                    st.error(f"XSD metadata extraction failed: {e}")
 
-
-def main():
+elif page == "Search Extract Store":
+    st.header("Search Extract Store")
     import os
-    import sys
+    from swift_iso20022_toolbox.store import DEFAULT_STORE, ExtractStore
 
-    # Check for our custom flag to avoid streamlit from relaunching
-    if os.environ.get("ISO20022_TOOLBOX_RUNNING") == "1":
-        print("DEBUG: Already running, not launching subprocess")
-        return
+    @st.cache_data(ttl=300, show_spinner=False)
+    def store_stats(path: str, modified: float) -> dict:
+        # COUNT(*) scans the tables: counted once per store modification, not on every rerun
+        cached_store = ExtractStore(path, read_only=True)
+        try:
+            return cached_store.stats()
+        finally:
+            cached_store.close()
 
-    # Only launch streamlit if not already running as a Streamlit script
-    if not any("streamlit" in arg for arg in sys.argv[0:2]) and not any(k.startswith("STREAMLIT") for k in os.environ):
-        script_path = os.path.abspath(__file__)
-        print("DEBUG: Launching streamlit run", script_path)
-        # Set the flag for the subprocess
-        env = os.environ.copy()
-        env["ISO20022_TOOLBOX_RUNNING"] = "1"
-        import subprocess
-        subprocess.run(["streamlit", "run", script_path], env=env)
+    store_path = st.text_input("Store file (created with `iso20022 store load` or `xml_to_xpath.py --store`):", value=DEFAULT_STORE)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        msgid = st.text_input("MsgId")
+        bizmsgidr = st.text_input("BizMsgIdr")
+        uetr = st.text_input("UETR")
+    with col2:
+        msg_type = st.text_input("Message type (e.g. pacs.008)")
+        file_name = st.text_input("File (path or name)")
+        limit = st.number_input("Max. messages", min_value=1, value=1000)
+    with col3:
+        xpath_strip = st.text_input("XPath_strip (e.g. /Document/FIToFICstmrCdtTrf/CdtTrfTxInf/IntrBkSttlmAmt)")
+        value = st.text_input("Value of that XPath_strip")
+        since = st.text_input("CreDt from (e.g. 2025-06-01)")
+        until = st.text_input("CreDt until")
+    if not os.path.exists(store_path):
+        st.info(f"Store not found: {store_path}")
     else:
-        print("DEBUG: Not launching subprocess")
+        store = ExtractStore(store_path, read_only=True)
+        try:
+            stats = store_stats(os.path.abspath(store_path), os.path.getmtime(store_path))
+            st.caption(f"{stats['messages']} messages, {stats['fields']} fields, {stats['uetrs']} UETRs")
+            if st.button("Search"):
+                criteria = dict(msgid=msgid, bizmsgidr=bizmsgidr, uetr=uetr, msg_type=msg_type, file=file_name,
+                                xpath_strip=xpath_strip, value=value, since=since, until=until)
+                st.session_state['store_criteria'] = {k: v for k, v in criteria.items() if v}
+            if 'store_criteria' in st.session_state:
+                messages = store.find_messages(limit=int(limit), **st.session_state['store_criteria'])
+                st.write(f"{len(messages)} message(s) found")
+                if messages:
+                    st.dataframe(pd.DataFrame(messages))
+                    message_id = st.selectbox("Show fields of message id:", [m['id'] for m in messages])
+                    st.dataframe(pd.DataFrame(store.message_fields(message_id)))
+        finally:
+            store.close()
+
+elif page == "Corpus Profile":
+    st.header("Corpus Profile")
+    import io
+    import json
+    from swift_iso20022_toolbox.corpus_profile import REPORT_COLUMNS, CorpusProfile, profile_sources
+    st.caption("Profile XML messages or archives, and/or merge profiles saved with `iso20022 profile run --profile`.")
+    uploaded_files = st.file_uploader("Upload XML files, archives or saved profiles (.json)",
+                                      type=['xml', 'zip', 'tar', 'gz', 'tgz', 'json'], accept_multiple_files=True)
+    if uploaded_files:
+        profile = CorpusProfile()
+        with instrumentation.instrumented('corpus_profile') as run_metrics:
+            for uploaded in uploaded_files:
+                if uploaded.name.endswith('.json'):
+                    try:
+                        profile.merge(CorpusProfile.from_dict(json.loads(uploaded.getvalue()), uploaded.name))
+                    except (ValueError, KeyError) as e:
+                        st.error(f"{uploaded.name}: {e}")
+                else:
+                    profile.merge(profile_sources(uploaded.name, fileobj=io.BytesIO(uploaded.getvalue())))
+        df = pd.DataFrame(profile.rows(), columns=REPORT_COLUMNS)
+        st.write(f"{sum(profile.messages.values())} message(s): "
+                 + ", ".join(f"{msg_type} {count}" for msg_type, count in sorted(profile.messages.items())))
+        msg_types = st.multiselect("Message types:", options=sorted(profile.messages), default=sorted(profile.messages))
+        max_fill_rate = st.slider("Show XPaths with fill rate up to:", min_value=0.0, max_value=1.0, value=1.0)
+        st.dataframe(df[df['MsgType'].isin(msg_types) & (df['FillRate'] <= max_fill_rate)])
+        with st.expander("Performance summary"):
+            st.table(pd.DataFrame(instrumentation.summary_rows(run_metrics.snapshot())))
+        st.download_button(label="Download as CSV", data=df.to_csv(index=False), file_name="corpus_profile.csv",
+                           mime="text/csv")
+        excel_buffer = io.BytesIO()
+        with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
+            df.to_excel(writer, index=False, sheet_name='Profile')
+        st.download_button(label="Download as Excel", data=excel_buffer.getvalue(), file_name="corpus_profile.xlsx",
+                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+elif page == "Schema Release Diff":
+    st.header("Schema Release Diff")
+    import io
+    import os
+    from swift_iso20022_toolbox.schema_diff import DIFF_COLUMNS, diff_releases, summary_rows
+    st.caption("Each release is a folder of XSDs and/or MyStandards Excel exports, an .xsd file or an (aggregated) .xlsx workbook.")
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    col1, col2 = st.columns(2)
+    with col1:
+        old_path = st.text_input("Previous release:", value=os.path.join(base_dir, 'data', 'sample_xsd_plain_baseline'))
+    with col2:
+        new_path = st.text_input("New release:", value=os.path.join(base_dir, 'data', 'sample_xsd_plain_baseline'))
+    workers = st.number_input("Worker processes (Excel workbooks)", min_value=1, value=1)
+    if st.button("Compare releases"):
+        missing = [path for path in (old_path, new_path) if not os.path.exists(path)]
+        if missing:
+            st.error(f"Not found: {', '.join(missing)}")
+        else:
+            with instrumentation.instrumented('schema_diff') as run_metrics:
+                rows = diff_releases(old_path, new_path, workers=int(workers))
+            st.session_state['schema_diff'] = (rows, run_metrics.snapshot())
+    if 'schema_diff' in st.session_state:
+        rows, snapshot = st.session_state['schema_diff']
+        if not rows:
+            st.success("No differences between the releases.")
+        else:
+            st.dataframe(pd.DataFrame(summary_rows(rows)))
+            df = pd.DataFrame(rows, columns=DIFF_COLUMNS)
+            changes = st.multiselect("Changes:", options=['added', 'removed', 'changed'], default=['added', 'removed', 'changed'])
+            sources = st.multiselect("Sources:", options=sorted(df['Source'].unique()), default=sorted(df['Source'].unique()))
+            st.dataframe(df[df['Change'].isin(changes) & df['Source'].isin(sources)])
+            st.download_button(label="Download as CSV", data=df.to_csv(index=False), file_name="schema_diff.csv",
+                               mime="text/csv")
+            excel_buffer = io.BytesIO()
+            with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
+                df.to_excel(writer, index=False, sheet_name='Schema_Diff')
+            st.download_button(label="Download as Excel", data=excel_buffer.getvalue(), file_name="schema_diff.xlsx",
+                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        with st.expander("Performance summary"):
+            st.table(pd.DataFrame(instrumentation.summary_rows(snapshot)))
+
+st.sidebar.markdown("---")
+st.sidebar.info("You can hide this sidebar using the arrow above.")
 
-if __name__ == "__main__":
-    main()
@@ -0,0 +1,369 @@
+"""
+ISO20022 Toolbox Regression Harness
+-----------------------------------
+Runs the command-line tools on fixed inputs, compares their outputs with the golden files in `data/golden`
+and checks run time and peak memory against the budgets in `data/golden/budgets.json` and against the
+previous runs recorded in a history file.
+
+Features:
+- Cases (CASES): the XPath extractor on a generated corpus (fixed seed), a generated bulk file and
+  `data/sample_xml_edge_cases`, also through the `xml_to_xpath_v2` alias and the expat and lxml backends
+  against the same golden file, so the modules and backends cannot drift apart unnoticed; the XSD metadata
+  extraction on `data/sample_xsd_plain_baseline` and the Excel aggregation on `data/sample_xsd_excel_baseline`.
+- Every case runs the tool's main() in a fresh interpreter, which reports its run time (best of `--repeat`)
+  and peak RSS. Outputs are normalised before the comparison: the work and data folders are replaced by
+  `<work>`/`<data>`, and for tools that list folder files in directory order, lines are sorted.
+- A case fails when its output differs from the golden file (the first differing line is shown), when it
+  exceeds its absolute budget (max_seconds, max_peak_rss_mb), or when it is more than `tolerance` slower or
+  larger than the median of its last `history_window` passing runs on the same host (time differences below
+  `noise_seconds` are ignored).
+- Every run is appended to the history file (JSON lines); `--trend` prints the time and memory of the last
+  runs per case. Cases whose dependencies are missing (e.g. pandas for the aggregation) are skipped.
+- `--update-golden` rewrites the golden files from the current outputs (gzip, reproducible bytes).
+- Slow cases (the Excel aggregation, minutes and over 1 GB of memory) run here and through `pytest -m slow`;
+  `make test` leaves them out.
+
+Usage Example:
+    python -m swift_iso20022_toolbox.regression
+    python -m swift_iso20022_toolbox.regression --case xpath --repeat 5 --history ./regression_history.jsonl
+    python -m swift_iso20022_toolbox.regression --update-golden
+    python -m swift_iso20022_toolbox.regression --trend
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from importlib import util
+from typing import List
+
+from swift_iso20022_toolbox.benchmark import DATA_FOLDER, DEFAULT_XSD_FOLDER, _environment
+from swift_iso20022_toolbox.generate_messages import MESSAGE_TYPES, generate_corpus
+
+GOLDEN_FOLDER = os.path.join(DATA_FOLDER, 'golden')
+BUDGETS_FILE = os.path.join(GOLDEN_FOLDER, 'budgets.json')
+DEFAULT_HISTORY = 'regression_history.jsonl'
+DEFAULT_TOLERANCE = 0.3
+DEFAULT_HISTORY_WINDOW = 5
+# Time differences below this are measurement noise, not regressions
+DEFAULT_NOISE_SECONDS = 0.05
+# Generated inputs; the golden files depend on these values
+CORPUS = {'messages': 5, 'entries': 50, 'bulk_messages': 200, 'seed': 0}
+
+_XPATH_ARGS = ['{output}', '--text-only', '--quiet', '--sort', '--sort-key', 'file']
+# name, module run as __main__, arguments, input ({corpus}, {bulk}, {data}: folders; {output}: output file),
+# output ('stdout' or a file name written to the working directory; default {output}), golden file, sort_lines
+# (outputs listing folder files in directory order; rows per sheet for xlsx), sheets (xlsx outputs; Process_Metadata
+# holds the run time and is left out), requires (optional modules), slow (left out of `make test`, run by the harness)
+CASES = [
+    {'name': 'xpath[corpus]', 'module': 'swift_iso20022_toolbox.xml_to_xpath', 'input': '{corpus}',
+     'args': ['{corpus}'] + _XPATH_ARGS, 'golden': 'xpath_corpus.txt.gz'},
+    {'name': 'xpath_v2[corpus]', 'module': 'swift_iso20022_toolbox.xml_to_xpath_v2', 'input': '{corpus}',
+     'args': ['{corpus}'] + _XPATH_ARGS, 'golden': 'xpath_corpus.txt.gz'},
+    {'name': 'xpath[corpus, expat]', 'module': 'swift_iso20022_toolbox.xml_to_xpath', 'input': '{corpus}',
+     'args': ['{corpus}'] + _XPATH_ARGS + ['--backend', 'expat'], 'golden': 'xpath_corpus.txt.gz'},
+    {'name': 'xpath[corpus, lxml]', 'module': 'swift_iso20022_toolbox.xml_to_xpath', 'input': '{corpus}',
+     'args': ['{corpus}'] + _XPATH_ARGS + ['--backend', 'lxml'], 'golden': 'xpath_corpus.txt.gz', 'requires': ['lxml']},
+    {'name': 'xpath[bulk]', 'module': 'swift_iso20022_toolbox.xml_to_xpath', 'input': '{bulk}',
+     'args': ['{bulk}'] + _XPATH_ARGS, 'golden': 'xpath_bulk.txt.gz'},
+    {'name': 'xpath[edge_cases]', 'module': 'swift_iso20022_toolbox.xml_to_xpath', 'input': '{data}/sample_xml_edge_cases',
+     'args': ['{data}/sample_xml_edge_cases'] + _XPATH_ARGS, 'golden': 'xpath_edge_cases.txt.gz'},
+    {'name': 'xsd-meta[baseline]', 'module': 'swift_iso20022_toolbox.extract_xsd_versions',
+     'input': '{data}/sample_xsd_plain_baseline', 'output': 'stdout', 'sort_lines': True,
+     'args': ['--folder', '{data}/sample_xsd_plain_baseline', '--format', 'text', '--lines', '100'],
+     'golden': 'xsd_meta_baseline.txt.gz'},
+    {'name': 'aggregate[baseline]', 'module': 'swift_iso20022_toolbox.aggregate_metadata',
+     'input': '{data}/sample_xsd_excel_baseline', 'output': 'CBPRPlus_SR2025_Metadata_Aggregated.xlsx',
+     'sheets': ['CBPRPlus_XSD_Full_View', 'Legend', 'Process_FilesList'], 'sort_lines': True, 'requires': ['pandas', 'openpyxl'],
+     'args': ['--folder', '{data}/sample_xsd_excel_baseline'], 'golden': 'aggregate_baseline.txt.gz', 'slow': True},
+]
+
+# Runs a tool's main() and reports its run time, peak RSS and exit status as the last line of stderr. The peak
+# is VmHWM where /proc is available: ru_maxrss keeps the parent's peak from before the exec on Linux.
+_PROBE = (
+    "import json, resource, runpy, sys, time\n"
+    "module, args = json.loads(sys.argv[1])\n"
+    "sys.argv = [module] + args\n"
+    "status = 0\n"
+    "start = time.perf_counter()\n"
+    "try:\n"
+    "    runpy.run_module(module, run_name='__main__', alter_sys=True)\n"
+    "except SystemExit as e:\n"
+    "    status = e.code if isinstance(e.code, int) else int(e.code is not None)\n"
+    "seconds = time.perf_counter() - start\n"
+    "sys.stdout.flush()\n"
+    "peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)\n"
+    "try:\n"
+    "    with open('/proc/self/status') as f:\n"
+    "        peak = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:')) / 1024\n"
+    "except (OSError, StopIteration):\n"
+    "    pass\n"
+    "sys.stderr.write('\\n' + json.dumps({'seconds': seconds, 'peak_rss_mb': peak, 'exit': status}))\n"
+)
+
+
+def _size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def generate_inputs(work_dir: str, xsd_folder: str = DEFAULT_XSD_FOLDER) -> dict:
+    """Generate the corpus and bulk inputs (CORPUS) in `work_dir`; return the folders by placeholder name."""
+    corpus = os.path.join(work_dir, 'corpus')
+    generate_corpus(corpus, list(MESSAGE_TYPES), messages=CORPUS['messages'], entries=CORPUS['entries'],
+                    xsd_folder=xsd_folder, seed=CORPUS['seed'])
+    bulk = os.path.join(work_dir, 'bulk')
+    generate_corpus(bulk, ['pacs.008'], messages=CORPUS['bulk_messages'], xsd_folder=xsd_folder, seed=CORPUS['seed'],
+                    per_file=CORPUS['bulk_messages'])
+    return {'corpus': corpus, 'bulk': bulk, 'data': DATA_FOLDER}
+
+
+def _normalize(text: str, folders: dict, work_dir: str, sort_lines: bool = False) -> str:
+    # Longest paths first, so that a folder inside another one keeps its own placeholder
+    for name, path in sorted(folders.items(), key=lambda item: -len(item[1])):
+        text = text.replace(path, '<' + name + '>')
+    text = text.replace(work_dir, '<work>')
+    lines = text.splitlines()
+    if sort_lines and lines:
+        lines = lines[:1] + sorted(lines[1:])
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\r', '\\r').replace('\n', '\\n')
+
+
+def _sheet_text(path: str, sheets: List[str], sort_rows: bool = False) -> str:
+    """One line per row (header row first), cell line breaks escaped; with `sort_rows`, rows are sorted per sheet."""
+    from swift_iso20022_toolbox.schema_diff import read_sheet
+    parts = []
+    for sheet in sheets:
+        rows = [' | '.join('' if value is None else _escape(value) for value in row) for row in read_sheet(path, [sheet]) or []]
+        if sort_rows:
+            rows = rows[:1] + sorted(rows[1:])
+        parts.append(f"[{sheet}]")
+        parts.extend(rows)
+    return '\n'.join(parts)
+
+
+def read_golden(name: str) -> str:
+    path = os.path.join(GOLDEN_FOLDER, name)
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def write_golden(name: str, text: str):
+    """Write a golden file as gzip with a zero timestamp, so unchanged outputs give unchanged bytes."""
+    os.makedirs(GOLDEN_FOLDER, exist_ok=True)
+    buffer = io.BytesIO()
+    with gzip.GzipFile(filename='', mode='wb', fileobj=buffer, mtime=0) as f:
+        f.write(text.encode('utf-8'))
+    with open(os.path.join(GOLDEN_FOLDER, name), 'wb') as f:
+        f.write(buffer.getvalue())
+
+
+def _first_difference(expected: str, actual: str) -> str:
+    expected_lines, actual_lines = expected.splitlines(), actual.splitlines()
+    for number, (before, after) in enumerate(zip(expected_lines, actual_lines), 1):
+        if before != after:
+            return f"line {number}: expected {before[:200]!r}, got {after[:200]!r}"
+    return f"{len(expected_lines)} line(s) expected, {len(actual_lines)} written"
+
+
+def run_case(case: dict, folders: dict, work_dir: str, repeat: int = 1) -> dict:
+    """Run one case `repeat` times in fresh interpreters; return its record with the normalised output."""
+    record = {'name': case['name'], 'module': case['module']}
+    missing = [module for module in case.get('requires', []) if util.find_spec(module) is None]
+    if missing:
+        record.update(status='skipped', reason=f"missing: {', '.join(missing)}")
+        return record
+    run_dir = os.path.join(work_dir, 'runs', case['name'].replace('[', '_').replace(']', '').replace(', ', '_'))
+    os.makedirs(run_dir, exist_ok=True)
+    output = os.path.join(run_dir, 'output.txt')
+    values = dict(folders, output=output)
+    args = [arg.format(**values) for arg in case['args']]
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_root, env.get('PYTHONPATH')]))
+    timings, peaks = [], []
+    for _ in range(max(repeat, 1)):
+        completed = subprocess.run([sys.executable, '-c', _PROBE, json.dumps([case['module'], args])], cwd=run_dir,
+                                   env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+        try:
+            probe = json.loads(completed.stderr.decode('utf-8', 'replace').strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            probe = {'exit': completed.returncode}
+        if probe.get('exit') or 'seconds' not in probe:
+            record.update(status='failed', reasons=[f"exit status {probe.get('exit')}: "
+                                                    f"{completed.stderr.decode('utf-8', 'replace').strip()[-500:]}"])
+            return record
+        timings.append(probe['seconds'])
+        peaks.append(probe['peak_rss_mb'])
+    target = case.get('output')
+    if target == 'stdout':
+        text = completed.stdout.decode('utf-8', 'replace')
+    else:
+        path = output if target is None else os.path.join(run_dir, target)
+        if case.get('sheets'):
+            text = _sheet_text(path, case['sheets'], case.get('sort_lines', False))
+        else:
+            with open(path, encoding='utf-8', newline='') as f:
+                text = f.read()
+    size_bytes = _size(case['input'].format(**values))
+    best = min(timings)
+    record.update(status='ok', seconds=best, seconds_median=statistics.median(timings), repeat=len(timings),
+                  peak_rss_mb=max(peaks), bytes=size_bytes, mb_per_sec=size_bytes / 1e6 / best if best else None,
+                  golden=case['golden'], output=_normalize(text, folders, work_dir, case.get('sort_lines', False) and not case.get('sheets')))
+    return record
+
+
+def load_budgets(path: str = BUDGETS_FILE) -> dict:
+    if not os.path.exists(path):
+        return {'tolerance': DEFAULT_TOLERANCE, 'history_window': DEFAULT_HISTORY_WINDOW,
+                'noise_seconds': DEFAULT_NOISE_SECONDS, 'cases': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_history(path: str) -> List[dict]:
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(path: str, document: dict):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(document) + '\n')
+
+
+def check_budgets(record: dict, budgets: dict, history: List[dict], host: str) -> List[str]:
+    """Return the budget violations of a passing case record."""
+    violations = []
+    budget = budgets.get('cases', {}).get(record['name'], {})
+    if budget.get('max_seconds') is not None and record['seconds'] > budget['max_seconds']:
+        violations.append(f"{record['seconds']:.3f}s > budget {budget['max_seconds']}s")
+    if budget.get('max_peak_rss_mb') is not None and record['peak_rss_mb'] > budget['max_peak_rss_mb']:
+        violations.append(f"peak {record['peak_rss_mb']:.1f} MB > budget {budget['max_peak_rss_mb']} MB")
+    tolerance = budgets.get('tolerance', DEFAULT_TOLERANCE)
+    window = budgets.get('history_window', DEFAULT_HISTORY_WINDOW)
+    noise = budgets.get('noise_seconds', DEFAULT_NOISE_SECONDS)
+    # Only runs on the same host compare: timings of other machines say nothing about this change
+    previous = [r for run in history if run.get('environment', {}).get('host') == host
+                for r in run.get('results', []) if r['name'] == record['name'] and r.get('status') == 'ok'][-window:]
+    if previous:
+        seconds = statistics.median(r['seconds'] for r in previous)
+        peak = statistics.median(r['peak_rss_mb'] for r in previous)
+        if record['seconds'] > seconds * (1 + tolerance) and record['seconds'] - seconds > noise:
+            violations.append(f"{record['seconds']:.3f}s is {record['seconds'] / seconds - 1:.0%} slower than the "
+                              f"median of the last {len(previous)} run(s) ({seconds:.3f}s)")
+        if record['peak_rss_mb'] > peak * (1 + tolerance):
+            violations.append(f"peak {record['peak_rss_mb']:.1f} MB is {record['peak_rss_mb'] / peak - 1:.0%} above "
+                              f"the median of the last {len(previous)} run(s) ({peak:.1f} MB)")
+    return violations
+
+
+def run_regression(cases: List[dict] = None, repeat: int = 1, update_golden: bool = False, budgets: dict = None,
+                   history: List[dict] = None) -> dict:
+    """Run the cases and return the results document (outputs not included)."""
+    budgets = budgets if budgets is not None else load_budgets()
+    environment = _environment()
+    environment['host'] = platform.node()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = os.path.realpath(tmp_dir)
+        folders = generate_inputs(work_dir)
+        for case in cases if cases is not None else CASES:
+            record = run_case(case, folders, work_dir, repeat)
+            output = record.pop('output', None)
+            if record['status'] == 'ok':
+                golden = read_golden(case['golden'])
+                if update_golden:
+                    if golden != output:
+                        write_golden(case['golden'], output)
+                        record['status'] = 'updated'
+                elif golden is None:
+                    record['status'] = 'new'
+                    record['reasons'] = [f"no golden file {case['golden']} (run with --update-golden)"]
+                elif golden != output:
+                    record['status'] = 'failed'
+                    record['reasons'] = [f"output differs from {case['golden']}: {_first_difference(golden, output)}"]
+                violations = check_budgets(record, budgets, history or [], environment['host'])
+                if violations and record['status'] in ('ok', 'new'):
+                    record['status'] = 'failed'
+                    record['reasons'] = record.get('reasons', []) + violations
+            results.append(record)
+    return {'environment': environment, 'corpus': dict(CORPUS), 'results': results}
+
+
+def print_results(document: dict):
+    print(f"{'Case':<28} {'Status':<8} {'Best (s)':>9} {'MB/s':>8} {'Peak MB':>8}")
+    for r in document['results']:
+        seconds = f"{r['seconds']:.3f}" if 'seconds' in r else '-'
+        mb_per_sec = f"{r['mb_per_sec']:.2f}" if r.get('mb_per_sec') else '-'
+        peak = f"{r['peak_rss_mb']:.1f}" if 'peak_rss_mb' in r else '-'
+        print(f"{r['name']:<28} {r['status']:<8} {seconds:>9} {mb_per_sec:>8} {peak:>8}")
+        for reason in r.get('reasons', []) + ([r['reason']] if 'reason' in r else []):
+            print(f"    {reason}")
+
+
+def print_trend(history: List[dict], window: int = 10):
+    """Print the best time and peak memory of the last `window` runs, one column per run."""
+    runs = history[-window:]
+    if not runs:
+        print("No runs recorded")
+        return
+    print(f"{'Case':<28} " + ' '.join(f"{run['environment'].get('git_revision') or '?':>15}" for run in runs))
+    names = []
+    for run in runs:
+        names.extend(r['name'] for r in run['results'] if r['name'] not in names)
+    for name in names:
+        cells = []
+        for run in runs:
+            r = next((r for r in run['results'] if r['name'] == name), None)
+            cells.append(f"{r['seconds']:.3f}s/{r['peak_rss_mb']:.0f}MB" if r and 'seconds' in r else '-')
+        print(f"{name:<28} " + ' '.join(f"{cell:>15}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the toolbox outputs against golden files and run time/memory budgets.")
+    parser.add_argument('--case', type=str, default=None, help='Only run the cases whose name contains this text (comma-separated)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case (best time is checked)')
+    parser.add_argument('--budgets', type=str, default=BUDGETS_FILE, help='Budgets JSON file')
+    parser.add_argument('--history', type=str, default=DEFAULT_HISTORY, help='Run history (JSON lines), appended to after each run')
+    parser.add_argument('--update-golden', action='store_true', help='Rewrite the golden files from the current outputs')
+    parser.add_argument('--trend', action='store_true', help='Print the time and memory of the last runs in the history and exit')
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    if args.trend:
+        print_trend(history)
+        return
+    cases = CASES
+    if args.case:
+        parts = [part.strip() for part in args.case.split(',') if part.strip()]
+        cases = [case for case in CASES if any(part in case['name'] for part in parts)]
+        if not cases:
+            print(f"No case matches {args.case!r} (cases: {', '.join(case['name'] for case in CASES)})")
+            sys.exit(2)
+    document = run_regression(cases, args.repeat, args.update_golden, load_budgets(args.budgets), history)
+    print_results(document)
+    if args.history:
+        append_history(args.history, document)
+        print(f"\nRun recorded in: {args.history}")
+    failed = [r['name'] for r in document['results'] if r['status'] == 'failed']
+    if failed:
+        print(f"Regressions: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+ISO20022 Schema Release Diff
+----------------------------
+Compares two releases of the CBPR+ usage guidelines: the compiled element-path indexes of their XSDs (see
+xsd_schema) and the Full_View tables of their MyStandards Excel exports, single exports or an aggregated
+workbook (see aggregate_metadata), and reports added, removed and changed elements.
+
+Features:
+- Usage guidelines are matched across releases by message and variant name without the message version
+  (guideline_key, e.g. `pacs.008_STP_FIToFICustomerCreditTransfer`), so a version upgrade between releases
+  is compared element by element; the OldVersion/NewVersion columns show both versions.
+- Hashed keyed comparison: every element is keyed by its path and reduced to a BLAKE2b digest of its compared
+  fields. Guidelines whose combined digest is unchanged are skipped, and only elements whose digests differ
+  are compared field by field.
+- XSD fields: cardinality, type, base type, choice, enumerations, pattern, lengths, digits and attributes.
+  Full_View fields: every column but the identification and publication columns (FULL_VIEW_IGNORED), i.e.
+  Mult, Type / Code, Rule, Fixed Value, Definition, etc. Full_View rows without an XML tag (codes, algorithms)
+  are keyed below their element, e.g. `/AppHdr/Fr/OrgId/PstlAdr/AdrTp/Cd/[Postal]`.
+- Workbooks are read straight from their sheet XML (zipfile + ElementTree), which is much faster than
+  openpyxl on MyStandards exports with thousands of defined names.
+
+Report columns (DIFF_COLUMNS): Source | Guideline | OldVersion | NewVersion | Path | Change | Field | OldValue | NewValue
+A guideline present in one release only has one row with an empty Path.
+
+Usage Example:
+    python -m swift_iso20022_toolbox.schema_diff ./SR2024 ./SR2025 sr2025_changes.csv
+    python -m swift_iso20022_toolbox.schema_diff SR2024_Aggregated.xlsx SR2025_Aggregated.xlsx changes.csv --format csv,xlsx
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from hashlib import blake2b
+from typing import Dict, Iterator, List, Optional
+
+from swift_iso20022_toolbox import instrumentation
+from swift_iso20022_toolbox.instrumentation import get_instrumentation
+
+DIFF_COLUMNS = ['Source', 'Guideline', 'OldVersion', 'NewVersion', 'Path', 'Change', 'Field', 'OldValue', 'NewValue']
+DIFF_COLUMN_TYPES = {'Source': 'code', 'Change': 'code'}
+DEFAULT_REPORT_FORMATS = ['csv', 'xlsx']
+FULL_VIEW_SHEETS = ('Full_View', 'CBPRPlus_XSD_Full_View')
+# Full_View columns that identify the row or the publication, not the element
+FULL_VIEW_IGNORED = {'Index', 'Lvl', 'XML Path', 'Restricted_Base_Message', 'Collection', 'Usage_Guideline_Name',
+                     'Publisher', 'Publication_Date', 'Version', 'Status', 'Online', 'Source_File'}
+_GUIDELINE = re.compile(r'([a-z]{4})[._](\d{3})[._](\d{3})[._](\d{2})_?(.*)')
+_RELEASE_SUFFIX = re.compile(r'(_\d{8}_\d{4})?(_iso15)?(\.xsd|\.xlsx)?$', re.IGNORECASE)
+_SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def guideline_key(name: str) -> tuple:
+    """
+    Return (key, version) for a usage guideline or file name, e.g. `CBPRPlus-pacs.008.001.08_STP_FIToFI...`
+    -> (`pacs.008_STP_FIToFI...`, `pacs.008.001.08`). Names without a message identifier are their own key.
+    """
+    match = _GUIDELINE.search(name)
+    if match is None:
+        return _RELEASE_SUFFIX.sub('', os.path.basename(name)), ''
+    area, message, variant, version, rest = match.groups()
+    rest = _RELEASE_SUFFIX.sub('', rest)
+    return f"{area}.{message}" + (f"_{rest}" if rest else ''), f"{area}.{message}.{variant}.{version}"
+
+
+def _digest(fields: dict) -> bytes:
+    # Field names are part of the digest, so the same values under other columns do not compare equal
+    return blake2b('\x1f'.join(f"{name}\x1e{value}" for name, value in fields.items()).encode('utf-8'),
+                   digest_size=16).digest()
+
+
+class GuidelineIndex:
+    """Element fields of one usage guideline, keyed by path, with a digest per element and per guideline."""
+
+    def __init__(self, key: str, version: str, source_file: str):
+        self.key = key
+        self.version = version
+        self.source_file = source_file
+        self.elements = {}  # type: Dict[str, dict]
+        self._digests = None
+        self._digest = None
+
+    def add(self, path: str, fields: dict):
+        # Repeated paths (e.g. the same code listed twice) are kept apart by occurrence
+        key, occurrence = path, 1
+        while key in self.elements:
+            occurrence += 1
+            key = f"{path}#{occurrence}"
+        self.elements[key] = fields
+
+    @property
+    def digests(self) -> Dict[str, bytes]:
+        if self._digests is None:
+            self._digests = {path: _digest(fields) for path, fields in self.elements.items()}
+        return self._digests
+
+    @property
+    def digest(self) -> bytes:
+        if self._digest is None:
+            combined = blake2b(digest_size=16)
+            for path, digest in self.digests.items():
+                combined.update(path.encode('utf-8'))
+                combined.update(digest)
+            self._digest = combined.digest()
+        return self._digest
+
+
+# --- XSD releases ---
+
+def _xsd_fields(node) -> dict:
+    fields = {'cardinality': node.cardinality(), 'type': node.type_name, 'choice': 'yes' if node.choice else ''}
+    simple_type = node.simple_type
+    if simple_type is not None:
+        fields['base'] = simple_type.base
+        fields['enumerations'] = ','.join(simple_type.enumerations)
+        fields['pattern'] = simple_type.pattern or ''
+        fields['length'] = f"{simple_type.min_length or ''}..{simple_type.max_length or ''}"
+        fields['digits'] = f"{simple_type.total_digits or ''}/{simple_type.fraction_digits or ''}"
+    if node.attributes:
+        fields['attributes'] = ','.join(f"{name}:{attribute_type.name}{'' if required else '?'}"
+                                        for name, attribute_type, required in node.attributes)
+    return fields
+
+
+def xsd_guidelines(folder: str) -> Dict[str, GuidelineIndex]:
+    """Index the XSDs of a folder (or a single .xsd file) by guideline key."""
+    from swift_iso20022_toolbox.xsd_schema import find_xsd_files, load_schema
+    files = [folder] if folder.lower().endswith('.xsd') else find_xsd_files(folder)
+    guidelines = {}
+    for file_path in files:
+        schema = load_schema(file_path)
+        key, version = guideline_key(schema.file_name)
+        guideline = guidelines[key] = GuidelineIndex(key, version or schema.base_message, schema.file_name)
+        for node in schema.iter_nodes():
+            guideline.add(node.path, _xsd_fields(node))
+    return guidelines
+
+
+# --- Excel (MyStandards Full_View) releases ---
+
+_COLUMN_NUMBERS = {}
+
+
+def _column_number(reference: str) -> int:
+    """Zero-based column of a cell reference such as `AB12`."""
+    letters = reference.rstrip('0123456789')
+    number = _COLUMN_NUMBERS.get(letters)
+    if number is None:
+        number = 0
+        for char in letters:
+            number = number * 26 + ord(char.upper()) - 64
+        number = _COLUMN_NUMBERS[letters] = number - 1
+    return number
+
+
+def _text(element) -> str:
+    # Shared and inline strings may be split into rich-text runs; phonetic runs (rPh) are not part of the text
+    if len(element) == 1 and element[0].tag == _SHEET_NS + 't':
+        return element[0].text or ''
+    return ''.join(run.text or '' for child in element if child.tag != _SHEET_NS + 'rPh'
+                   for run in child.iter(_SHEET_NS + 't'))
+
+
+def read_sheet(path: str, sheet_names) -> Optional[List[list]]:
+    """
+    Return the rows of the first sheet of `sheet_names` found in an .xlsx workbook as lists of strings (None
+    for empty cells), or None if the workbook has none of them. Reads the sheet XML directly.
+    """
+    with zipfile.ZipFile(path) as zf:
+        workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+        sheets = {sheet.get('name'): sheet.get(_REL_NS + 'id') for sheet in workbook.iter(_SHEET_NS + 'sheet')}
+        name = next((name for name in sheet_names if name in sheets), None)
+        if name is None:
+            return None
+        relations = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+        target = next(rel.get('Target') for rel in relations.iter(_PACKAGE_REL_NS + 'Relationship')
+                      if rel.get('Id') == sheets[name])
+        target = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+        shared = []
+        if 'xl/sharedStrings.xml' in zf.namelist():
+            with zf.open('xl/sharedStrings.xml') as f:
+                for _, element in ET.iterparse(f):
+                    if element.tag == _SHEET_NS + 'si':
+                        shared.append(_text(element))
+                        element.clear()
+        rows = []
+        with zf.open(target) as f:
+            for _, element in ET.iterparse(f):
+                if element.tag != _SHEET_NS + 'row':
+                    continue
+                row = []
+                for cell in element:
+                    # The value is the last child: <v> (after a formula <f>, if any) or an inline string <is>
+                    value = last = cell[-1] if len(cell) else None
+                    if last is not None:
+                        kind = cell.get('t')
+                        if last.tag == _SHEET_NS + 'is':
+                            value = _text(last)
+                        else:
+                            value = last.text if last.tag == _SHEET_NS + 'v' else None
+                            if value is not None and kind == 's':
+                                value = shared[int(value)]
+                            elif value is not None and kind == 'b':
+                                value = 'TRUE' if value == '1' else 'FALSE'
+                    reference = cell.get('r')
+                    column = _column_number(reference) if reference else len(row)
+                    if column > len(row):
+                        row.extend([None] * (column - len(row)))
+                    row.append(value)
+                rows.append(row)
+                element.clear()
+    return rows
+
+
+def _level(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _cell_text(value) -> str:
+    """
+    Cell value as compared: lines stripped and blank lines dropped, as re-saved workbooks differ from the
+    exports in line endings (CR LF vs. LF LF); this also drops the indentation of the Name column.
+    """
+    if value is None:
+        return ''
+    if '\n' not in value and '\r' not in value:
+        return value.strip()
+    return '\n'.join(line.strip() for line in value.splitlines() if line.strip())
+
+
+def _full_view_guidelines(rows: List[list], file_name: str, guidelines: Dict[str, GuidelineIndex]):
+    """Add the Full_View rows (header first) of one export or aggregated workbook to `guidelines`."""
+    if not rows:
+        return
+    header = [str(name).strip() if name is not None else None for name in rows[0]]
+    position = {name: i for i, name in enumerate(header) if name}
+    compared = [(name, i) for name, i in position.items() if name not in FULL_VIEW_IGNORED]
+    name_at, tag_at, level_at = position.get('Name'), position.get('XML Tag'), position.get('Lvl')
+    mult_at = position.get('Mult')
+    guideline_at = position.get('Usage_Guideline_Name')
+    segments = []
+    current = current_name = None
+    for row in rows[1:]:
+        if not any(row):
+            continue
+        row = row + [None] * (len(header) - len(row))
+        # Aggregated workbooks hold several guidelines, told apart by their Usage_Guideline_Name
+        guideline_name = (row[guideline_at] if guideline_at is not None else None) or file_name
+        if guideline_name != current_name:
+            key, version = guideline_key(guideline_name)
+            current = guidelines.get(key)
+            if current is None:
+                current = guidelines[key] = GuidelineIndex(key, version, file_name)
+            current_name = guideline_name
+            segments = []
+        level = _level(row[level_at]) if level_at is not None else 0
+        tag = (row[tag_at] or '').strip() if tag_at is not None else ''
+        name = (row[name_at] or '').strip() if name_at is not None else ''
+        if tag:
+            segment = tag.strip('<>')
+        elif mult_at is not None and row[mult_at] and ' ' not in name:
+            # An element without an XML Tag (the Document row): named by its Name
+            segment = name
+        else:
+            # Codes and algorithms listed below their element
+            segment = f"[{name}]"
+        segments = segments[:level] + [segment]
+        path = '/' + '/'.join(segments[1:]) if level else '/'
+        current.add(path, {column: _cell_text(row[i]) for column, i in compared})
+
+
+def _read_full_view(file_path: str) -> Optional[List[list]]:
+    return read_sheet(file_path, FULL_VIEW_SHEETS)
+
+
+def excel_guidelines(path: str, workers: int = 1) -> Dict[str, GuidelineIndex]:
+    """
+    Index the Full_View tables of a folder of MyStandards exports, or of one (aggregated) workbook. With
+    `workers` > 1, the workbooks are read in parallel on a process pool.
+    """
+    files = [path] if path.lower().endswith('.xlsx') else sorted(
+        os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith('.xlsx'))
+    inst = get_instrumentation()
+    guidelines = {}
+    with inst.stage('read'):
+        if workers > 1 and len(files) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                sheets = list(pool.map(_read_full_view, files))
+        else:
+            sheets = map(_read_full_view, files)
+        for file_path, rows in zip(files, sheets):
+            if rows is None:
+                print(f"Warning: no Full_View sheet in {file_path}")
+                continue
+            inst.add('files')
+            _full_view_guidelines(rows, os.path.basename(file_path), guidelines)
+    return guidelines
+
+
+# --- Comparison ---
+
+def diff_guidelines(old: Dict[str, GuidelineIndex], new: Dict[str, GuidelineIndex], source: str) -> Iterator[list]:
+    """Yield DIFF_COLUMNS rows for two releases indexed by guideline key."""
+    for key in sorted(set(old) | set(new)):
+        old_guideline, new_guideline = old.get(key), new.get(key)
+        if old_guideline is None or new_guideline is None:
+            # A guideline of one release only: one row, with its file in Old/NewValue
+            yield [source, key, old_guideline.version if old_guideline else '',
+                   new_guideline.version if new_guideline else '', '', 'removed' if new_guideline is None else 'added',
+                   '', old_guideline.source_file if old_guideline else '',
+                   new_guideline.source_file if new_guideline else '']
+            continue
+        if old_guideline.digest == new_guideline.digest:
+            continue
+        versions = [source, key, old_guideline.version, new_guideline.version]
+        old_digests, new_digests = old_guideline.digests, new_guideline.digests
+        for path, digest in old_digests.items():
+            new_digest = new_digests.get(path)
+            if new_digest is None:
+                yield versions + [path, 'removed', '', '', '']
+            elif new_digest != digest:
+                old_fields, new_fields = old_guideline.elements[path], new_guideline.elements[path]
+                for field in list(old_fields) + [f for f in new_fields if f not in old_fields]:
+                    old_value, new_value = old_fields.get(field, ''), new_fields.get(field, '')
+                    if old_value != new_value:
+                        yield versions + [path, 'changed', field, old_value, new_value]
+        for path in new_digests:
+            if path not in old_digests:
+                yield versions + [path, 'added', '', '', '']
+
+
+def _has_files(path: str, extension: str) -> bool:
+    if os.path.isdir(path):
+        return any(name.lower().endswith(extension) for name in os.listdir(path))
+    return path.lower().endswith(extension)
+
+
+def diff_releases(old_path: str, new_path: str, workers: int = 1) -> List[list]:
+    """
+    Return the DIFF_COLUMNS rows between two releases, for each source both have: a folder gives its XSDs
+    (`xsd`) and MyStandards exports (`excel`), an .xsd file or an .xlsx workbook only its own source.
+    """
+    inst = get_instrumentation()
+    sources = [('xsd', '.xsd', xsd_guidelines), ('excel', '.xlsx', lambda path: excel_guidelines(path, workers))]
+    rows = []
+    for source, extension, index in sources:
+        if not (_has_files(old_path, extension) and _has_files(new_path, extension)):
+            continue
+        with inst.stage(source):
+            old, new = index(old_path), index(new_path)
+        with inst.stage('diff'):
+            rows.extend(diff_guidelines(old, new, source))
+    return rows
+
+
+def summary_rows(rows: List[list]) -> List[dict]:
+    """Added/removed/changed element counts per source and guideline."""
+    summary = {}
+    changed = {}
+    for source, guideline, old_version, new_version, path, change, _, _, _ in rows:
+        entry = summary.get((source, guideline))
+        if entry is None:
+            entry = summary[(source, guideline)] = {
+                'Source': source, 'Guideline': guideline, 'OldVersion': old_version, 'NewVersion': new_version,
+                'Guideline change': '', 'Added': 0, 'Removed': 0, 'Changed': 0}
+        if not path:
+            entry['Guideline change'] = change
+        elif change == 'changed':
+            # Elements, not fields: a changed element has one row per changed field
+            changed.setdefault((source, guideline), set()).add(path)
+        else:
+            entry[change.capitalize()] += 1
+    for key, paths in changed.items():
+        summary[key]['Changed'] = len(paths)
+    return list(summary.values())
+
+
+def main():
+    from swift_iso20022_toolbox.sinks import open_sinks, parse_formats
+    parser = argparse.ArgumentParser(description="Compare two releases of ISO20022 usage guidelines (XSDs and MyStandards Full_View exports).")
+    parser.add_argument('old', type=str, help='Previous release: folder of XSDs and/or Excel exports, .xsd file or (aggregated) .xlsx workbook')
+    parser.add_argument('new', type=str, help='New release, same kinds as `old`')
+    parser.add_argument('output', type=str, help='Report file (e.g. changes.csv); other formats are written next to it')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for reading Excel workbooks')
+    parser.add_argument('--format', type=str, default=','.join(DEFAULT_REPORT_FORMATS), help='Report formats (csv, xlsx, txt, jsonl, parquet)')
+    parser.add_argument('--metrics-json', type=str, default=None, help='Append run timings and counters as a JSON line to this file')
+    parser.add_argument('--metrics-prom', type=str, default=None, help='Write run timings and counters in Prometheus text format to this file')
+    args = parser.parse_args()
+    try:
+        formats = parse_formats(args.format)
+    except ValueError as e:
+        print(e)
+        sys.exit(2)
+    for path in (args.old, args.new):
+        if not os.path.exists(path):
+            print(f"Not found: {path}")
+            sys.exit(1)
+
+    inst = instrumentation.enable('schema_diff') if args.metrics_json or args.metrics_prom else get_instrumentation()
+    start = time.perf_counter()
+    rows = diff_releases(args.old, args.new, workers=args.workers)
+    inst.add('rows', len(rows))
+    for entry in summary_rows(rows):
+        change = f" ({entry['Guideline change']})" if entry['Guideline change'] else ''
+        print(f"{entry['Source']:<5} {entry['Guideline']}{change}: {entry['Added']} added, {entry['Removed']} removed, "
+              f"{entry['Changed']} changed")
+    # The txt format takes the output file name itself; keep it from overwriting e.g. changes.csv
+    with inst.stage('write'):
+        sink = open_sinks(os.path.splitext(args.output)[0] + '.txt', formats, DIFF_COLUMNS, column_types=DIFF_COLUMN_TYPES)
+        sink.write_many(rows)
+        sink.close()
+    elapsed = time.perf_counter() - start
+    if rows:
+        print(f"{len(rows)} difference(s) in {elapsed:.2f}s, written to: {', '.join(sink.files())}")
+    else:
+        print(f"No differences ({elapsed:.2f}s)")
+    instrumentation.export(inst, json_log=args.metrics_json, prometheus=args.metrics_prom)
+
+
+if __name__ == "__main__":
+    main()
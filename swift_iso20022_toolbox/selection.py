@@ -0,0 +1,163 @@
+"""
+ISO20022 XPath Selection
+------------------------
+Projection for the XPath extractor: only the elements matching a set of XPath_strip patterns are extracted,
+and the walker skips the subtrees that cannot contain a match.
+
+Patterns (matched against the path of an element from its AppHdr/Document, e.g. `/Document/FIToFICstmrCdtTrf/
+GrpHdr/MsgId`; this is the XPath_strip column for messages inside an envelope):
+- `/AppHdr/BizMsgIdr`                          exact path
+- `/AppHdr/Fr/*/*/BICFI`                       `*` matches one element
+- `/Document/**/UETR` or `/Document//UETR`     `**` matches any number of elements (also none)
+- `UETR`, `Ntry/Amt`                           patterns without a leading `/` match at any depth
+- `/Document/BkToCstmrStmt/Stmt/Bal/**`        a whole subtree
+
+The patterns are compiled into a path trie, which is walked as a lazily built automaton: each (state, tag)
+transition is computed once, so testing a child element costs one dict lookup, and elements whose state
+is dead are skipped together with their subtree.
+
+Usage Example:
+    from swift_iso20022_toolbox.selection import XPathSelection
+    selection = XPathSelection(['/AppHdr/BizMsgIdr', 'IntrBkSttlmAmt', '/Document//UETR'])
+    for results, *metadata in parse_messages('bulk.xml', selection=selection):
+        ...
+    python xml_to_xpath.py ./messages fields.txt --select "/AppHdr/BizMsgIdr,IntrBkSttlmAmt,UETR" --wide
+"""
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+DEAD = 0
+# Separator of the values of one pattern in a wide row (a pattern can match several elements of a message)
+WIDE_VALUE_SEPARATOR = ';'
+
+
+class _TrieNode:
+    __slots__ = ('children', 'star', 'globstar', 'loop', 'terminals')
+
+    def __init__(self, loop: bool = False):
+        self.children = {}
+        self.star = None
+        self.globstar = None
+        self.loop = loop  # Node reached through `**`: stays active for any number of elements
+        self.terminals = []
+
+
+def parse_patterns(text: str) -> List[str]:
+    """
+    Split a `--select` value into patterns: comma-separated, or `@file` for a file with one pattern per
+    line (blank lines and `#` comments are ignored).
+    """
+    if text.startswith('@'):
+        with open(text[1:], encoding='utf-8') as f:
+            lines = [line.strip() for line in f]
+        return [line for line in lines if line and not line.startswith('#')]
+    return [pattern.strip() for pattern in text.split(',') if pattern.strip()]
+
+
+def _segments(pattern: str) -> List[str]:
+    if not pattern.startswith('/'):
+        pattern = '//' + pattern
+    segments = []
+    for segment in pattern[1:].split('/'):
+        segment = segment or '**'
+        if not (segment == '**' and segments and segments[-1] == '**'):
+            segments.append(segment)
+    return segments
+
+
+class XPathSelection:
+    """Compiled set of XPath_strip patterns (see the module docstring for the syntax)."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = [p for p in patterns if p]
+        if not self.patterns:
+            raise ValueError("No XPath patterns given")
+        root = _TrieNode()
+        for index, pattern in enumerate(self.patterns):
+            node = root
+            for segment in _segments(pattern):
+                if segment == '**':
+                    if node.globstar is None:
+                        node.globstar = _TrieNode(loop=True)
+                    node = node.globstar
+                elif segment == '*':
+                    if node.star is None:
+                        node.star = _TrieNode()
+                    node = node.star
+                else:
+                    node = node.children.setdefault(segment, _TrieNode())
+            node.terminals.append(index)
+        # Automaton states: sets of trie nodes, numbered as they are reached; state 0 is the dead state
+        self._ids = {frozenset(): DEAD}
+        self._accepts = [()]
+        self._descends = [False]
+        self._nodes = [frozenset()]
+        self._transitions = {}
+        self._path_cache = {}
+        self.initial = self._state(self._closure(root))
+
+    @staticmethod
+    def _closure(node: _TrieNode) -> set:
+        nodes = set()
+        while node is not None and node not in nodes:
+            nodes.add(node)
+            node = node.globstar
+        return nodes
+
+    def _state(self, nodes: set) -> int:
+        key = frozenset(nodes)
+        state = self._ids.get(key)
+        if state is None:
+            state = self._ids[key] = len(self._nodes)
+            self._nodes.append(key)
+            self._accepts.append(tuple(sorted({i for node in key for i in node.terminals})))
+            self._descends.append(any(node.children or node.star or node.loop for node in key))
+        return state
+
+    def step(self, state: int, tag: str) -> int:
+        """State after an element `tag` below an element in `state` (DEAD: nothing below can match)."""
+        key = (state, tag)
+        next_state = self._transitions.get(key)
+        if next_state is None:
+            nodes = set()
+            for node in self._nodes[state]:
+                if node.loop:
+                    nodes.add(node)
+                for target in (node.children.get(tag), node.star):
+                    if target is not None:
+                        nodes |= self._closure(target)
+            next_state = self._transitions[key] = self._state(nodes)
+        return next_state
+
+    def accepts(self, state: int) -> Tuple[int, ...]:
+        """Indexes of the patterns matching an element in `state`."""
+        return self._accepts[state]
+
+    def descends(self, state: int) -> bool:
+        """Whether elements below an element in `state` can match."""
+        return self._descends[state]
+
+    def match_path(self, path: str) -> Tuple[int, ...]:
+        """Indexes of the patterns matching a message path such as `/Document/GrpHdr/MsgId` (cached)."""
+        matched = self._path_cache.get(path)
+        if matched is None:
+            state = self.initial
+            for tag in path.strip('/').split('/'):
+                state = self.step(state, tag)
+                if state == DEAD:
+                    break
+            matched = self._path_cache[path] = self.accepts(state)
+        return matched
+
+
+@lru_cache(maxsize=16)
+def compile_selection(patterns: Tuple[str, ...]) -> XPathSelection:
+    """XPathSelection for a tuple of patterns, compiled once per process (e.g. in worker processes)."""
+    return XPathSelection(patterns)
+
+
+def get_selection(selection) -> XPathSelection:
+    """Accept an XPathSelection, a sequence of patterns or None."""
+    if selection is None or isinstance(selection, XPathSelection):
+        return selection
+    return compile_selection(tuple(selection))
@@ -0,0 +1,367 @@
+"""
+ISO20022 Toolbox Extraction Service
+-----------------------------------
+Long-running local HTTP service exposing the toolbox extractors, so that callers (e.g. a message gateway)
+do not pay Python/pandas startup on every message.
+
+Features:
+- asyncio HTTP/1.1 server with keep-alive, bound to 127.0.0.1 by default.
+- Process worker pool; each worker imports the extractors and compiles the baseline XSDs once at startup
+  (warm schema cache), so per-request work is only parsing and extraction.
+- Request batching: requests arriving in the same event-loop tick (up to `--batch-size`) are sent to the
+  workers as one task per worker, which cuts inter-process overhead under load without queueing a whole
+  batch behind a single worker. Waiting for more requests is opt-in (`--batch-window-ms`, default 0): it
+  adds up to the window to every request's latency. Responses are JSON-encoded in the worker.
+- Latency percentiles (p50/p99) and request counters on `/metrics` (Prometheus text format).
+
+Endpoints:
+- `POST /xpath?name=<file.xml>[&strip_space=0][&annotate=1]`  body: XML message, or a bulk file of messages
+      -> {"file_name", "metadata": {XSD, MsgId, Fr, To, CreDt, BizMsgIdr, BizSvc}, "columns", "rows",
+          "messages": [{"metadata", "first_row", "row_count"}, ...]}
+      "metadata" is that of the first message; "messages" gives each message's metadata and its slice of "rows".
+      `annotate=1` adds the XSD type and cardinality of each XPath_strip from the warm schema cache.
+- `POST /xsd-meta?name=<file.xsd>[&lines=100]`  body: XSD file, or a zip of XSD files
+      -> {"records": [...]}
+- `POST /aggregate`  body: zip of MyStandards Excel files -> aggregated workbook (.xlsx)
+- `GET /schema?msg=<pacs.008.001.08>` -> element paths, types and cardinalities of the compiled schema
+- `GET /health`, `GET /metrics`
+
+Usage Example:
+    python -m swift_iso20022_toolbox.service --port 8020 --workers 4
+    curl --data-binary @message.xml 'http://127.0.0.1:8020/xpath?name=message.xml'
+"""
+import argparse
+import asyncio
+import collections
+import io
+import json
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+from urllib.parse import parse_qs, urlsplit
+
+from swift_iso20022_toolbox.instrumentation import Instrumentation, format_prometheus
+
+DEFAULT_XSD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'sample_xsd_plain_baseline')
+XPATH_COLUMNS = ["XPath", "XPath_strip", "Value"]
+METADATA_COLUMNS = ["XSD", "MsgId", "Fr", "To", "CreDt", "BizMsgIdr", "BizSvc"]
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 411: 'Length Required',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+LATENCY_WINDOW = 10000
+
+
+class RequestError(Exception):
+    """Client error, reported with its HTTP status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# --- Worker side -------------------------------------------------------------------------------
+
+_worker_schemas = {}
+
+
+def _warm_worker(xsd_folder: str):
+    """Pool initializer: import the extractors and compile the baseline schemas once per worker."""
+    global _worker_schemas
+    from swift_iso20022_toolbox import xml_to_xpath  # noqa: F401
+    from swift_iso20022_toolbox.xsd_schema import schemas_by_message
+    try:
+        _worker_schemas = schemas_by_message(xsd_folder)
+    except OSError:
+        _worker_schemas = {}
+
+
+def _xpath_job(data: bytes, params: dict) -> bytes:
+    from swift_iso20022_toolbox.xml_to_xpath import parse_messages
+    name = params.get('name', 'message.xml')
+    strip_space = params.get('strip_space', '1') != '0'
+    annotate = params.get('annotate') == '1'
+    columns = list(XPATH_COLUMNS) + (["Type", "Cardinality"] if annotate else [])
+    rows = []
+    messages = []
+    for results, *metadata in parse_messages(name, strip_space=strip_space, source=io.BytesIO(data)):
+        if not results:
+            continue
+        message_rows = [[xpath, xpath_strip, value] for xpath, xpath_strip, value, _, _ in results]
+        if annotate:
+            # Each message of a bulk payload is annotated against its own schema
+            schema = _worker_schemas.get(metadata[0])
+            for row in message_rows:
+                node = schema.index.get(row[1]) if schema is not None else None
+                row += [node.type_name, node.cardinality()] if node is not None else ['', '']
+        messages.append({'metadata': dict(zip(METADATA_COLUMNS, metadata)), 'first_row': len(rows), 'row_count': len(message_rows)})
+        rows.extend(message_rows)
+    if not messages:
+        raise RequestError(400, f"Could not parse XML payload {name}")
+    return json.dumps({
+        'file_name': name,
+        'metadata': messages[0]['metadata'],
+        'columns': columns,
+        'rows': rows,
+        'messages': messages,
+    }).encode('utf-8')
+
+
+def _xsd_meta_job(data: bytes, params: dict) -> bytes:
+    from swift_iso20022_toolbox.extract_xsd_versions import extract_xsd_record, extract_xsd_records
+    try:
+        n_lines = int(params.get('lines', 100))
+    except ValueError:
+        raise RequestError(400, f"Invalid lines: {params['lines']!r}")
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        records = extract_xsd_records('upload.zip', n_lines, fileobj=io.BytesIO(data))
+    else:
+        records = [extract_xsd_record(params.get('name', 'schema.xsd'), data.decode('utf-8', errors='replace'), n_lines)]
+    return json.dumps({'records': records}).encode('utf-8')
+
+
+def _aggregate_job(data: bytes, params: dict) -> bytes:
+    from swift_iso20022_toolbox.aggregate_metadata import aggregate_excel_folder
+    if not zipfile.is_zipfile(io.BytesIO(data)):
+        raise RequestError(400, "Aggregation expects a zip archive of .xlsx files")
+    output = io.BytesIO()
+    if aggregate_excel_folder('upload.zip', output_path=output, fileobj=io.BytesIO(data)) is None:
+        raise RequestError(400, "No data extracted from the uploaded Excel files")
+    return output.getvalue()
+
+
+def _schema_job(data: bytes, params: dict) -> bytes:
+    schema = _worker_schemas.get(params.get('msg', ''))
+    if schema is None:
+        raise RequestError(404, f"No compiled schema for message {params.get('msg', '')}")
+    elements = [
+        {'path': node.path, 'type': node.type_name, 'cardinality': node.cardinality(),
+         'base': node.simple_type.base if node.simple_type is not None else None}
+        # The index also holds the paths of the other variants of the message (see schemas_by_message)
+        for node in schema.index.values()
+    ]
+    return json.dumps({'file_name': schema.file_name, 'namespace': schema.target_namespace, 'elements': elements}).encode('utf-8')
+
+
+JOBS = {
+    'xpath': _xpath_job,
+    'xsd-meta': _xsd_meta_job,
+    'aggregate': _aggregate_job,
+    'schema': _schema_job,
+}
+
+
+def run_batch(jobs: List[tuple]) -> List[tuple]:
+    """Run (kind, data, params) jobs in a worker; return (status, body) per job."""
+    outcomes = []
+    for kind, data, params in jobs:
+        try:
+            outcomes.append((200, JOBS[kind](data, params)))
+        except RequestError as e:
+            outcomes.append((e.status, json.dumps({'error': str(e)}).encode('utf-8')))
+        except Exception as e:
+            outcomes.append((500, json.dumps({'error': f"{type(e).__name__}: {e}"}).encode('utf-8')))
+    return outcomes
+
+
+# --- Server side -------------------------------------------------------------------------------
+
+class Batcher:
+    """
+    Collects jobs for up to `window` seconds (or `max_size` jobs) and submits them to the pool, split into at
+    most `workers` tasks of similar size: a batch is spread over the workers rather than queued behind one.
+    """
+
+    def __init__(self, pool, window: float, max_size: int, workers: int = 1):
+        self.pool = pool
+        self.window = window
+        self.max_size = max_size
+        self.workers = max(workers, 1)
+        self.pending = []
+        self.timer = None
+
+    def submit(self, job: tuple) -> asyncio.Future:
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self.pending.append((job, future))
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.flush) if self.window > 0 else loop.call_soon(self.flush)
+        return future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        tasks = min(len(batch), self.workers)
+        for task in range(tasks):
+            self._submit(batch[task * len(batch) // tasks:(task + 1) * len(batch) // tasks])
+
+    def _submit(self, batch: list):
+        pool_future = asyncio.wrap_future(self.pool.submit(run_batch, [job for job, _ in batch]))
+
+        def deliver(done):
+            error = done.exception()
+            for index, (_, future) in enumerate(batch):
+                if future.cancelled():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(done.result()[index])
+
+        pool_future.add_done_callback(deliver)
+
+
+class ExtractionService:
+    """HTTP front-end dispatching requests to the worker pool."""
+
+    def __init__(self, workers: int = None, batch_window: float = 0.0, batch_size: int = 32,
+                 xsd_folder: str = DEFAULT_XSD_FOLDER, max_body: int = 64 * 1024 * 1024):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker, initargs=(xsd_folder,))
+        self.batcher = Batcher(self.pool, batch_window, batch_size, self.workers)
+        self.max_body = max_body
+        self.metrics = Instrumentation('service')
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_WINDOW))
+
+    def warm_up(self):
+        """
+        Start every worker process now rather than on the first requests: workers forked while connections are
+        open would inherit their sockets and keep closed connections open.
+        """
+        for future in [self.pool.submit(run_batch, []) for _ in range(self.workers)]:
+            future.result()
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> tuple:
+        url = urlsplit(target)
+        endpoint = url.path.strip('/')
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if endpoint == 'health':
+            return 200, 'application/json', json.dumps({'status': 'ok', 'workers': self.workers}).encode('utf-8')
+        if endpoint == 'metrics':
+            return 200, 'text/plain; version=0.0.4', format_prometheus(self.snapshot()).encode('utf-8')
+        if endpoint not in JOBS:
+            raise RequestError(404, f"Unknown endpoint /{endpoint}")
+        if (method == 'GET') != (endpoint == 'schema'):
+            raise RequestError(405, f"Method {method} not allowed on /{endpoint}")
+        if endpoint == 'aggregate':
+            status, payload = (await asyncio.wrap_future(self.pool.submit(run_batch, [(endpoint, body, params)])))[0]
+        else:
+            status, payload = await self.batcher.submit((endpoint, body, params))
+        content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' \
+            if endpoint == 'aggregate' and status == 200 else 'application/json'
+        return status, content_type, payload
+
+    def record(self, endpoint: str, status: int, elapsed: float):
+        """Account one request in the service metrics (time is accumulated as stage `request:<endpoint>`)."""
+        self.latencies[endpoint].append(elapsed)
+        self.metrics.add_time(f'request:{endpoint}', elapsed)
+        self.metrics.add('requests')
+        if status >= 400:
+            self.metrics.add('errors')
+
+    def snapshot(self) -> dict:
+        snapshot = self.metrics.snapshot()
+        for endpoint, samples in self.latencies.items():
+            ordered = sorted(samples)
+            if ordered:
+                snapshot['gauges'][f'latency_p50_seconds_{endpoint.replace("-", "_")}'] = ordered[len(ordered) // 2]
+                snapshot['gauges'][f'latency_p99_seconds_{endpoint.replace("-", "_")}'] = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return snapshot
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    break
+                method, target, version = parts
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                start = time.perf_counter()
+                endpoint = urlsplit(target).path.strip('/')
+                if endpoint not in JOBS and endpoint not in ('health', 'metrics'):
+                    endpoint = 'other'
+                body = None
+                try:
+                    if method == 'POST':
+                        if 'content-length' not in headers:
+                            raise RequestError(411, "Content-Length required")
+                        try:
+                            length = int(headers['content-length'])
+                        except ValueError:
+                            length = -1
+                        if length < 0:
+                            raise RequestError(400, f"Invalid Content-Length: {headers['content-length']!r}")
+                        if length > self.max_body:
+                            raise RequestError(413, f"Payload exceeds {self.max_body} bytes")
+                        body = await reader.readexactly(length)
+                    elif method != 'GET':
+                        raise RequestError(405, f"Method {method} not allowed")
+                    else:
+                        body = b''
+                    status, content_type, payload = await self.dispatch(method, target, body)
+                except RequestError as e:
+                    status, content_type, payload = e.status, 'application/json', json.dumps({'error': str(e)}).encode('utf-8')
+                    # A request whose body was not read leaves the connection out of sync
+                    keep_alive = keep_alive and body is not None
+                self.record(endpoint, status, time.perf_counter() - start)
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8020):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"ISO20022 extraction service listening on http://{host}:{port} ({self.workers} workers)")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ISO20022 toolbox extraction service.")
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Bind address (default: localhost only)')
+    parser.add_argument('--port', type=int, default=8020, help='Bind port')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--batch-window-ms', type=float, default=0.0, help='Time to wait for more requests to batch into one worker task (default 0: same event-loop tick only)')
+    parser.add_argument('--batch-size', type=int, default=32, help='Maximum requests per worker task')
+    parser.add_argument('--xsd-folder', type=str, default=DEFAULT_XSD_FOLDER, help='XSD folder compiled at worker startup')
+    parser.add_argument('--max-body-mb', type=int, default=64, help='Maximum request body size in MB')
+    args = parser.parse_args()
+
+    service = ExtractionService(args.workers, args.batch_window_ms / 1000.0, args.batch_size, args.xsd_folder, args.max_body_mb * 1024 * 1024)
+    service.warm_up()
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,553 @@
+"""
+ISO20022 Output Sinks
+---------------------
+Buffered writers for extraction results, so that one pass over the rows writes every requested format.
+
+Features:
+- Sinks receive records (tuples of values in column order) and write them in batches of BATCH_SIZE.
+- Formats: txt (the ` | ` separated XPath output file), csv, jsonl (one JSON object per row), xlsx
+  (xlsxwriter in constant-memory mode, new worksheet every 1,048,575 rows) and parquet (pyarrow, one row group
+  per batch; optional dependency).
+- console: the stdout echo of the rows, left out with `--quiet`.
+- Files are created on the first record, so runs without results leave no empty outputs.
+- Typed columns (`column_types`, e.g. the typed value columns of typed_values): parquet stores decimal, date,
+  datetime (UTC) and dictionary-encoded code columns, xlsx numbers and dates; text formats write ISO values.
+- A format's file name is the output file name with the format's extension (the txt file keeps the
+  name as given).
+
+Usage Example:
+    from swift_iso20022_toolbox.sinks import open_sinks
+    with open_sinks('xpaths.txt', ['txt', 'jsonl'], columns) as sink:
+        for record in records:
+            sink.write(record)
+    python xml_to_xpath.py ./messages xpaths.txt --format txt,csv,parquet --quiet
+"""
+import csv
+import json
+import os
+import re
+import sys
+import tempfile
+from collections import OrderedDict
+from typing import Iterable, List, Sequence
+
+from swift_iso20022_toolbox.store import message_type
+
+# Parquet decimal columns: 28 integer and 10 fraction digits (ISO 20022 amounts have at most 18 and 5, rates 10)
+DECIMAL_PRECISION = 38
+DECIMAL_SCALE = 10
+
+BATCH_SIZE = 10000
+FORMATS = ['txt', 'csv', 'jsonl', 'xlsx', 'parquet']
+# Formats written when none are given (txt only with --text-only)
+DEFAULT_FORMATS = ['txt', 'csv', 'xlsx']
+EXCEL_MAX_ROWS = 1048576
+SEPARATOR = ' | '
+
+
+class OutputSink:
+    """Buffered writer of records; subclasses implement _open, _write_batch and _close."""
+
+    extension = None
+
+    def __init__(self, path: str, columns: Sequence[str], batch_size: int = BATCH_SIZE, column_types: dict = None):
+        self.path = path
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.column_types = column_types or {}
+        # Datetime columns are written with isoformat() by the text formats (str() puts a space before the time)
+        self.datetime_indexes = [index for index, column in enumerate(self.columns) if self.column_types.get(column) == 'datetime']
+        self.buffer = []
+        self.rows = 0
+        self.opened = False
+
+    def write(self, record: Sequence):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, records: Iterable[Sequence]):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if not self.opened:
+            self._open()
+            self.opened = True
+        self._write_batch(self.buffer)
+        self.rows += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        if self.opened:
+            self._close()
+            self.opened = False
+
+    @property
+    def count(self) -> int:
+        """Records written so far, buffered ones included."""
+        return self.rows + len(self.buffer)
+
+    def files(self) -> List[str]:
+        """Paths of the files written."""
+        return [self.path] if self.count else []
+
+    def _text_records(self, records: List[Sequence]) -> List[Sequence]:
+        if not self.datetime_indexes:
+            return records
+        converted = []
+        for record in records:
+            record = list(record)
+            for index in self.datetime_indexes:
+                if record[index] is not None:
+                    record[index] = record[index].isoformat()
+            converted.append(record)
+        return converted
+
+    def _open(self):
+        pass
+
+    def _write_batch(self, records: List[Sequence]):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TextSink(OutputSink):
+    """The XPath output file: a header line, then one ` | ` separated line per record."""
+
+    extension = '.txt'
+
+    def __init__(self, path: str, columns: Sequence[str], batch_size: int = BATCH_SIZE, with_labels: bool = False,
+                 column_types: dict = None):
+        super().__init__(path, columns, batch_size, column_types)
+        self.with_labels = with_labels
+        # %-template of a line, formatted in one call per record (about twice as fast as joining str() values)
+        if with_labels:
+            parts = ['%s'] + [column.replace('%', '%%') + ': %s' for column in self.columns[1:]]
+        else:
+            parts = ['%s'] * len(self.columns)
+        self.template = SEPARATOR.join(parts)
+
+    def _open(self):
+        self.handle = open(self.path, 'w', encoding='utf-8', buffering=1024 * 1024)
+        self.handle.write(SEPARATOR.join(self.columns) + '\n')
+
+    def _write_batch(self, records):
+        self.handle.write('\n'.join(map(self.template.__mod__, map(tuple, self._text_records(records)))) + '\n')
+
+    def _close(self):
+        self.handle.close()
+
+
+class ConsoleSink(TextSink):
+    """Echo of the records on stdout, under a title line; only the first `visible` columns are shown."""
+
+    def __init__(self, columns: Sequence[str], title: str = '', visible: int = None, with_labels: bool = False,
+                 batch_size: int = BATCH_SIZE, column_types: dict = None):
+        super().__init__('<stdout>', columns[:visible], batch_size, with_labels, column_types)
+        self.title = title
+        self.visible = visible
+
+    def write(self, record: Sequence):
+        super().write(record[:self.visible] if self.visible else record)
+
+    def _open(self):
+        self.handle = sys.stdout
+        if self.title:
+            self.handle.write(f"\n{self.title}\n")
+        self.handle.write(SEPARATOR.join(self.columns) + '\n')
+
+    def _close(self):
+        self.handle.flush()
+
+    def files(self) -> List[str]:
+        return []
+
+
+class CsvSink(OutputSink):
+    extension = '.csv'
+
+    def _open(self):
+        self.handle = open(self.path, 'w', encoding='utf-8', newline='', buffering=1024 * 1024)
+        self.writer = csv.writer(self.handle, lineterminator='\n')
+        self.writer.writerow(self.columns)
+
+    def _write_batch(self, records):
+        self.writer.writerows(self._text_records(records))
+
+    def _close(self):
+        self.handle.close()
+
+
+class JsonLinesSink(OutputSink):
+    """One JSON object per line, keyed by column name."""
+
+    extension = '.jsonl'
+
+    def _open(self):
+        self.handle = open(self.path, 'w', encoding='utf-8', buffering=1024 * 1024)
+        # Decimals are written as strings, which keeps their exact value
+        self.encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+
+    def _write_batch(self, records):
+        encode = self.encoder.encode
+        columns = self.columns
+        self.handle.write('\n'.join(encode(dict(zip(columns, record))) for record in self._text_records(records)) + '\n')
+
+    def _close(self):
+        self.handle.close()
+
+
+class ExcelSink(OutputSink):
+    """Excel workbook written with xlsxwriter's constant-memory mode (rows are flushed as they are written)."""
+
+    extension = '.xlsx'
+
+    def __init__(self, path: str, columns: Sequence[str], batch_size: int = BATCH_SIZE, column_types: dict = None):
+        super().__init__(path, columns, batch_size, column_types)
+        try:
+            import xlsxwriter
+        except ImportError as e:
+            raise ImportError(f"The xlsx output requires xlsxwriter (pip install xlsxwriter): {e}") from e
+        self.xlsxwriter = xlsxwriter
+
+    def _open(self):
+        # Values are written as given: no formula, URL or number detection in strings
+        self.workbook = self.xlsxwriter.Workbook(self.path, {'constant_memory': True, 'strings_to_formulas': False,
+                                                             'strings_to_urls': False, 'strings_to_numbers': False,
+                                                             'remove_timezone': True,
+                                                             'default_date_format': 'yyyy-mm-dd hh:mm:ss'})
+        self.sheets = 0
+        self._add_sheet()
+
+    def _add_sheet(self):
+        self.sheets += 1
+        self.sheet = self.workbook.add_worksheet(f"Sheet{self.sheets}")
+        self.sheet.write_row(0, 0, self.columns)
+        self.sheet_row = 1
+
+    def _write_batch(self, records):
+        for record in records:
+            if self.sheet_row >= EXCEL_MAX_ROWS:
+                self._add_sheet()
+            self.sheet.write_row(self.sheet_row, 0, record)
+            self.sheet_row += 1
+
+    def _close(self):
+        self.workbook.close()
+
+
+class ParquetSink(OutputSink):
+    """
+    Parquet file with one row group per batch. Columns of `column_types` get their type; otherwise bool
+    columns (isEmptyValue) stay bool and everything else is a string.
+    """
+
+    extension = '.parquet'
+
+    def __init__(self, path: str, columns: Sequence[str], batch_size: int = BATCH_SIZE, column_types: dict = None):
+        super().__init__(path, columns, batch_size, column_types)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError(f"The parquet output requires pyarrow (pip install pyarrow): {e}") from e
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.writer = None
+
+    def _write_batch(self, records):
+        pa = self.pa
+        if self.writer is None:
+            types = {'decimal': pa.decimal128(DECIMAL_PRECISION, DECIMAL_SCALE), 'date': pa.date32(),
+                     'datetime': pa.timestamp('us', tz='UTC'), 'code': pa.dictionary(pa.int32(), pa.string())}
+            self.schema = pa.schema([
+                (column, types[self.column_types[column]] if column in self.column_types
+                 else pa.bool_() if isinstance(value, bool) else pa.string())
+                for column, value in zip(self.columns, records[0])
+            ])
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        arrays = []
+        for index, field in enumerate(self.schema):
+            values = [record[index] for record in records]
+            if field.type == pa.string():
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def _close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+SINKS = {
+    'txt': TextSink,
+    'csv': CsvSink,
+    'jsonl': JsonLinesSink,
+    'xlsx': ExcelSink,
+    'parquet': ParquetSink,
+}
+
+
+class MultiSink:
+    """Writes every record to several sinks."""
+
+    def __init__(self, sinks: List[OutputSink]):
+        self.sinks = sinks
+
+    def write(self, record: Sequence):
+        for sink in self.sinks:
+            sink.write(record)
+
+    def write_many(self, records: Iterable[Sequence]):
+        for record in records:
+            self.write(record)
+
+    @property
+    def count(self) -> int:
+        return max((sink.count for sink in self.sinks), default=0)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def files(self) -> List[str]:
+        """Paths of the files written (console excluded)."""
+        return [path for sink in self.sinks for path in sink.files()]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parse_formats(text: str) -> List[str]:
+    """Split a `--format` value (comma-separated) and check the names."""
+    formats = [name.strip().lower() for name in text.split(',') if name.strip()]
+    unknown = [name for name in formats if name not in SINKS]
+    if unknown or not formats:
+        raise ValueError(f"Unknown output format: {', '.join(unknown) or text!r} (available: {', '.join(FORMATS)})")
+    return formats
+
+
+def output_path(output_file: str, fmt: str) -> str:
+    """File name of format `fmt` for the output file name `output_file`."""
+    if fmt == 'txt':
+        return output_file
+    return os.path.splitext(output_file)[0] + SINKS[fmt].extension
+
+
+def _file_sinks(output_file: str, formats: Sequence[str], columns: Sequence[str], with_labels: bool = False,
+                skip_unavailable: bool = False, column_types: dict = None) -> List[OutputSink]:
+    sinks = []
+    for fmt in formats:
+        path = output_path(output_file, fmt)
+        try:
+            if fmt == 'txt':
+                sinks.append(TextSink(path, columns, with_labels=with_labels, column_types=column_types))
+            else:
+                sinks.append(SINKS[fmt](path, columns, column_types=column_types))
+        except ImportError as e:
+            if not skip_unavailable:
+                raise
+            print(f"Skipping {fmt} output: {e}")
+    return sinks
+
+
+# Partition keys: name -> (record column, function returning the partition value of a column value)
+PARTITION_KEYS = {
+    'xsd': ('XSD', lambda value: value),
+    'msg_type': ('XSD', message_type),
+    'credt': ('CreDt', lambda value: value[:10]),  # Business date of the creation timestamp
+    'fr': ('Fr', lambda value: value),
+    'to': ('To', lambda value: value),
+    'bizsvc': ('BizSvc', lambda value: value),
+}
+DEFAULT_PARTITION_BY = ['xsd', 'credt']
+MANIFEST_FILE = '_manifest.json'
+ROWS_PER_FILE = 1000000
+# Partitions with an open part file; the least recently written one is closed beyond this
+MAX_OPEN_PARTITIONS = 64
+EMPTY_PARTITION_VALUE = '__empty__'
+
+
+def parse_partition_keys(text: str) -> List[str]:
+    """Split a `--partition-by` value (comma-separated) and check the names."""
+    keys = [name.strip().lower() for name in text.split(',') if name.strip()]
+    unknown = [name for name in keys if name not in PARTITION_KEYS]
+    if unknown or not keys:
+        raise ValueError(f"Unknown partition key: {', '.join(unknown) or text!r} (available: {', '.join(PARTITION_KEYS)})")
+    return keys
+
+
+def _directory_value(value: str) -> str:
+    return re.sub(r'[^\w.@+-]', '_', value) or EMPTY_PARTITION_VALUE
+
+
+class PartitionedSink:
+    """
+    Routes records into `<root>/<key>=<value>/.../part-NNNNN.<ext>` files (Hive-style directories, so the
+    layout can also be read as a partitioned dataset), and keeps `<root>/_manifest.json` with the values,
+    row count and files of every partition. A part file is closed after `rows_per_file` rows, or when more
+    than MAX_OPEN_PARTITIONS partitions are open; later rows of the partition go to the next part file.
+    Writing to an existing root adds part files and updates its manifest.
+    """
+
+    def __init__(self, root: str, partition_by: Sequence[str], formats: Sequence[str], columns: Sequence[str],
+                 with_labels: bool = False, rows_per_file: int = ROWS_PER_FILE, column_types: dict = None):
+        self.root = root
+        self.column_types = column_types
+        self.partition_by = list(partition_by)
+        self.formats = list(formats)
+        self.columns = list(columns)
+        self.with_labels = with_labels
+        self.rows_per_file = rows_per_file
+        self.key_columns = []
+        for key in self.partition_by:
+            column, value_of = PARTITION_KEYS[key]
+            if column not in self.columns:
+                raise ValueError(f"Cannot partition by {key}: the output has no {column} column")
+            self.key_columns.append((self.columns.index(column), value_of))
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        self.partitions = {}
+        if os.path.exists(self.manifest_path):
+            manifest = read_manifest(root)
+            if manifest.get('partition_by') != self.partition_by or manifest.get('columns') != self.columns:
+                raise ValueError(f"{root} holds output partitioned by {manifest.get('partition_by')} or with other "
+                                 f"columns; choose another output folder")
+            self.partitions = {entry['path']: entry for entry in manifest['partitions']}
+        self.open_parts = OrderedDict()  # partition path -> [MultiSink, rows in the part file]
+        self.paths = {}  # partition values -> partition path
+        self._count = 0
+
+    def _partition(self, values: tuple) -> str:
+        path = self.paths.get(values)
+        if path is None:
+            path = '/'.join(f"{key}={_directory_value(value)}" for key, value in zip(self.partition_by, values))
+            self.paths[values] = path
+            if path not in self.partitions:
+                self.partitions[path] = {'path': path, 'values': dict(zip(self.partition_by, values)), 'rows': 0,
+                                         'parts': 0, 'files': []}
+        return path
+
+    def write(self, record: Sequence):
+        path = self._partition(tuple(value_of(record[index] or '') for index, value_of in self.key_columns))
+        part = self.open_parts.get(path)
+        if part is None:
+            part = self._open_part(path)
+        else:
+            self.open_parts.move_to_end(path)
+        part[0].write(record)
+        part[1] += 1
+        self.partitions[path]['rows'] += 1
+        self._count += 1
+        if part[1] >= self.rows_per_file:
+            self._close_part(path)
+
+    def write_many(self, records: Iterable[Sequence]):
+        for record in records:
+            self.write(record)
+
+    def _open_part(self, path: str) -> list:
+        if len(self.open_parts) >= MAX_OPEN_PARTITIONS:
+            self._close_part(next(iter(self.open_parts)))
+        entry = self.partitions[path]
+        folder = os.path.join(self.root, *path.split('/'))
+        os.makedirs(folder, exist_ok=True)
+        base = os.path.join(folder, f"part-{entry['parts']:05d}.txt")
+        entry['parts'] += 1
+        part = self.open_parts[path] = [MultiSink(_file_sinks(base, self.formats, self.columns, self.with_labels,
+                                                                  column_types=self.column_types)), 0]
+        return part
+
+    def _close_part(self, path: str):
+        sink, _ = self.open_parts.pop(path)
+        sink.close()
+        self.partitions[path]['files'].extend(os.path.basename(name) for name in sink.files())
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def close(self):
+        for path in list(self.open_parts):
+            self._close_part(path)
+        if not self.partitions:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        manifest = {
+            'version': 1,
+            'partition_by': self.partition_by,
+            'columns': self.columns,
+            'formats': sorted({os.path.splitext(name)[1][1:] for entry in self.partitions.values() for name in entry['files']}),
+            'rows': sum(entry['rows'] for entry in self.partitions.values()),
+            'partitions': [self.partitions[path] for path in sorted(self.partitions)],
+        }
+        fd, tmp_path = tempfile.mkstemp(prefix='.manifest_', dir=self.root)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def files(self) -> List[str]:
+        return [self.manifest_path] if self._count else []
+
+
+def read_manifest(root: str) -> dict:
+    """Return the manifest of a partitioned output folder."""
+    with open(os.path.join(root, MANIFEST_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def partition_files(root: str, fmt: str = 'txt', **filters) -> List[str]:
+    """
+    Return the `fmt` files of the partitions of `root` matching `filters` (partition key = value or
+    collection of values), e.g. partition_files('xpaths', msg_type='pacs.008', credt=['2025-06-10']).
+    Only the manifest is read: partitions that do not match are never opened.
+    """
+    manifest = read_manifest(root)
+    unknown = [key for key in filters if key not in manifest['partition_by']]
+    if unknown:
+        raise ValueError(f"Not a partition key of {root}: {', '.join(unknown)} (keys: {', '.join(manifest['partition_by'])})")
+    wanted = {key: {value} if isinstance(value, str) else set(value) for key, value in filters.items()}
+    extension = SINKS[fmt].extension
+    paths = []
+    for entry in manifest['partitions']:
+        if all(entry['values'][key] in values for key, values in wanted.items()):
+            folder = os.path.join(root, *entry['path'].split('/'))
+            paths.extend(os.path.join(folder, name) for name in entry['files'] if name.endswith(extension))
+    return paths
+
+
+def open_sinks(output_file: str, formats: Sequence[str], columns: Sequence[str], with_labels: bool = False,
+               console_title: str = None, console_columns: int = None, skip_unavailable: bool = False,
+               partition_by: Sequence[str] = None, column_types: dict = None) -> MultiSink:
+    """
+    Return a MultiSink writing `formats` next to `output_file`, plus a console echo if `console_title` is
+    given. Formats whose dependency is missing raise ImportError, or are reported and left out with
+    `skip_unavailable`. With `partition_by` (PARTITION_KEYS names), the files are written by a
+    PartitionedSink under the output file name without extension. `column_types` maps columns to
+    decimal, date, datetime or code for the formats that keep types.
+    """
+    sinks = []
+    if console_title is not None:
+        sinks.append(ConsoleSink(columns, console_title, console_columns, with_labels, column_types=column_types))
+    file_sinks = _file_sinks(output_file, formats, columns, with_labels, skip_unavailable, column_types)
+    if partition_by:
+        available = [fmt for fmt in formats if any(sink.path == output_path(output_file, fmt) for sink in file_sinks)]
+        sinks.append(PartitionedSink(os.path.splitext(output_file)[0], partition_by, available, columns, with_labels,
+                                     column_types=column_types))
+    else:
+        sinks.extend(file_sinks)
+    return MultiSink(sinks)
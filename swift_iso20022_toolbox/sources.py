@@ -0,0 +1,233 @@
+"""
+ISO20022 Toolbox Input Sources
+------------------------------
+Archive-aware input for the extractors: plain files, folders and `.zip`, `.tar`, `.tar.gz`/`.tgz`,
+`.tar.bz2`, `.tar.xz` and single-file `.gz` archives. Archive members are streamed from the compressed
+container straight into the parser; nothing is extracted to disk.
+
+Features:
+- `iter_sources` yields `(label, name, file object)` for every matching file of a path, folder or archive
+  (also for an in-memory archive, e.g. a Streamlit upload, with `fileobj=`).
+- `memory_archive` packs several in-memory files (e.g. a multi-file upload) into one uncompressed zip that
+  is read as a `fileobj=` source.
+- Member labels use the `archive!/member` notation, e.g. `bundle.zip!/2025-06-01/pacs.008_000001.xml`, so
+  that `os.path.basename` of the label is the member file name.
+- `parse_sources` runs the XPath extractor over all sources, optionally on a process pool: members are read
+  (decompressed) in order by the main process and parsed in parallel, with a bounded number in flight.
+  Results are returned per message (see `xml_to_xpath.iter_messages`), in source order; large bulk files
+  are split into messages that are processed in parallel batches.
+
+Usage Example:
+    from swift_iso20022_toolbox.sources import parse_sources
+    for results, xsd, msgid, fr, to, credt, bizmsgidr, bizsvc in parse_sources('bundle.tar.gz', workers=4):
+        ...
+"""
+import collections
+import gzip
+import io
+import os
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Tuple
+
+from swift_iso20022_toolbox.instrumentation import get_instrumentation
+
+ZIP_SUFFIXES = ('.zip',)
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+GZIP_SUFFIXES = ('.gz',)
+MEMBER_SEPARATOR = '!/'
+# Files at least this large are split into messages by the main process and parsed in message batches
+BULK_SPLIT_BYTES = 8 * 1024 * 1024
+MESSAGE_BATCH_SIZE = 256
+
+
+def archive_kind(name: str):
+    """Return 'zip', 'tar' or 'gzip' for an archive file name, None otherwise."""
+    lower = name.lower()
+    if lower.endswith(ZIP_SUFFIXES):
+        return 'zip'
+    if lower.endswith(TAR_SUFFIXES):
+        return 'tar'
+    if lower.endswith(GZIP_SUFFIXES):
+        return 'gzip'
+    return None
+
+
+def _matches(name: str, suffixes: tuple) -> bool:
+    return name.lower().endswith(suffixes)
+
+
+def _iter_archive(label: str, suffixes: tuple, fileobj=None) -> Iterator[tuple]:
+    """Yield (label, name, file object, is_plain_file) for the matching members of one archive."""
+    kind = archive_kind(label)
+    if kind == 'zip':
+        with zipfile.ZipFile(fileobj if fileobj is not None else label) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not _matches(info.filename, suffixes):
+                    continue
+                with zf.open(info) as member:
+                    yield f"{label}{MEMBER_SEPARATOR}{info.filename}", os.path.basename(info.filename), member, False
+    elif kind == 'tar':
+        # Stream mode ('r|*'): members are decompressed sequentially, without seeking back
+        if fileobj is not None:
+            tf = tarfile.open(fileobj=fileobj, mode='r|*')
+        else:
+            tf = tarfile.open(label, mode='r|*')
+        with tf:
+            for member in tf:
+                if not member.isfile() or not _matches(member.name, suffixes):
+                    continue
+                yield f"{label}{MEMBER_SEPARATOR}{member.name}", os.path.basename(member.name), tf.extractfile(member), False
+    elif kind == 'gzip':
+        name = os.path.basename(label)[:-len('.gz')]
+        if _matches(name, suffixes):
+            with gzip.GzipFile(filename=None if fileobj is not None else label, fileobj=fileobj, mode='rb') as member:
+                yield f"{label}{MEMBER_SEPARATOR}{name}", name, member, False
+
+
+def _iter_entries(path: str, suffixes: tuple, recursive: bool = True, fileobj=None) -> Iterator[tuple]:
+    if fileobj is not None:
+        if archive_kind(path):
+            yield from _iter_archive(path, suffixes, fileobj)
+        elif _matches(path, suffixes):
+            yield path, os.path.basename(path), fileobj, False
+        return
+    if os.path.isdir(path):
+        if recursive:
+            paths = [os.path.join(root, f) for root, _, files in os.walk(path) for f in files]
+        else:
+            paths = [os.path.join(path, f) for f in os.listdir(path)]
+    else:
+        paths = [path]
+    for file_path in paths:
+        if _matches(file_path, suffixes):
+            with open(file_path, 'rb') as f:
+                yield os.path.abspath(file_path), os.path.basename(file_path), f, True
+        elif archive_kind(file_path) and os.path.isfile(file_path):
+            yield from _iter_archive(os.path.abspath(file_path), suffixes)
+
+
+def iter_sources(path: str, suffixes: tuple = ('.xml',), recursive: bool = True, fileobj=None) -> Iterator[Tuple[str, str, object]]:
+    """
+    Yield (label, name, binary file object) for each file ending with one of `suffixes` in `path`: a file,
+    an archive, or a folder of files and archives (walked recursively unless `recursive` is False).
+    If `fileobj` is given, it holds the content of `path` (only its name is used).
+    Each file object is only valid until the next item is requested.
+    """
+    for label, name, f, _ in _iter_entries(path, suffixes, recursive, fileobj):
+        yield label, name, f
+
+
+def memory_archive(files: Iterable[Tuple[str, bytes]]) -> io.BytesIO:
+    """Pack (name, content) pairs into an in-memory zip (stored, not compressed) to be read with `fileobj=`."""
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zf:
+        for name, content in files:
+            zf.writestr(os.path.basename(name), content)
+    archive.seek(0)
+    return archive
+
+
+def read_sources(path: str, suffixes: tuple, recursive: bool = False, fileobj=None) -> Iterator[Tuple[str, str, bytes]]:
+    """Like iter_sources, but yield (label, name, content bytes) for tools that need seekable input."""
+    for label, name, f in iter_sources(path, suffixes, recursive, fileobj):
+        yield label, name, f.read()
+
+
+def _parse_task(task: tuple, strip_space: bool, backend: str = None, patterns: tuple = None, attributes: bool = False) -> list:
+    """Worker task: parse the messages of a plain file by path, or of in-memory member content."""
+    from swift_iso20022_toolbox.xml_to_xpath import parse_messages
+    label, data = task
+    source = None if data is None else io.BytesIO(data)
+    return list(parse_messages(label, strip_space=strip_space, source=source, backend=backend, selection=patterns,
+                               attributes=attributes))
+
+
+def _message_batch_task(file_path: str, items: list, strip_space: bool, backend: str = None, patterns: tuple = None,
+                        attributes: bool = False) -> list:
+    """Worker task: parse and extract a batch of messages split from a bulk file (see split_message_bytes)."""
+    from swift_iso20022_toolbox.selection import get_selection
+    from swift_iso20022_toolbox.xml_to_xpath import message_from_bytes
+    selection = get_selection(patterns)
+    return [message_from_bytes(file_path, *item, backend=backend).results(strip_space, selection, attributes) for item in items]
+
+
+def _split_batches(label: str, source, strip_space: bool) -> Iterator[list]:
+    """Split a bulk file into lists of up to MESSAGE_BATCH_SIZE raw messages (parse errors are reported and end the file)."""
+    import xml.etree.ElementTree as ET
+    from swift_iso20022_toolbox.xml_to_xpath import split_message_bytes
+    inst = get_instrumentation()
+    batch = []
+    try:
+        for item in split_message_bytes(label, strip_space=strip_space, source=source):
+            batch.append(item)
+            if len(batch) >= MESSAGE_BATCH_SIZE:
+                yield batch
+                batch = []
+    except ET.ParseError as e:
+        inst.add('errors')
+        print(f"Error parsing XML file: {label} -- {e}")
+    if batch:
+        yield batch
+
+
+def parse_sources(path: str, strip_space: bool = True, workers: int = 1, fileobj=None, backend: str = None,
+                  selection=None, attributes: bool = False) -> Iterator[tuple]:
+    """
+    Yield (rows, xsd, msgid, fr, to, credt, bizmsgidr, bizsvc) for every message of every XML file in `path`
+    (file, folder or archive), in source order; bulk files yield one result per AppHdr/Document pair.
+    With `workers` > 1, work runs on a process pool with at most `2 x workers` tasks in flight: files
+    smaller than BULK_SPLIT_BYTES are parsed whole by a worker (plain files passed by path, archive members
+    as bytes); larger files are scanned for message boundaries here (expat, no tree building) and batches
+    of raw messages are parsed by the workers. `backend` names the XML parser (see xml_backends) and
+    `selection` (XPathSelection or XPath_strip patterns) restricts the rows to the matching elements and
+    `attributes` adds attribute rows (see parse_messages).
+    """
+    from swift_iso20022_toolbox.xml_backends import get_backend
+    from swift_iso20022_toolbox.xml_to_xpath import parse_messages
+    # Resolved here, so that an unknown or unavailable backend fails before any work starts
+    backend = get_backend(backend).name
+    if workers <= 1:
+        for label, _, f, _ in _iter_entries(path, ('.xml',), fileobj=fileobj):
+            yield from parse_messages(label, strip_space=strip_space, source=f, backend=backend, selection=selection,
+                                      attributes=attributes)
+        return
+    # Workers get the patterns and compile them once per process
+    patterns = None if selection is None else tuple(getattr(selection, 'patterns', selection))
+    inst = get_instrumentation()
+
+    def collected(future) -> Iterator[tuple]:
+        # Workers record nothing in this process: count messages and rows here
+        for result in future.result():
+            inst.add('messages')
+            inst.add('rows', len(result[0]))
+            yield result
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+
+        def submit(func, *args):
+            pending.append(pool.submit(func, *args))
+            if len(pending) >= 2 * workers:
+                return collected(pending.popleft())
+            return iter(())
+
+        for label, _, f, is_plain_file in _iter_entries(path, ('.xml',), fileobj=fileobj):
+            inst.add('files')
+            if is_plain_file:
+                if os.path.getsize(label) < BULK_SPLIT_BYTES:
+                    yield from submit(_parse_task, (label, None), strip_space, backend, patterns, attributes)
+                    continue
+                source = f
+            else:
+                with inst.stage('read'):
+                    data = f.read()
+                if len(data) < BULK_SPLIT_BYTES:
+                    yield from submit(_parse_task, (label, data), strip_space, backend, patterns, attributes)
+                    continue
+                source = io.BytesIO(data)
+            for batch in _split_batches(label, source, strip_space):
+                yield from submit(_message_batch_task, label, batch, strip_space, backend, patterns, attributes)
+        while pending:
+            yield from collected(pending.popleft())
@@ -0,0 +1,316 @@
+"""
+ISO20022 Extract Store
+----------------------
+Embedded SQLite store for XPath extraction output, so that messages can be looked up later by file,
+MsgId, BizMsgIdr, UETR, message type or field without re-parsing the originals.
+
+Features:
+- One row per message (file, position in file, XSD, message type, MsgId, AppHdr fields) and one row per
+  extracted field; XPaths are stored once in a `paths` table and referenced by id.
+- `fields` is clustered by (message_id, seq) (WITHOUT ROWID), so all fields of a message are read with one
+  range scan; indexes on file, MsgId, BizMsgIdr, message type, CreDt, UETR and (XPath_strip, value) keep
+  point lookups in the millisecond range on tens of millions of field rows.
+- UETRs found anywhere in a message (e.g. `/Document/.../PmtId/UETR`, camt.053 entry references) are indexed
+  in a `uetrs` table.
+- Bulk appends in transactions of `batch_size` messages (WAL journal). Reloading a file replaces its messages.
+- Queries (`query`, `stats`, the Streamlit page) open the store read-only.
+
+Usage Example:
+    python -m swift_iso20022_toolbox.store load extracts.db ./messages --workers 4
+    python -m swift_iso20022_toolbox.store query extracts.db --msgid MSG0000000001 --fields
+    python -m swift_iso20022_toolbox.store query extracts.db --type pacs.008 --since 2025-06-01
+    python xml_to_xpath.py ./messages xpaths.txt --store extracts.db
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional
+from urllib.request import pathname2url
+
+from swift_iso20022_toolbox import instrumentation
+from swift_iso20022_toolbox.instrumentation import get_instrumentation
+
+DEFAULT_STORE = 'iso20022_extracts.db'
+METADATA_COLUMNS = ('xsd', 'msgid', 'fr', 'to_bic', 'credt', 'bizmsgidr', 'bizsvc')
+MESSAGE_COLUMNS = ('id', 'file', 'file_name', 'msg_index', 'msg_type') + METADATA_COLUMNS + ('loaded_at',)
+UETR_TAG = '/UETR'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    msg_index INTEGER NOT NULL,
+    msg_type TEXT,
+    xsd TEXT,
+    msgid TEXT,
+    fr TEXT,
+    to_bic TEXT,
+    credt TEXT,
+    bizmsgidr TEXT,
+    bizsvc TEXT,
+    loaded_at TEXT
+);
+CREATE TABLE IF NOT EXISTS paths (
+    id INTEGER PRIMARY KEY,
+    xpath TEXT NOT NULL UNIQUE,
+    xpath_strip TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fields (
+    message_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    path_id INTEGER NOT NULL,
+    value TEXT,
+    PRIMARY KEY (message_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS uetrs (
+    uetr TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    PRIMARY KEY (uetr, message_id)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS messages_file ON messages (file, msg_index);
+CREATE INDEX IF NOT EXISTS messages_file_name ON messages (file_name);
+CREATE INDEX IF NOT EXISTS messages_msgid ON messages (msgid);
+CREATE INDEX IF NOT EXISTS messages_bizmsgidr ON messages (bizmsgidr);
+CREATE INDEX IF NOT EXISTS messages_type ON messages (msg_type, credt);
+CREATE INDEX IF NOT EXISTS messages_credt ON messages (credt);
+CREATE INDEX IF NOT EXISTS paths_strip ON paths (xpath_strip);
+CREATE INDEX IF NOT EXISTS fields_path_value ON fields (path_id, value);
+CREATE INDEX IF NOT EXISTS uetrs_message ON uetrs (message_id);
+"""
+
+
+def message_type(xsd: str) -> str:
+    """Message type of an XSD/MsgDefIdr value, e.g. `pacs.008` for `pacs.008.001.08` or its namespace."""
+    if not xsd:
+        return ''
+    name = xsd.rsplit(':', 1)[-1]
+    return '.'.join(name.split('.')[:2])
+
+
+class ExtractStore:
+    """SQLite store of extracted messages and fields."""
+
+    def __init__(self, path: str = DEFAULT_STORE, batch_size: int = 500, read_only: bool = False):
+        """
+        Open (or create) the store at `path`. With `read_only`, an existing store is opened for queries only
+        (SQLite `mode=ro`): no schema setup or journal change, and no write lock is ever taken.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.path_ids = {}
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True, isolation_level=None)
+        else:
+            # Autocommit mode: transactions are opened and committed explicitly, per batch of messages
+            self.conn = sqlite3.connect(path, isolation_level=None)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.executescript(SCHEMA)
+        self.next_message_id = (self.conn.execute('SELECT MAX(id) FROM messages').fetchone()[0] or 0) + 1
+        self.pending = 0
+        self.current_file = None
+        self.current_index = 0
+        self.loaded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def _path_id(self, xpath: str, xpath_strip: str) -> int:
+        path_id = self.path_ids.get(xpath)
+        if path_id is None:
+            self.conn.execute('INSERT OR IGNORE INTO paths (xpath, xpath_strip) VALUES (?, ?)', (xpath, xpath_strip))
+            path_id = self.conn.execute('SELECT id FROM paths WHERE xpath = ?', (xpath,)).fetchone()[0]
+            self.path_ids[xpath] = path_id
+        return path_id
+
+    def _forget_file(self, file_path: str):
+        """Remove previously loaded messages of a file that is being loaded again."""
+        ids = [row[0] for row in self.conn.execute('SELECT id FROM messages WHERE file = ?', (file_path,))]
+        if not ids:
+            return
+        self.conn.executemany('DELETE FROM fields WHERE message_id = ?', [(i,) for i in ids])
+        self.conn.executemany('DELETE FROM uetrs WHERE message_id = ?', [(i,) for i in ids])
+        self.conn.execute('DELETE FROM messages WHERE file = ?', (file_path,))
+
+    def add(self, results: list, metadata: tuple) -> Optional[int]:
+        """
+        Append one message (rows and metadata as returned by parse_messages) and return its id.
+        Consecutive messages of the same file get increasing positions; a file seen again in a later
+        run replaces its earlier messages.
+        """
+        if not results:
+            return None
+        inst = get_instrumentation()
+        with inst.stage('store'):
+            file_path, file_name = results[0][3], results[0][4]
+            if self.pending == 0:
+                self.conn.execute('BEGIN')
+            if file_path != self.current_file:
+                self._forget_file(file_path)
+                self.current_file = file_path
+                self.current_index = 0
+            message_id = self.next_message_id
+            self.next_message_id += 1
+            self.conn.execute(
+                f"INSERT INTO messages ({', '.join(MESSAGE_COLUMNS)}) VALUES ({', '.join('?' * len(MESSAGE_COLUMNS))})",
+                (message_id, file_path, file_name, self.current_index, message_type(metadata[0])) + tuple(metadata) + (self.loaded_at,),
+            )
+            self.current_index += 1
+            fields = []
+            uetrs = set()
+            for seq, (xpath, xpath_strip, value, _, _) in enumerate(results):
+                fields.append((message_id, seq, self._path_id(xpath, xpath_strip), value))
+                if value and xpath_strip.endswith(UETR_TAG):
+                    uetrs.add(value)
+            self.conn.executemany('INSERT INTO fields (message_id, seq, path_id, value) VALUES (?, ?, ?, ?)', fields)
+            if uetrs:
+                self.conn.executemany('INSERT OR IGNORE INTO uetrs (uetr, message_id) VALUES (?, ?)',
+                                      [(uetr, message_id) for uetr in uetrs])
+            self.pending += 1
+            if self.pending >= self.batch_size:
+                self.commit()
+        inst.add('stored_messages')
+        inst.add('stored_fields', len(results))
+        return message_id
+
+    def add_all(self, parsed: Iterable[tuple]) -> int:
+        """Append every (rows, *metadata) result of an iterable (e.g. parse_sources) and return the message count."""
+        count = 0
+        for results, *metadata in parsed:
+            if self.add(results, tuple(metadata)) is not None:
+                count += 1
+        self.commit()
+        return count
+
+    def commit(self):
+        if self.pending:
+            self.conn.execute('COMMIT')
+            self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    # --- Queries ---------------------------------------------------------------------------------
+
+    def find_messages(self, file: str = None, msgid: str = None, bizmsgidr: str = None, uetr: str = None,
+                      msg_type: str = None, xpath_strip: str = None, value: str = None,
+                      since: str = None, until: str = None, limit: int = 1000) -> List[dict]:
+        """Return the messages matching all given criteria (exact matches; since/until compare CreDt)."""
+        clauses = []
+        params = []
+        if file is not None:
+            clauses.append('(m.file = ? OR m.file_name = ?)')
+            params += [file, file]
+        for column, criterion in (('msgid', msgid), ('bizmsgidr', bizmsgidr), ('msg_type', msg_type)):
+            if criterion is not None:
+                clauses.append(f"m.{column} = ?")
+                params.append(criterion)
+        if uetr is not None:
+            clauses.append('m.id IN (SELECT message_id FROM uetrs WHERE uetr = ?)')
+            params.append(uetr)
+        if xpath_strip is not None:
+            field_clause = 'f.path_id IN (SELECT id FROM paths WHERE xpath_strip = ?)'
+            params.append(xpath_strip)
+            if value is not None:
+                field_clause += ' AND f.value = ?'
+                params.append(value)
+            clauses.append(f"m.id IN (SELECT f.message_id FROM fields f WHERE {field_clause})")
+        if since is not None:
+            clauses.append('m.credt >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('m.credt < ?')
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        cursor = self.conn.execute(
+            f"SELECT {', '.join('m.' + c for c in MESSAGE_COLUMNS)} FROM messages m {where} ORDER BY m.id LIMIT ?",
+            params + [limit],
+        )
+        return [dict(zip(MESSAGE_COLUMNS, row)) for row in cursor]
+
+    def message_fields(self, message_id: int) -> List[dict]:
+        """Return the fields of a message in document order."""
+        cursor = self.conn.execute(
+            'SELECT p.xpath, p.xpath_strip, f.value FROM fields f JOIN paths p ON p.id = f.path_id '
+            'WHERE f.message_id = ? ORDER BY f.seq', (message_id,),
+        )
+        return [{'XPath': xpath, 'XPath_strip': xpath_strip, 'Value': value} for xpath, xpath_strip, value in cursor]
+
+    def stats(self) -> dict:
+        return {
+            'messages': self.conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0],
+            'fields': self.conn.execute('SELECT COUNT(*) FROM fields').fetchone()[0],
+            'paths': self.conn.execute('SELECT COUNT(*) FROM paths').fetchone()[0],
+            'uetrs': self.conn.execute('SELECT COUNT(*) FROM uetrs').fetchone()[0],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load XPath extracts into an SQLite store and query them.")
+    commands = parser.add_subparsers(dest='command')
+    load = commands.add_parser('load', help='Extract XML files (folder, file or archive) into the store')
+    load.add_argument('store', type=str, help='SQLite store file')
+    load.add_argument('input', type=str, help='XML file, folder or archive')
+    load.add_argument('--workers', type=int, default=1, help='Worker processes for parsing')
+    load.add_argument('--no-strip', action='store_true', help='Keep whitespace in values')
+    load.add_argument('--batch-size', type=int, default=500, help='Messages per transaction')
+    load.add_argument('--metrics-json', type=str, default=None, help='Append run timings and counters as a JSON line to this file')
+    load.add_argument('--metrics-prom', type=str, default=None, help='Write run timings and counters in Prometheus text format to this file')
+    query = commands.add_parser('query', help='Find messages and print them (or their fields)')
+    query.add_argument('store', type=str, help='SQLite store file')
+    query.add_argument('--file', type=str, default=None, help='File path or file name')
+    query.add_argument('--msgid', type=str, default=None)
+    query.add_argument('--bizmsgidr', type=str, default=None)
+    query.add_argument('--uetr', type=str, default=None)
+    query.add_argument('--type', dest='msg_type', type=str, default=None, help='Message type, e.g. pacs.008')
+    query.add_argument('--xpath-strip', type=str, default=None, help='Messages having this field (optionally with --value)')
+    query.add_argument('--value', type=str, default=None)
+    query.add_argument('--since', type=str, default=None, help='AppHdr CreDt lower bound, e.g. 2025-06-01')
+    query.add_argument('--until', type=str, default=None, help='AppHdr CreDt upper bound (exclusive)')
+    query.add_argument('--limit', type=int, default=1000)
+    query.add_argument('--fields', action='store_true', help='Print all fields of each matching message')
+    commands.add_parser('stats', help='Print row counts').add_argument('store', type=str, help='SQLite store file')
+    args = parser.parse_args()
+
+    if args.command == 'load':
+        from swift_iso20022_toolbox.sources import parse_sources
+        inst = instrumentation.enable('store') if args.metrics_json or args.metrics_prom else get_instrumentation()
+        store = ExtractStore(args.store, batch_size=args.batch_size)
+        start = time.perf_counter()
+        count = store.add_all(parse_sources(args.input, strip_space=not args.no_strip, workers=args.workers))
+        store.close()
+        print(f"Stored {count} message(s) in {args.store} in {time.perf_counter() - start:.2f}s")
+        instrumentation.export(inst, json_log=args.metrics_json, prometheus=args.metrics_prom)
+    elif args.command == 'query':
+        if not os.path.exists(args.store):
+            print(f"Store not found: {args.store}")
+            sys.exit(1)
+        store = ExtractStore(args.store, read_only=True)
+        start = time.perf_counter()
+        messages = store.find_messages(args.file, args.msgid, args.bizmsgidr, args.uetr, args.msg_type,
+                                       args.xpath_strip, args.value, args.since, args.until, args.limit)
+        elapsed = time.perf_counter() - start
+        print(' | '.join(MESSAGE_COLUMNS))
+        for message in messages:
+            print(' | '.join('' if v is None else str(v) for v in message.values()))
+            if args.fields:
+                for field in store.message_fields(message['id']):
+                    print(f"    {field['XPath_strip'] or field['XPath']} | {field['Value']}")
+        print(f"{len(messages)} message(s) in {elapsed * 1000:.1f} ms")
+        store.close()
+    elif args.command == 'stats':
+        if not os.path.exists(args.store):
+            print(f"Store not found: {args.store}")
+            sys.exit(1)
+        store = ExtractStore(args.store, read_only=True)
+        for key, value in store.stats().items():
+            print(f"{key}: {value}")
+        store.close()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
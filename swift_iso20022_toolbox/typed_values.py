@@ -0,0 +1,190 @@
+"""
+ISO20022 Typed Values
+---------------------
+Typed value columns for the XPath extractor: the XSD simple type of every row (see xsd_schema) decides how its
+string value is converted, so consumers can aggregate amounts and filter dates without parsing strings.
+
+Features:
+- Value kinds from the simple type's xs: base: decimal (amounts, rates, numbers), date, datetime, boolean, code
+  (enumerations, ISO codes such as currencies and countries) and string. AppHdr fields use APPHDR_KINDS, as
+  the head.001 schema is not part of the CBPR+ XSD folders.
+- Attribute rows (`.../IntrBkSttlmAmt/@Ccy`, see `xml_to_xpath --attributes`) are typed from the attribute
+  declarations, and an amount row gets the currency of the `@Ccy` row that follows it in the Ccy column.
+- Conversion runs per message, one batch per value kind: all decimal values go through one map(parse_decimal, ...)
+  call, all dates through one map(date.fromisoformat, ...), and so on (plain map() calls, not array-level
+  vectorisation); a value that does not convert is left out of the typed columns (its string stays in the
+  Value column). Decimals must be finite and fit the decimal
+  column of the typed sinks (sinks.DECIMAL_PRECISION and DECIMAL_SCALE).
+- Kinds are resolved once per (XSD, XPath_strip) and cached, against the merged index of all usage guideline
+  variants of the message (e.g. pacs.009 ADV, COV and core; see xsd_schema.schemas_by_message).
+
+Typed columns (TYPED_COLUMNS): ValueType | NumericValue | DateValue | DateTimeValue | CodeValue | Ccy
+
+Usage Example:
+    from swift_iso20022_toolbox.typed_values import TypedValues
+    typed = TypedValues('data/sample_xsd_plain_baseline')
+    for results, xsd, *metadata in parse_messages('pacs008.xml', attributes=True):
+        for row, columns in zip(results, typed.convert(results, xsd)):
+            ...
+    python xml_to_xpath.py ./messages xpaths.txt --typed --format parquet
+"""
+import os
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Callable, List
+
+from swift_iso20022_toolbox.sinks import DECIMAL_PRECISION, DECIMAL_SCALE
+from swift_iso20022_toolbox.xsd_schema import SimpleType, schemas_by_message
+
+DEFAULT_XSD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'sample_xsd_plain_baseline')
+TYPED_COLUMNS = ['ValueType', 'NumericValue', 'DateValue', 'DateTimeValue', 'CodeValue', 'Ccy']
+# Column types of the typed columns, for the sinks that keep types (parquet, xlsx)
+TYPED_COLUMN_TYPES = {'NumericValue': 'decimal', 'DateValue': 'date', 'DateTimeValue': 'datetime',
+                      'CodeValue': 'code', 'Ccy': 'code'}
+DECIMAL_BASES = {'xs:decimal', 'xs:integer', 'xs:int', 'xs:long', 'xs:short', 'xs:nonNegativeInteger',
+                 'xs:positiveInteger', 'xs:float', 'xs:double'}
+APPHDR_KINDS = {
+    '/AppHdr/CreDt': 'datetime',
+    '/AppHdr/PssblDplct': 'boolean',
+    '/AppHdr/Prty': 'code',
+    '/AppHdr/CpyDplct': 'code',
+}
+CURRENCY_ATTRIBUTE = '/@Ccy'
+_FRACTION = re.compile(r'\.(\d+)')
+_DECIMAL_LIMIT = Decimal(10) ** (DECIMAL_PRECISION - DECIMAL_SCALE)
+
+
+def simple_type_kind(simple_type: SimpleType) -> str:
+    """Value kind of an XSD simple type."""
+    if simple_type is None:
+        return 'string'
+    base = simple_type.base
+    if base in DECIMAL_BASES:
+        return 'decimal'
+    if base == 'xs:date':
+        return 'date'
+    if base == 'xs:dateTime':
+        return 'datetime'
+    if base == 'xs:boolean':
+        return 'boolean'
+    if simple_type.enumerations or simple_type.name.endswith('Code'):
+        return 'code'
+    return 'string'
+
+
+def parse_datetime(value: str) -> datetime:
+    """ISO 8601 date-time as datetime (`Z` and fractions of any length accepted, as in xs:dateTime)."""
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        # Older Pythons only take 3 or 6 fraction digits
+        return datetime.fromisoformat(_FRACTION.sub(lambda m: '.' + (m.group(1) + '000000')[:6], value, count=1))
+
+
+def parse_decimal(value: str) -> Decimal:
+    """
+    xs:decimal value as Decimal. ValueError for NaN and Infinity, and for values the typed sinks' decimal column
+    cannot hold without loss (more than DECIMAL_PRECISION - DECIMAL_SCALE integer or DECIMAL_SCALE fraction digits).
+    """
+    number = Decimal(value)
+    if not number.is_finite() or abs(number) >= _DECIMAL_LIMIT:
+        raise ValueError(value)
+    digits, exponent = number.as_tuple()[1:]
+    # Trailing zeros beyond the scale are harmless
+    if exponent < -DECIMAL_SCALE and any(digits[exponent + DECIMAL_SCALE:]):
+        raise ValueError(value)
+    return number
+
+
+def _parse_boolean(value: str) -> str:
+    if value not in ('true', 'false', '1', '0'):
+        raise ValueError(value)
+    return 'true' if value in ('true', '1') else 'false'
+
+
+# Kind -> (typed column index in TYPED_COLUMNS, converter)
+_CONVERTERS = {
+    'decimal': (1, parse_decimal),
+    'date': (2, date.fromisoformat),
+    'datetime': (3, parse_datetime),
+    'boolean': (4, _parse_boolean),
+    'code': (4, str),
+}
+
+
+def _convert_all(converter: Callable, values: List[str]) -> List:
+    """Convert a batch in one map() call; fall back to value by value (None when invalid) on an error."""
+    try:
+        return list(map(converter, values))
+    except (ValueError, TypeError, InvalidOperation):
+        converted = []
+        for value in values:
+            try:
+                converted.append(converter(value))
+            except (ValueError, TypeError, InvalidOperation):
+                converted.append(None)
+        return converted
+
+
+class TypedValues:
+    """Converts extractor rows into TYPED_COLUMNS values, using the schemas of an XSD folder."""
+
+    def __init__(self, xsd_folder: str = DEFAULT_XSD_FOLDER):
+        self.xsd_folder = xsd_folder
+        self._schemas = None
+        self._kinds = {}  # (xsd, XPath_strip) -> kind
+
+    @property
+    def schemas(self) -> dict:
+        if self._schemas is None:
+            self._schemas = schemas_by_message(self.xsd_folder) if os.path.isdir(self.xsd_folder) else {}
+        return self._schemas
+
+    def kind(self, xsd: str, xpath_strip: str) -> str:
+        """Value kind of the rows at `xpath_strip` in messages of `xsd` (cached)."""
+        key = (xsd, xpath_strip)
+        kind = self._kinds.get(key)
+        if kind is None:
+            kind = self._kinds[key] = self._resolve(xsd, xpath_strip)
+        return kind
+
+    def _resolve(self, xsd: str, xpath_strip: str) -> str:
+        if xpath_strip.startswith('/AppHdr'):
+            return APPHDR_KINDS.get(xpath_strip, 'code' if xpath_strip.endswith(CURRENCY_ATTRIBUTE) else 'string')
+        schema = self.schemas.get(xsd.rsplit(':', 1)[-1] if xsd else '')
+        if schema is None or not xpath_strip:
+            return 'string'
+        element_path, _, attribute = xpath_strip.partition('/@')
+        node = schema.index.get(element_path)
+        if node is None:
+            return 'string'
+        if attribute:
+            for name, simple_type, _ in node.attributes:
+                if name == attribute:
+                    return simple_type_kind(simple_type)
+            return 'string'
+        return simple_type_kind(node.simple_type) if node.is_leaf else 'string'
+
+    def convert(self, results: list, xsd: str) -> List[tuple]:
+        """Return the TYPED_COLUMNS values of each row of one message (rows as from parse_messages)."""
+        kinds = [self.kind(xsd, row[1]) for row in results]
+        columns = [[kind, None, None, None, None, None] for kind in kinds]
+        batches = {}
+        for index, kind in enumerate(kinds):
+            if kind in _CONVERTERS:
+                batches.setdefault(kind, []).append(index)
+        for kind, indexes in batches.items():
+            column, converter = _CONVERTERS[kind]
+            values = _convert_all(converter, [results[index][2] for index in indexes])
+            for index, value in zip(indexes, values):
+                columns[index][column] = value
+        # The currency of an amount is in the @Ccy attribute row right after it
+        for index in range(1, len(results)):
+            xpath = results[index][0]
+            if xpath.endswith(CURRENCY_ATTRIBUTE) and results[index - 1][0] == xpath[:-len(CURRENCY_ATTRIBUTE)]:
+                columns[index - 1][5] = results[index][2]
+        return [tuple(row) for row in columns]
+
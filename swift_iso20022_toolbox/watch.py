@@ -0,0 +1,488 @@
+"""
+ISO20022 Toolbox Watch-Folder Ingestion
+---------------------------------------
+Watches a drop directory for inbound MX files and runs only new or changed files through the XPath
+extractor, appending the rows to partitioned output files.
+
+Features:
+- Change detection with inotify (Linux, via ctypes) and a polling fallback (`--poll`, or automatically
+  where inotify is unavailable). Polled files are picked up once they have not changed for `--settle` seconds.
+- Bounded process worker pool: at most `2 x --workers` files are in flight, the rest wait in the backlog.
+- Partitioned output: rows are appended to `<output>/<YYYY-MM-DD>/xpaths.txt` (ingestion date), in the
+  XPath output file format of `xml_to_xpath`.
+- Durable checkpoint manifest (`<output>/watch_manifest.json`): size and mtime of every processed file,
+  as stat'ed when it was submitted; a file that changed while it was processed is queued again.
+  Output files are fsynced before the manifest is atomically replaced, so after a restart only files
+  that are new or changed since the last checkpoint are processed (at-least-once: a crash between
+  the append and the checkpoint can repeat the rows of the files processed in that window).
+- Duplicate tagging (`--dedup <index>`): rows get a Duplicate column naming the identifiers (BizMsgIdr,
+  MsgId, UETR) already seen in the persistent index of `dedup.py`. The index is flushed with every checkpoint;
+  files repeated after a crash may be tagged as duplicates of their own first run.
+- Observability: a status line every `--status-interval` seconds with backlog depth and throughput, and
+  the same figures as gauges in the Prometheus file (`--metrics-prom`) and JSON log (`--metrics-json`).
+
+Usage Example:
+    python -m swift_iso20022_toolbox.watch ./inbound ./xpath_output --workers 4 --metrics-prom watch.prom
+    python -m swift_iso20022_toolbox.watch ./inbound ./xpath_output --once
+"""
+import argparse
+import collections
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import signal
+import struct
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import List, Optional
+
+from swift_iso20022_toolbox import instrumentation
+from swift_iso20022_toolbox.xml_backends import BACKENDS, get_backend
+from swift_iso20022_toolbox.xml_to_xpath import OUTPUT_FILE_HEADER, OUTPUT_FILE_HEADER_DEDUP
+
+MANIFEST_NAME = 'watch_manifest.json'
+PARTITION_FILE_NAME = 'xpaths.txt'
+
+# inotify constants (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def is_xml_file(path: str) -> bool:
+    return path.lower().endswith('.xml')
+
+
+def file_signature(path: str) -> Optional[list]:
+    """Return [size, mtime_ns] of a file, or None if it disappeared."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class PollingWatcher:
+    """Detects changed files by periodically walking the folder and comparing sizes and mtimes."""
+
+    def __init__(self, folder: str, interval: float = 1.0, settle: float = 1.0):
+        self.folder = folder
+        self.interval = interval
+        self.settle = settle
+        self.reported = {}  # path -> signature last returned
+        self.next_scan = 0.0
+
+    def changes(self, timeout: float) -> List[str]:
+        """Return files that changed since the last call and have been stable for `settle` seconds."""
+        now = time.time()
+        if now < self.next_scan:
+            time.sleep(min(timeout, self.next_scan - now))
+            return []
+        self.next_scan = now + self.interval
+        changed = []
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                if not is_xml_file(name):
+                    continue
+                path = os.path.abspath(os.path.join(root, name))
+                signature = file_signature(path)
+                if signature is None or self.reported.get(path) == signature:
+                    continue
+                if now - signature[1] / 1e9 < self.settle:
+                    continue  # Still being written
+                self.reported[path] = signature
+                changed.append(path)
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify watcher (through ctypes) on a folder tree; reports files once they are closed or moved in."""
+
+    def __init__(self, folder: str):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or libc_name is None:
+            raise OSError('inotify is not available on this platform')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.folder = folder
+        self.watches = {}  # watch descriptor -> directory
+        self.overflowed = False
+        for root, _, _ in os.walk(folder):
+            self._add_watch(root)
+
+    def _add_watch(self, directory: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = directory
+
+    def _scan_new_directory(self, directory: str) -> List[str]:
+        """Watch a directory created (or moved) into the tree and return the XML files already inside it."""
+        found = []
+        for root, _, files in os.walk(directory):
+            self._add_watch(root)
+            found.extend(os.path.abspath(os.path.join(root, name)) for name in files if is_xml_file(name))
+        return found
+
+    def changes(self, timeout: float) -> List[str]:
+        """Return files closed after writing or moved into the tree, waiting up to `timeout` seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b'\0'))
+            offset += name_len
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True  # Events were dropped: the daemon rescans the folder
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.abspath(os.path.join(directory, name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.extend(self._scan_new_directory(path))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and is_xml_file(name):
+                changed.append(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_watcher(folder: str, poll: bool = False, interval: float = 1.0, settle: float = 1.0):
+    """Return an inotify watcher, or a polling watcher if requested or if inotify is unavailable."""
+    if not poll:
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), falling back to polling every {interval}s")
+    return PollingWatcher(folder, interval, settle)
+
+
+class CheckpointManifest:
+    """JSON manifest of processed files, replaced atomically on every save."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = {}  # path -> signature, rows, partition, processed_at
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.files = json.load(f).get('files', {})
+        self.dirty = False
+
+    def is_current(self, path: str, signature: list) -> bool:
+        entry = self.files.get(path)
+        return entry is not None and entry['signature'] == signature
+
+    def record(self, path: str, signature: list, rows: int, partition: str):
+        self.files[path] = {
+            'signature': signature,
+            'rows': rows,
+            'partition': partition,
+            'processed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        self.dirty = True
+
+    def prune(self, existing: set):
+        """Forget files that are no longer in the watch folder."""
+        for path in [p for p in self.files if p not in existing]:
+            del self.files[path]
+            self.dirty = True
+
+    def save(self):
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.watch_manifest_', dir=folder)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'files': self.files}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.dirty = False
+
+
+class PartitionWriter:
+    """Appends output lines to one file per ingestion date, keeping the files open between appends."""
+
+    def __init__(self, output_folder: str, header: str = OUTPUT_FILE_HEADER):
+        self.output_folder = output_folder
+        self.header = header
+        self.handles = {}
+
+    def append(self, lines: List[str]) -> str:
+        partition = datetime.now().strftime('%Y-%m-%d')
+        handle = self.handles.get(partition)
+        if handle is None:
+            folder = os.path.join(self.output_folder, partition)
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, PARTITION_FILE_NAME)
+            is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+            handle = open(path, 'a', encoding='utf-8')
+            if is_new:
+                handle.write(self.header + '\n')
+            self.handles[partition] = handle
+        if lines:
+            handle.write('\n'.join(lines) + '\n')
+        return partition
+
+    def sync(self):
+        """Flush and fsync all open partitions (called before every checkpoint)."""
+        for partition, handle in list(self.handles.items()):
+            handle.flush()
+            os.fsync(handle.fileno())
+            if partition != datetime.now().strftime('%Y-%m-%d'):
+                handle.close()
+                del self.handles[partition]
+
+    def close(self):
+        for handle in self.handles.values():
+            handle.close()
+        self.handles = {}
+
+
+def _ignore_interrupts():
+    """Worker initializer: leave SIGINT to the daemon, which drains the pool on shutdown."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _extract_file(path: str, strip_space: bool, identifiers: bool = False, backend: str = None) -> tuple:
+    """
+    Worker task: return (messages, error flag) for one XML file, where messages is a list of
+    (duplicate identifiers or None, formatted output lines) per message.
+    """
+    from swift_iso20022_toolbox.xml_to_xpath import format_output_line, parse_messages
+    if identifiers:
+        from swift_iso20022_toolbox.dedup import message_identifiers
+    messages = []
+    for results, *metadata in parse_messages(path, strip_space=strip_space, backend=backend):
+        metadata = tuple(metadata)
+        lines = [format_output_line(row, metadata) for row in results]
+        if lines:
+            messages.append((message_identifiers(results, metadata) if identifiers else None, lines))
+    return messages, not messages
+
+
+class WatchDaemon:
+    """Feeds new and changed files from a watcher through a bounded worker pool into partitioned outputs."""
+
+    def __init__(self, watch_folder: str, output_folder: str, workers: int = None, poll: bool = False,
+                 interval: float = 1.0, settle: float = 1.0, manifest_path: str = None, strip_space: bool = True,
+                 checkpoint_interval: float = 1.0, status_interval: float = 10.0, dedup_path: str = None,
+                 backend: str = None):
+        self.watch_folder = os.path.abspath(watch_folder)
+        self.output_folder = output_folder
+        os.makedirs(output_folder, exist_ok=True)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = 2 * self.workers
+        self.poll = poll
+        self.interval = interval
+        self.settle = settle
+        self.strip_space = strip_space
+        self.backend = get_backend(backend).name
+        self.manifest = CheckpointManifest(manifest_path or os.path.join(output_folder, MANIFEST_NAME))
+        self.dedup = None
+        if dedup_path:
+            from swift_iso20022_toolbox.dedup import DuplicateIndex
+            self.dedup = DuplicateIndex(dedup_path)
+        self.writer = PartitionWriter(output_folder, OUTPUT_FILE_HEADER_DEDUP if self.dedup is not None else OUTPUT_FILE_HEADER)
+        self.backlog = collections.OrderedDict()  # path -> None, in arrival order
+        self.in_flight = {}  # future -> (path, signature)
+        self.checkpoint_interval = checkpoint_interval
+        self.status_interval = status_interval
+        self.inst = instrumentation.enable('watch')
+        self.stopping = False
+        self.last_checkpoint = time.time()
+        self.last_status = time.time()
+        self.status_counts = (0, 0)
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def enqueue(self, path: str):
+        # A file already in flight is checked again when its job finishes (see collect)
+        if path in self.backlog or any(p == path for p, _ in self.in_flight.values()):
+            return
+        signature = file_signature(path)
+        if signature is None or self.manifest.is_current(path, signature):
+            return
+        self.backlog[path] = None
+
+    def catch_up(self):
+        """Stat every file in the watch folder and queue those missing from (or changed since) the manifest."""
+        existing = set()
+        for root, _, files in os.walk(self.watch_folder):
+            for name in files:
+                if is_xml_file(name):
+                    path = os.path.abspath(os.path.join(root, name))
+                    existing.add(path)
+                    self.enqueue(path)
+        self.manifest.prune(existing)
+
+    def submit(self, pool: ProcessPoolExecutor):
+        while self.backlog and len(self.in_flight) < self.max_in_flight:
+            path, _ = self.backlog.popitem(last=False)
+            signature = file_signature(path)
+            if signature is None:
+                continue
+            self.in_flight[pool.submit(_extract_file, path, self.strip_space, self.dedup is not None, self.backend)] = (path, signature)
+
+    def collect(self, timeout: float):
+        if not self.in_flight:
+            return
+        done, _ = wait(list(self.in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            path, signature = self.in_flight.pop(future)
+            try:
+                messages, failed = future.result()
+            except Exception as e:
+                print(f"Error processing {path}: {e}")
+                messages, failed = [], True
+            lines = []
+            for identifiers, message_lines in messages:
+                if self.dedup is not None:
+                    tag = ' | ' + ','.join(self.dedup.check_identifiers(identifiers))
+                    message_lines = [line + tag for line in message_lines]
+                lines.extend(message_lines)
+            with self.inst.stage('write'):
+                partition = self.writer.append(lines)
+            self.inst.add('files')
+            self.inst.add('rows', len(lines))
+            if failed:
+                self.inst.add('errors')
+            self.manifest.record(path, signature, len(lines), partition)
+            # The file changed while it was processed: the manifest holds the processed version, queue the new one
+            if file_signature(path) != signature:
+                self.enqueue(path)
+
+    def checkpoint(self, force: bool = False):
+        if not self.manifest.dirty or (not force and time.time() - self.last_checkpoint < self.checkpoint_interval):
+            return
+        with self.inst.stage('checkpoint'):
+            self.writer.sync()
+            if self.dedup is not None:
+                self.dedup.flush()
+            self.manifest.save()
+        self.last_checkpoint = time.time()
+
+    def report(self, metrics_json: str = None, metrics_prom: str = None, force: bool = False):
+        now = time.time()
+        elapsed = now - self.last_status
+        if not force and elapsed < self.status_interval:
+            return
+        files = self.inst.counters.get('files', 0)
+        rows = self.inst.counters.get('rows', 0)
+        files_per_sec = (files - self.status_counts[0]) / elapsed if elapsed > 0 else 0.0
+        rows_per_sec = (rows - self.status_counts[1]) / elapsed if elapsed > 0 else 0.0
+        self.inst.set_gauge('backlog', len(self.backlog) + len(self.in_flight))
+        self.inst.set_gauge('in_flight', len(self.in_flight))
+        self.inst.set_gauge('files_per_second', round(files_per_sec, 3))
+        self.inst.set_gauge('rows_per_second', round(rows_per_sec, 3))
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] processed={files} rows={rows} "
+              f"errors={self.inst.counters.get('errors', 0)} backlog={len(self.backlog)} in_flight={len(self.in_flight)} "
+              f"files/s={files_per_sec:.1f} rows/s={rows_per_sec:.0f}")
+        instrumentation.export(self.inst, prometheus=metrics_prom)
+        if metrics_json and force:
+            self.inst.write_json_log(metrics_json)
+        self.last_status = now
+        self.status_counts = (files, rows)
+
+    def run(self, once: bool = False, metrics_json: str = None, metrics_prom: str = None):
+        """Process the backlog, then (unless `once`) keep watching until SIGINT/SIGTERM."""
+        watcher = None if once else open_watcher(self.watch_folder, self.poll, self.interval, self.settle)
+        self.catch_up()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_interrupts) as pool:
+                while not self.stopping:
+                    if watcher is not None:
+                        wait_time = 0.0 if len(self.in_flight) >= self.max_in_flight else 0.2
+                        for path in watcher.changes(wait_time):
+                            self.enqueue(path)
+                        if getattr(watcher, 'overflowed', False):
+                            watcher.overflowed = False
+                            self.catch_up()
+                    self.submit(pool)
+                    self.collect(timeout=0.2 if watcher is None else 0.05)
+                    self.checkpoint()
+                    self.report(metrics_json, metrics_prom)
+                    if once and not self.backlog and not self.in_flight:
+                        break
+                # Drain in-flight files so their rows and checkpoints are not lost
+                while self.in_flight:
+                    self.collect(timeout=1.0)
+        finally:
+            self.checkpoint(force=True)
+            self.writer.close()
+            if self.dedup is not None:
+                self.dedup.close()
+            if watcher is not None:
+                watcher.close()
+            self.report(metrics_json, metrics_prom, force=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a folder and extract XPaths from new or changed XML files.")
+    parser.add_argument('watch_folder', type=str, help='Drop directory to watch')
+    parser.add_argument('output_folder', type=str, help='Folder for the partitioned outputs and the checkpoint manifest')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--poll', action='store_true', help='Use polling instead of inotify')
+    parser.add_argument('--interval', type=float, default=1.0, help='Polling interval in seconds')
+    parser.add_argument('--settle', type=float, default=1.0, help='Seconds a polled file must be unchanged before processing')
+    parser.add_argument('--manifest', type=str, default=None, help=f'Checkpoint manifest (default: <output_folder>/{MANIFEST_NAME})')
+    parser.add_argument('--checkpoint-interval', type=float, default=1.0, help='Seconds between checkpoints')
+    parser.add_argument('--status-interval', type=float, default=10.0, help='Seconds between status lines')
+    parser.add_argument('--no-strip', action='store_true', help='Keep whitespace in values')
+    parser.add_argument('--backend', type=str, default=None, choices=list(BACKENDS), help='XML parser backend (default: $ISO20022_XML_BACKEND or etree)')
+    parser.add_argument('--dedup', type=str, default=None, help='Duplicate index file (see dedup.py); adds a Duplicate column')
+    parser.add_argument('--once', action='store_true', help='Process new and changed files, then exit')
+    parser.add_argument('--metrics-json', type=str, default=None, help='Append the final run metrics to this JSON log')
+    parser.add_argument('--metrics-prom', type=str, default=None, help='Prometheus text file refreshed with each status line')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.watch_folder):
+        print(f"Watch folder not found: {args.watch_folder}")
+        sys.exit(1)
+    daemon = WatchDaemon(
+        args.watch_folder, args.output_folder, workers=args.workers, poll=args.poll, interval=args.interval,
+        settle=args.settle, manifest_path=args.manifest, strip_space=not args.no_strip,
+        checkpoint_interval=args.checkpoint_interval, status_interval=args.status_interval,
+        dedup_path=args.dedup, backend=args.backend,
+    )
+    signal.signal(signal.SIGINT, daemon.stop)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    print(f"Watching {daemon.watch_folder} -> {args.output_folder} with {daemon.workers} workers")
+    daemon.run(once=args.once, metrics_json=args.metrics_json, metrics_prom=args.metrics_prom)
+
+
+if __name__ == "__main__":
+    main()
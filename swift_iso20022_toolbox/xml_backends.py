@@ -0,0 +1,143 @@
+"""
+ISO20022 XML Parser Backends
+----------------------------
+Pluggable XML parsers for the XPath extractor (`xml_to_xpath`). All backends return the same rows and
+metadata; they differ in throughput and memory, so the fastest one can be chosen per deployment
+(`python -m swift_iso20022_toolbox.benchmark --backends` compares them and checks that their outputs match
+on the generated corpus and `data/sample_xml_edge_cases`).
+
+Backends:
+- etree           stdlib xml.etree.ElementTree (C accelerator); completed messages are detached from the
+                  tree after each read chunk
+- lxml            lxml.etree feed parser with the same tree handling as etree (optional dependency)
+- lxml-iterparse  lxml pull parser with tag-filtered end events: each AppHdr/Document is taken as soon as
+                  its end tag is parsed (optional dependency)
+- expat           pyexpat event parser that produces the rows directly from the parse events; no element
+                  tree is built for the Document (only the small AppHdr tree, for the metadata)
+
+Selection: the `backend` argument of the xml_to_xpath functions, `--backend` on the command line, or the
+ISO20022_XML_BACKEND environment variable; DEFAULT_BACKEND otherwise.
+
+Usage Example:
+    from swift_iso20022_toolbox.xml_to_xpath import parse_messages
+    for results, *metadata in parse_messages('bulk.xml', backend='expat'):
+        ...
+    ISO20022_XML_BACKEND=lxml python xml_to_xpath.py ./messages xpaths.txt
+"""
+import os
+import xml.etree.ElementTree as ET
+from typing import List
+
+BACKEND_ENV = 'ISO20022_XML_BACKEND'
+# etree needs no optional dependency. lxml-iterparse is faster on many small files (benchmark --backends on a
+# generated corpus: 7.5 MB/s against 5.8 for etree, with 15 MB peak growth against 23) and on par on bulk files
+# (4.8 MB/s each); deployments with lxml installed can select it with ISO20022_XML_BACKEND=lxml-iterparse.
+DEFAULT_BACKEND = 'etree'
+
+
+class EtreeBackend:
+    """stdlib ElementTree parsers."""
+
+    name = 'etree'
+    # How iter_messages finds messages: 'tree' (inspect the tree after each chunk), 'events' (on the end
+    # event of each message part) or 'expat' (rows straight from the parse events)
+    mode = 'tree'
+
+    def __init__(self):
+        self.errors = (ET.ParseError,)
+
+    def tree_parser(self):
+        """Feed parser whose close() returns the root element."""
+        return ET.XMLParser()
+
+    def pull_parser(self):
+        """Feed parser reporting element events through read_events()."""
+        return ET.XMLPullParser(events=('start',))
+
+    def fromstring(self, data: bytes):
+        return ET.fromstring(data)
+
+
+class LxmlBackend(EtreeBackend):
+    """lxml.etree parsers; comments and processing instructions are dropped, as ElementTree does."""
+
+    name = 'lxml'
+
+    def __init__(self):
+        try:
+            from lxml import etree
+        except ImportError as e:
+            raise ImportError(f"The {self.name} XML backend requires lxml (pip install lxml): {e}") from e
+        self.etree = etree
+        self.errors = (etree.LxmlError,)
+        # Expand internal entities like expat, but never load external ones
+        self.options = {'remove_comments': True, 'remove_pis': True,
+                        'resolve_entities': 'internal' if etree.LXML_VERSION >= (5,) else False}
+
+    def tree_parser(self):
+        return self.etree.XMLParser(**self.options)
+
+    def pull_parser(self):
+        return self.etree.XMLPullParser(events=('start',), **self.options)
+
+    def fromstring(self, data: bytes):
+        return self.etree.fromstring(data, parser=self.tree_parser())
+
+
+class LxmlIterparseBackend(LxmlBackend):
+    """lxml pull parser reporting only the end of AppHdr and Document elements (filtered in C)."""
+
+    name = 'lxml-iterparse'
+    mode = 'events'
+
+    def pull_parser(self):
+        return self.etree.XMLPullParser(events=('end',), tag=('{*}AppHdr', '{*}Document'), **self.options)
+
+
+class ExpatBackend(EtreeBackend):
+    """
+    Event parsing with pyexpat (see xml_to_xpath.iter_messages). Whole-file parsing
+    (parse_xml_to_xpath_and_value) uses ElementTree, which is built on the same expat parser.
+    """
+
+    name = 'expat'
+    mode = 'expat'
+
+
+BACKENDS = {
+    'etree': EtreeBackend,
+    'lxml': LxmlBackend,
+    'lxml-iterparse': LxmlIterparseBackend,
+    'expat': ExpatBackend,
+}
+_instances = {}
+
+
+def get_backend(name: str = None) -> EtreeBackend:
+    """Return the backend called `name` (default: ISO20022_XML_BACKEND, then DEFAULT_BACKEND)."""
+    if isinstance(name, EtreeBackend):
+        return name
+    name = name or os.environ.get(BACKEND_ENV) or DEFAULT_BACKEND
+    backend = _instances.get(name)
+    if backend is None:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown XML backend: {name} (available: {', '.join(BACKENDS)})")
+        backend = _instances[name] = BACKENDS[name]()
+    return backend
+
+
+def available_backends() -> List[str]:
+    """Names of the backends whose dependencies are installed."""
+    names = []
+    for name in BACKENDS:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def parse_error(error: Exception) -> ET.ParseError:
+    """Return a backend parser error as ET.ParseError, the error type the extractor reports."""
+    return error if isinstance(error, ET.ParseError) else ET.ParseError(str(error))
@@ -1,6 +1,15 @@
 import xml.etree.ElementTree as ET
 import os
 from typing import List, Tuple
+from xml.sax.saxutils import quoteattr
+
+from swift_iso20022_toolbox.external_sort import DEFAULT_MEMORY_MB, DEFAULT_SORT_KEY, ExternalSorter
+from swift_iso20022_toolbox.instrumentation import get_instrumentation
+from swift_iso20022_toolbox.sinks import DEFAULT_FORMATS, open_sinks, parse_formats, parse_partition_keys
+from swift_iso20022_toolbox.selection import DEAD, WIDE_VALUE_SEPARATOR, XPathSelection, get_selection, parse_patterns
+from swift_iso20022_toolbox.xml_backends import get_backend, parse_error
+
+READ_CHUNK_SIZE = 64 * 1024
 
 def strip_namespace(tag: str) -> str:
     """Remove namespace from XML tag."""
@@ -21,9 +30,18 @@ def compute_xpath_strip(xpath: str) -> str:
     else:
         return ''
 
-def get_xpath_and_value(element: ET.Element, path: str = '', strip_space: bool = True) -> List[tuple]:
+def attribute_rows(element: ET.Element, path: str) -> List[tuple]:
+    """(XPath, XPath_strip, value) rows of the attributes of an element at `path`, e.g. `.../InstdAmt/@Ccy`."""
+    rows = []
+    for name, value in element.attrib.items():
+        attribute_path = f"{path}/@{strip_namespace(name)}"
+        rows.append((attribute_path, compute_xpath_strip(attribute_path), value))
+    return rows
+
+def get_xpath_and_value(element: ET.Element, path: str = '', strip_space: bool = True, attributes: bool = False) -> List[tuple]:
     """
     Recursively generate (XPath, XPath_strip, value) tuples for all elements in the XML tree, stripping namespaces for clarity.
+    With `attributes`, each element's row is followed by rows for its attributes (see attribute_rows).
     Returns: List of (xpath, xpath_strip, value) tuples
     """
     tag = strip_namespace(element.tag)
@@ -38,8 +56,34 @@ def get_xpath_and_value(element: ET.Element, path: str = '', strip_space: bool =
         value = value.replace('\n', '')
     xpath_strip = compute_xpath_strip(current_path)
     results = [(current_path, xpath_strip, value)]
+    if attributes and element.attrib:
+        results.extend(attribute_rows(element, current_path))
     for child in element:
-        results.extend(get_xpath_and_value(child, current_path, strip_space=strip_space))
+        results.extend(get_xpath_and_value(child, current_path, strip_space=strip_space, attributes=attributes))
+    return results
+
+def select_xpath_and_value(element: ET.Element, path: str, state: int, selection, strip_space: bool = True,
+                           attributes: bool = False) -> List[tuple]:
+    """
+    Like get_xpath_and_value, for the elements matching `selection` (an XPathSelection) only. `state` is the
+    selection state of the parent element (selection.initial for a message part); subtrees in which
+    nothing can match are skipped. Attribute rows follow the rows of selected elements.
+    """
+    tag = strip_namespace(element.tag)
+    state = selection.step(state, tag)
+    if state == DEAD:
+        return []
+    current_path = f"{path}/{tag}" if path else tag
+    results = []
+    if selection.accepts(state):
+        value = element.text or ''
+        value = value.strip() if strip_space else value.replace('\n', '')
+        results.append((current_path, compute_xpath_strip(current_path), value))
+        if attributes and element.attrib:
+            results.extend(attribute_rows(element, current_path))
+    if selection.descends(state):
+        for child in element:
+            results.extend(select_xpath_and_value(child, current_path, state, selection, strip_space, attributes))
     return results
 
 
@@ -50,14 +94,6 @@ def extract_metadata(tree: ET.ElementTree) -> tuple:
       (xsd, msgid, fr, to, credt, bizmsgidr, bizsvc)
     All are strings, empty if not found.
     """
-    xsd = ''
-    msgid = ''
-    fr = ''
-    to = ''
-    credt = ''
-    bizmsgidr = ''
-    bizsvc = ''
-    msgdefidr = None
     root = tree.getroot()
     AppHdr_elem = None
     document_elem = None
@@ -69,6 +105,22 @@ def extract_metadata(tree: ET.ElementTree) -> tuple:
         if strip_namespace(elem.tag) == 'Document':
             document_elem = elem
             break
+    return extract_message_metadata(AppHdr_elem, document_elem)
+
+
+def extract_message_metadata(AppHdr_elem, document_elem) -> tuple:
+    """
+    Extract (xsd, msgid, fr, to, credt, bizmsgidr, bizsvc) from the AppHdr and Document elements of one
+    message (either may be None).
+    """
+    xsd = ''
+    msgid = ''
+    fr = ''
+    to = ''
+    credt = ''
+    bizmsgidr = ''
+    bizsvc = ''
+    msgdefidr = None
     if document_elem is not None:
         # XSD from xmlns attribute (could be xmlns or xmlns:...)
         for attr in document_elem.attrib:
@@ -84,7 +136,6 @@ def extract_metadata(tree: ET.ElementTree) -> tuple:
         # Helper to extract text from a child tag
         def get_child_text(parent, tag):
             for child in parent:
-                print(child.tag)
                 if strip_namespace(child.tag) == tag:
                     return child
             return None
@@ -138,29 +189,644 @@ def extract_metadata(tree: ET.ElementTree) -> tuple:
             xsd = msgdefidr
     return xsd, msgid, fr, to, credt, bizmsgidr, bizsvc
 
-def parse_xml_to_xpath_and_value(file_path: str, strip_space: bool = True) -> tuple:
+def _feed_parser(parser, f) -> None:
+    inst = get_instrumentation()
+    while True:
+        with inst.stage('read'):
+            chunk = f.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        inst.add('bytes', len(chunk))
+        with inst.stage('parse'):
+            parser.feed(chunk)
+
+def parse_xml_tree(file_path: str, source=None, backend=None) -> ET.ElementTree:
+    """
+    Parse an XML file (or the binary file object `source`) into an ElementTree, feeding the parser
+    in chunks so that the read and parse stages are timed separately when instrumentation is enabled.
+    `backend` selects the parser (see xml_backends); parser errors are raised as ET.ParseError.
+    """
+    backend = get_backend(backend)
+    parser = backend.tree_parser()
+    try:
+        if source is None:
+            with open(file_path, 'rb') as f:
+                _feed_parser(parser, f)
+        else:
+            _feed_parser(parser, source)
+        with get_instrumentation().stage('parse'):
+            root = parser.close()
+    except backend.errors as e:
+        raise parse_error(e)
+    return ET.ElementTree(root)
+
+def parse_xml_to_xpath_and_value(file_path: str, strip_space: bool = True, source=None, backend=None) -> tuple:
     """
     Parse an XML file and return a tuple:
     - list of (XPath, value, file_path, file_name) tuples for all elements
     - xsd (from Document tag)
     - msgid (from MsgId tag)
     - fr, to, credt, bizmsgidr, bizsvc (from AppHdr)
+    If `source` (a binary file object) is given, the XML is read from it and `file_path` is only used as a label.
+    The metadata is that of the first AppHdr/Document of the file; use parse_messages for bulk files.
+    `backend` selects the XML parser (see xml_backends).
     """
+    inst = get_instrumentation()
     try:
-        tree = ET.parse(file_path)
+        tree = parse_xml_tree(file_path, source, backend)
         root = tree.getroot()
-        xpaths_and_values = get_xpath_and_value(root, strip_space=strip_space)
-        file_name = os.path.basename(file_path)
-        results = [(xpath, xpath_strip, value, file_path, file_name) for xpath, xpath_strip, value in xpaths_and_values]
-        xsd, msgid, fr, to, credt, bizmsgidr, bizsvc = extract_metadata(tree)
+        with inst.stage('walk'):
+            xpaths_and_values = get_xpath_and_value(root, strip_space=strip_space)
+            file_name = os.path.basename(file_path)
+            results = [(xpath, xpath_strip, value, file_path, file_name) for xpath, xpath_strip, value in xpaths_and_values]
+        with inst.stage('metadata'):
+            xsd, msgid, fr, to, credt, bizmsgidr, bizsvc = extract_metadata(tree)
+        inst.add('files')
+        inst.add('rows', len(results))
         return results, xsd, msgid, fr, to, credt, bizmsgidr, bizsvc
     except ET.ParseError as e:
+        inst.add('errors')
         print(f"Error parsing XML file: {file_path} -- {e}")
         return [], '', '', '', '', '', '', ''
     except FileNotFoundError:
+        inst.add('errors')
         print(f"File not found: {file_path}")
         return [], '', '', '', '', '', '', ''
 
+MESSAGE_TAGS = ('AppHdr', 'Document')
+EMPTY_METADATA = ('', '', '', '', '', '', '')
+
+def _element_value(element: ET.Element, strip_space: bool) -> str:
+    value = element.text or ''
+    return value.strip() if strip_space else value.replace('\n', '')
+
+class Message:
+    """
+    One AppHdr/Document pair split from an XML file, with the rows of the surrounding elements
+    (envelope, batch headers) that precede it (`leading`) or, for the last message, follow it (`trailing`).
+    The AppHdr is walked from `header_path`, which differs from the Document's `parent_path` when the two
+    are not siblings (e.g. Envelope/Header/AppHdr and Envelope/Body/Document).
+    Messages of the expat backend carry their rows in `part_rows` ((path relative to parent_path, value)
+    lists of the AppHdr and the Document) instead of a walkable Document tree.
+    """
+
+    __slots__ = ('file_path', 'index', 'parent_path', 'header_path', 'header', 'document', 'leading', 'trailing', 'part_rows')
+
+    def __init__(self, file_path: str, index: int, parent_path: str, header, document, leading: list, part_rows: list = None,
+                 header_path: str = None):
+        self.file_path = file_path
+        self.index = index
+        self.parent_path = parent_path
+        self.header_path = parent_path if header_path is None else header_path
+        self.header = header
+        self.document = document
+        self.leading = leading
+        self.trailing = []
+        self.part_rows = part_rows
+
+    def results(self, strip_space: bool = True, selection=None, attributes: bool = False) -> tuple:
+        """
+        Return (rows, xsd, msgid, fr, to, credt, bizmsgidr, bizsvc) like parse_xml_to_xpath_and_value.
+        With a `selection` (XPathSelection), only the matching AppHdr/Document elements are returned
+        (no envelope rows). With `attributes`, AppHdr/Document element rows are followed by attribute rows
+        (expat messages hold them in part_rows when iter_messages was called with attributes).
+        """
+        inst = get_instrumentation()
+        with inst.stage('walk'):
+            xpaths_and_values = list(self.leading) if selection is None else []
+            if self.part_rows is not None:
+                for position, rows in enumerate(self.part_rows):
+                    # The AppHdr rows come first
+                    parent_path = self.header_path if position == 0 and self.header is not None else self.parent_path
+                    prefix = f"{parent_path}/" if parent_path else ''
+                    selected = True
+                    for relative_path, value in rows:
+                        if selection is not None:
+                            # Attribute rows follow their element
+                            if '@' not in relative_path:
+                                selected = bool(selection.match_path(relative_path))
+                            if not selected:
+                                continue
+                        path = prefix + relative_path
+                        xpaths_and_values.append((path, compute_xpath_strip(path), value))
+            else:
+                for element, parent_path in ((self.header, self.header_path), (self.document, self.parent_path)):
+                    if element is None:
+                        continue
+                    if selection is None:
+                        xpaths_and_values.extend(get_xpath_and_value(element, parent_path, strip_space=strip_space, attributes=attributes))
+                    else:
+                        xpaths_and_values.extend(select_xpath_and_value(element, parent_path, selection.initial, selection, strip_space, attributes))
+            if selection is None:
+                xpaths_and_values.extend(self.trailing)
+            file_name = os.path.basename(self.file_path)
+            results = [(xpath, xpath_strip, value, self.file_path, file_name) for xpath, xpath_strip, value in xpaths_and_values]
+        with inst.stage('metadata'):
+            metadata = extract_message_metadata(self.header, self.document) if self.header is not None or self.document is not None else EMPTY_METADATA
+        inst.add('messages')
+        inst.add('rows', len(results))
+        return (results,) + tuple(metadata)
+
+def iter_messages(file_path: str, strip_space: bool = True, source=None, backend=None, attributes: bool = False):
+    """
+    Split an XML file (or the binary file object `source`) into Messages while it is being parsed.
+    An AppHdr is paired with the Document that follows it (usually a sibling; an AppHdr in an envelope
+    header keeps its own path, see Message); a Document without AppHdr
+    (or an AppHdr without Document) is a message of its own. Elements outside messages become leading rows
+    of the next message. After each chunk, completed messages are detached from the tree, so memory stays
+    bounded by the largest message rather than the file. A file without AppHdr/Document yields a single
+    message holding all rows. `backend` selects the XML parser (see xml_backends); `attributes` is needed by
+    the expat backend, which records attribute rows while parsing, to get them from Message.results.
+    Raises ET.ParseError on malformed XML, after yielding the messages completed before the error.
+    """
+    backend = get_backend(backend)
+    if backend.mode == 'expat':
+        yield from _iter_messages_expat(file_path, strip_space, source, attributes)
+        return
+    inst = get_instrumentation()
+    # 'tree' mode: only the root element is taken from the events; the tree itself is inspected after each
+    # chunk. 'events' mode: the tree is inspected at the end event of each AppHdr/Document.
+    parser = backend.pull_parser()
+    by_events = backend.mode == 'events'
+    rows = []  # Rows of the elements outside messages, not yet attached to a message
+    # Open elements outside messages whose row is already in `rows`, by id (the element references keep
+    # lxml proxy objects, and so their ids, alive)
+    emitted = {}
+    completed = []
+    state = {'root': None, 'header': None, 'index': 0}
+
+    def take_part(element, tag: str, parent_path: str):
+        header = state['header']
+        if tag == 'AppHdr':
+            if header is None:
+                state['header'] = (element, parent_path)
+                return
+            # Two headers in a row: the first one is a message without Document
+            completed.append(Message(file_path, state['index'], header[1], header[0], None, list(rows)))
+            state['header'] = (element, parent_path)
+        else:
+            completed.append(Message(file_path, state['index'], parent_path, header[0] if header else None, element, list(rows),
+                                     header_path=header[1] if header else None))
+            state['header'] = None
+        rows.clear()
+        state['index'] += 1
+
+    def visit(element, path: str, complete: bool) -> bool:
+        """Record the row of an element outside messages once its text is final; False if it is not yet."""
+        if id(element) not in emitted:
+            if not complete and not len(element):
+                return False
+            rows.append((path, compute_xpath_strip(path), _element_value(element, strip_space)))
+            emitted[id(element)] = element
+        return True
+
+    def harvest(node, path: str, node_complete: bool, ended=None):
+        """
+        Take the completed messages below `node`. Only the last child of an open element can still be open,
+        unless it is `ended` (an element whose end event was seen).
+        """
+        children = list(node)
+        last = len(children) - 1
+        for position, child in enumerate(children):
+            complete = node_complete or position < last or child is ended
+            tag = strip_namespace(child.tag)
+            if tag in MESSAGE_TAGS:
+                if not complete:
+                    return
+                node.remove(child)
+                take_part(child, tag, path)
+                continue
+            child_path = f"{path}/{tag}"
+            if not visit(child, child_path, complete):
+                return
+            harvest(child, child_path, complete, ended)
+            if complete:
+                emitted.pop(id(child), None)
+                node.remove(child)
+
+    def harvest_root(complete: bool, ended=None):
+        root = state['root']
+        if root is None:
+            return
+        tag = strip_namespace(root.tag)
+        if tag in MESSAGE_TAGS:
+            if complete or root is ended:
+                state['root'] = None
+                take_part(root, tag, '')
+        elif visit(root, tag, complete):
+            harvest(root, tag, complete, ended)
+
+    def take_root():
+        for _, element in parser.read_events():
+            if by_events:
+                if state['root'] is None:
+                    state['root'] = element.getroottree().getroot()
+                harvest_root(False, element)
+            elif state['root'] is None:
+                state['root'] = element
+
+    f = open(file_path, 'rb') if source is None else source
+    previous = None
+    try:
+        while True:
+            with inst.stage('read'):
+                chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            inst.add('bytes', len(chunk))
+            with inst.stage('parse'):
+                parser.feed(chunk)
+                take_root()
+            if not by_events:
+                harvest_root(False)
+            for message in completed:
+                if previous is not None:
+                    yield previous
+                previous = message
+            completed.clear()
+        with inst.stage('parse'):
+            root = parser.close()
+            take_root()
+        if by_events and state['root'] is None and root is not None and not state['index']:
+            # No AppHdr/Document in the file: the rows of the whole tree
+            state['root'] = root
+        harvest_root(True)
+    except backend.errors as e:
+        # Hand out the last completed message before the error propagates
+        if previous is not None:
+            yield previous
+        raise parse_error(e)
+    finally:
+        if source is None:
+            f.close()
+    header = state['header']
+    if header is not None:
+        completed.append(Message(file_path, state['index'], header[1], header[0], None, list(rows)))
+        rows.clear()
+    for message in completed:
+        if previous is not None:
+            yield previous
+        previous = message
+    if previous is None:
+        yield Message(file_path, 0, '', None, None, list(rows))
+        return
+    previous.trailing = list(rows)
+    yield previous
+
+def _iter_messages_expat(file_path: str, strip_space: bool = True, source=None, attributes: bool = False):
+    """
+    iter_messages for the expat backend: rows are built from the parse events (no Document tree); the
+    AppHdr is built as a small ElementTree and the Document as a stub holding its attributes and first
+    MsgId, which is all extract_message_metadata reads.
+    """
+    import xml.parsers.expat
+    inst = get_instrumentation()
+    parser = xml.parsers.expat.ParserCreate(namespace_separator='}')
+    parser.buffer_text = True
+    outer = []  # [path, text parts, text done, row] of the open elements outside messages
+    inner = []  # [relative path, text parts, text done, row] of the open elements of the current message part
+    rows = []  # Rows of the elements outside messages, not yet attached to a message
+    completed = []
+    state = {'part': None, 'parent': '', 'part_rows': None, 'builder': None, 'document': None, 'msgid': None,
+             'header': None, 'index': 0}
+
+    def clark(name: str) -> str:
+        return '{' + name if '}' in name else name
+
+    def finish_text(entry):
+        text = ''.join(entry[1])
+        entry[3][-1] = text.strip() if strip_space else text.replace('\n', '')
+        entry[2] = True
+        if entry is state['msgid']:
+            ET.SubElement(state['document'], 'MsgId').text = text
+
+    def take_part(tag: str, element, part_rows: list, parent_path: str):
+        header = state['header']
+        if tag == 'AppHdr':
+            if header is not None:
+                # Two headers in a row: the first one is a message without Document
+                completed.append(Message(file_path, state['index'], header[2], header[0], None, [tuple(row) for row in rows], [header[1]]))
+                rows.clear()
+                state['index'] += 1
+            state['header'] = (element, part_rows, parent_path)
+            return
+        if header is not None:
+            completed.append(Message(file_path, state['index'], parent_path, header[0], element, [tuple(row) for row in rows],
+                                     [header[1], part_rows], header_path=header[2]))
+        else:
+            completed.append(Message(file_path, state['index'], parent_path, None, element, [tuple(row) for row in rows], [part_rows]))
+        state['header'] = None
+        rows.clear()
+        state['index'] += 1
+
+    def start(name, attrs):
+        tag = name.rsplit('}', 1)[-1]
+        if state['part'] is None:
+            if outer and not outer[-1][2]:
+                finish_text(outer[-1])
+            if tag not in MESSAGE_TAGS:
+                path = f"{outer[-1][0]}/{tag}" if outer else tag
+                row = [path, compute_xpath_strip(path), '']
+                rows.append(row)
+                outer.append([path, [], False, row])
+                return
+            state['part'] = tag
+            state['parent'] = outer[-1][0] if outer else ''
+            state['part_rows'] = []
+            attrib = {clark(key): value for key, value in attrs.items()}
+            if tag == 'AppHdr':
+                state['builder'] = ET.TreeBuilder()
+                state['builder'].start(clark(name), attrib)
+            else:
+                state['document'] = ET.Element(clark(name), attrib)
+                state['msgid'] = None
+            path = tag
+        else:
+            parent = inner[-1]
+            if not parent[2]:
+                finish_text(parent)
+            path = f"{parent[0]}/{tag}"
+            if state['builder'] is not None:
+                state['builder'].start(clark(name), {clark(key): value for key, value in attrs.items()})
+        row = [path, '']
+        state['part_rows'].append(row)
+        if attributes and attrs:
+            state['part_rows'].extend((f"{path}/@{key.rsplit('}', 1)[-1]}", value) for key, value in attrs.items())
+        inner.append([path, [], False, row])
+        if tag == 'MsgId' and state['document'] is not None and state['msgid'] is None:
+            state['msgid'] = inner[-1]
+
+    def end(name):
+        if state['part'] is None:
+            entry = outer.pop()
+            if not entry[2]:
+                finish_text(entry)
+            return
+        entry = inner.pop()
+        if not entry[2]:
+            finish_text(entry)
+        builder = state['builder']
+        if builder is not None:
+            builder.end(clark(name))
+        if inner:
+            return
+        part_rows = [tuple(row) for row in state['part_rows']]
+        if builder is not None:
+            take_part('AppHdr', builder.close(), part_rows, state['parent'])
+        else:
+            take_part('Document', state['document'], part_rows, state['parent'])
+        state['part'] = state['builder'] = state['document'] = state['msgid'] = None
+
+    def character_data(data):
+        entry = inner[-1] if state['part'] is not None else (outer[-1] if outer else None)
+        if entry is not None and not entry[2]:
+            entry[1].append(data)
+            if state['builder'] is not None:
+                state['builder'].data(data)
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = character_data
+
+    f = open(file_path, 'rb') if source is None else source
+    previous = None
+    try:
+        while True:
+            with inst.stage('read'):
+                chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            inst.add('bytes', len(chunk))
+            with inst.stage('parse'):
+                parser.Parse(chunk, False)
+            for message in completed:
+                if previous is not None:
+                    yield previous
+                previous = message
+            completed.clear()
+        with inst.stage('parse'):
+            parser.Parse(b'', True)
+    except xml.parsers.expat.ExpatError as e:
+        # Like the tree backends: messages completed in the failing chunk are not handed out
+        if previous is not None:
+            yield previous
+        raise ET.ParseError(str(e))
+    finally:
+        if source is None:
+            f.close()
+    header = state['header']
+    if header is not None:
+        completed.append(Message(file_path, state['index'], header[2], header[0], None, [tuple(row) for row in rows], [header[1]]))
+        rows.clear()
+    for message in completed:
+        if previous is not None:
+            yield previous
+        previous = message
+    leftover = [tuple(row) for row in rows]
+    if previous is None:
+        yield Message(file_path, 0, '', None, None, leftover)
+        return
+    previous.trailing = leftover
+    yield previous
+
+def parse_messages(file_path: str, strip_space: bool = True, source=None, backend=None, selection=None,
+                   attributes: bool = False):
+    """
+    Yield (rows, xsd, msgid, fr, to, credt, bizmsgidr, bizsvc) for each message of an XML file (see
+    iter_messages), so that bulk files with many AppHdr/Document pairs get per-message metadata.
+    For a file holding a single message, the result equals parse_xml_to_xpath_and_value.
+    `selection` (an XPathSelection or a list of XPath_strip patterns) restricts the rows to the matching
+    elements; the metadata is always complete. `attributes` adds attribute rows (e.g. `.../IntrBkSttlmAmt/@Ccy`)
+    after the rows of their elements.
+    """
+    inst = get_instrumentation()
+    selection = get_selection(selection)
+    yielded = False
+    try:
+        for message in iter_messages(file_path, strip_space=strip_space, source=source, backend=backend, attributes=attributes):
+            yielded = True
+            yield message.results(strip_space, selection, attributes)
+        inst.add('files')
+        return
+    except ET.ParseError as e:
+        inst.add('errors')
+        print(f"Error parsing XML file: {file_path} -- {e}")
+    except FileNotFoundError:
+        inst.add('errors')
+        print(f"File not found: {file_path}")
+    if not yielded:
+        yield ([],) + EMPTY_METADATA
+
+def split_message_bytes(file_path: str, strip_space: bool = True, source=None):
+    """
+    Scan an XML file (or the binary file object `source`) with expat, without building a tree, and yield
+    (index, parent_path, leading, trailing, message_xml, header_path) per message, where `message_xml` is a
+    standalone XML document holding the raw bytes of the message's AppHdr and Document (plus the namespace
+    declarations of their ancestors). Messages, leading and trailing rows follow the same rules as iter_messages; use
+    message_from_bytes to get the Message back. Only the bytes of the current message are buffered.
+    """
+    import xml.parsers.expat
+    inst = get_instrumentation()
+    parser = xml.parsers.expat.ParserCreate()
+    parser.buffer_text = True
+    state = {'encoding': 'UTF-8', 'depth': 0, 'start': None, 'header_end': None, 'header_parent': None,
+             'part_start': None, 'last': 0}
+    stack = []  # [path, xmlns attributes, text parts, has_child, row] of the open elements outside messages
+    rows = []  # Rows of the elements outside messages since the last message (values set once known)
+    # ([(start, end) byte ranges of the AppHdr and Document], parent_path, header_path, namespaces, leading rows)
+    # of completed messages
+    ready = []
+    buffer = bytearray()
+    buffer_start = 0
+
+    def finish_text(entry):
+        text = ''.join(entry[2])
+        entry[4][2] = text.strip() if strip_space else text.replace('\n', '')
+        entry[3] = True
+
+    def xml_decl(version, encoding, standalone):
+        if encoding:
+            state['encoding'] = encoding
+
+    def start(name, attrs):
+        index = parser.CurrentByteIndex
+        state['last'] = index
+        if state['depth']:
+            state['depth'] += 1
+            return
+        tag = name.rsplit(':', 1)[-1]
+        if stack and not stack[-1][3]:
+            finish_text(stack[-1])
+        if tag in MESSAGE_TAGS:
+            state['depth'] = 1
+            state['part_start'] = index
+            if state['start'] is None:
+                state['start'] = index
+            return
+        path = f"{stack[-1][0]}/{tag}" if stack else tag
+        row = [path, compute_xpath_strip(path), '']
+        rows.append(row)
+        namespaces = {key: value for key, value in attrs.items() if key == 'xmlns' or key.startswith('xmlns:')}
+        stack.append([path, namespaces, [], False, row])
+
+    def end(name):
+        index = parser.CurrentByteIndex
+        state['last'] = index
+        if not state['depth']:
+            entry = stack.pop()
+            if not entry[3]:
+                finish_text(entry)
+            return
+        state['depth'] -= 1
+        if state['depth']:
+            return
+        end_index = buffer.index(b'>', index - buffer_start) + 1 + buffer_start
+        parent_path = stack[-1][0] if stack else ''
+        namespaces = {}
+        for entry in stack:
+            namespaces.update(entry[1])
+        if name.rsplit(':', 1)[-1] == 'AppHdr':
+            if state['header_end'] is None:
+                state['header_end'] = end_index
+                state['header_parent'] = (parent_path, namespaces)
+                return
+            # Two headers in a row: the first one is a message without Document
+            header_path, header_namespaces = state['header_parent']
+            ready.append(([(state['start'], state['header_end'])], header_path, header_path, header_namespaces, list(rows)))
+            state['start'], state['header_end'] = state['part_start'], end_index
+            state['header_parent'] = (parent_path, namespaces)
+        elif state['header_end'] is None:
+            ready.append(([(state['start'], end_index)], parent_path, parent_path, namespaces, list(rows)))
+            state['start'] = None
+        else:
+            # The AppHdr and the Document are copied separately: they need not be siblings
+            header_path, header_namespaces = state['header_parent']
+            ready.append(([(state['start'], state['header_end']), (state['part_start'], end_index)], parent_path,
+                          header_path, dict(header_namespaces, **namespaces), list(rows)))
+            state['start'], state['header_end'] = None, None
+        rows.clear()
+
+    def character_data(data):
+        if not state['depth'] and stack and not stack[-1][3]:
+            stack[-1][2].append(data)
+
+    parser.XmlDeclHandler = xml_decl
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = character_data
+
+    def build(index, item):
+        ranges, parent_path, header_path, namespaces, leading = item
+        encoding = state['encoding']
+        declarations = ''.join(f" {key}={quoteattr(value)}" for key, value in namespaces.items())
+        message_xml = (f'<?xml version="1.0" encoding="{encoding}"?><MessageSplit{declarations}>'.encode(encoding)
+                       + b''.join(bytes(buffer[start - buffer_start:end - buffer_start]) for start, end in ranges)
+                       + b'</MessageSplit>')
+        return [index, parent_path, leading, [], message_xml, header_path]
+
+    f = open(file_path, 'rb') if source is None else source
+    previous = None
+    count = 0
+    try:
+        while True:
+            with inst.stage('read'):
+                chunk = f.read(READ_CHUNK_SIZE)
+            inst.add('bytes', len(chunk))
+            buffer.extend(chunk)
+            with inst.stage('parse'):
+                parser.Parse(chunk, not chunk)
+            for item in ready:
+                if previous is not None:
+                    yield tuple(previous)
+                previous = build(count, item)
+                count += 1
+            ready.clear()
+            # Keep only the bytes the next message can start from
+            keep_from = state['start'] if state['start'] is not None else state['last']
+            del buffer[:keep_from - buffer_start]
+            buffer_start = keep_from
+            if not chunk:
+                break
+    except xml.parsers.expat.ExpatError as e:
+        if previous is not None:
+            yield tuple(previous)
+        raise ET.ParseError(str(e))
+    finally:
+        if source is None:
+            f.close()
+    if state['start'] is not None:
+        # A header without Document at the end of the file
+        if previous is not None:
+            yield tuple(previous)
+        parent_path, namespaces = state['header_parent']
+        previous = build(count, ([(state['start'], state['header_end'])], parent_path, parent_path, namespaces, list(rows)))
+        rows.clear()
+    if previous is None:
+        yield 0, '', list(rows), [], b'', ''
+        return
+    previous[3] = list(rows)
+    yield tuple(previous)
+
+def message_from_bytes(file_path: str, index: int, parent_path: str, leading: list, trailing: list, message_xml: bytes,
+                       header_path: str = None, backend=None) -> Message:
+    """Rebuild a Message from an item of split_message_bytes, parsing the message with `backend`."""
+    header = document = None
+    if message_xml:
+        backend = get_backend(backend)
+        try:
+            elements = backend.fromstring(message_xml)
+        except backend.errors as e:
+            raise parse_error(e)
+        for element in elements:
+            tag = strip_namespace(element.tag)
+            if tag == 'AppHdr' and header is None:
+                header = element
+            elif tag == 'Document':
+                document = element
+    message = Message(file_path, index, parent_path, header, document, leading, header_path=header_path)
+    message.trailing = trailing
+    return message
+
 def find_xml_files(path: str) -> List[str]:
     """Return a list of XML file paths from a directory or a single file."""
     if os.path.isfile(path) and path.lower().endswith('.xml'):
@@ -172,8 +838,79 @@ def find_xml_files(path: str) -> List[str]:
                 xml_files.append(os.path.abspath(os.path.join(root, file)))
     return xml_files
 
+OUTPUT_HEADER = "XPath | XPath_strip | Value | File | Name"
+OUTPUT_FILE_HEADER = OUTPUT_HEADER + " | isEmptyValue | XSD | MsgId | Fr | To | CreDt | BizMsgIdr | BizSvc"
+# Output file header with duplicate tagging (see dedup.py): the identifier kinds already seen, e.g. "BizMsgIdr,UETR"
+OUTPUT_FILE_HEADER_DEDUP = OUTPUT_FILE_HEADER + " | Duplicate"
+
+def format_output_line(row: tuple, metadata: tuple, with_labels: bool = False) -> str:
+    """
+    Format one result row and its file metadata as a line of the XPath output file (without newline).
+    An eighth metadata item, if present, is the Duplicate tag (see OUTPUT_FILE_HEADER_DEDUP).
+    """
+    xpath, xpath_strip, value, file_path, file_name = row
+    xsd, msgid, fr, to, credt, bizmsgidr, bizsvc = metadata[:7]
+    is_empty = str(value == '' or value is None)
+    if with_labels:
+        line = f"{xpath} | XPath_strip: {xpath_strip} | Value: {value} | File: {file_path} | Name: {file_name} | isEmptyValue: {is_empty} | XSD: {xsd} | MsgId: {msgid} | Fr: {fr} | To: {to} | CreDt: {credt} | BizMsgIdr: {bizmsgidr} | BizSvc: {bizsvc}"
+        return line + f" | Duplicate: {metadata[7]}" if len(metadata) > 7 else line
+    line = f"{xpath} | {xpath_strip} | {value} | {file_path} | {file_name} | {is_empty} | {xsd} | {msgid} | {fr} | {to} | {credt} | {bizmsgidr} | {bizsvc}"
+    return line + f" | {metadata[7]}" if len(metadata) > 7 else line
+
+def output_record(row: tuple, metadata: tuple, typed: tuple = ()) -> tuple:
+    """
+    Return the output file record (OUTPUT_FILE_HEADER columns, [Duplicate], [typed value columns]) of a result
+    row, its metadata and its typed values (see typed_values).
+    """
+    value = row[2]
+    return (*row, value == '' or value is None, *metadata, *typed)
+
+# Wide output (--select ... --wide): one line per message, then one column per selection pattern
+WIDE_FILE_HEADER = "File | Name | XSD | MsgId | Fr | To | CreDt | BizMsgIdr | BizSvc"
+
+def wide_values(results: list, selection, count: int = None) -> list:
+    """
+    Return the values of one message's selected rows, one item per pattern of `selection` (several
+    values of a pattern joined with WIDE_VALUE_SEPARATOR), or None if no pattern matched.
+    Only the first `count` patterns are returned if given.
+    """
+    count = len(selection.patterns) if count is None else count
+    columns = [[] for _ in range(count)]
+    found = False
+    for xpath, _, value, _, _ in results:
+        for index in selection.match_path(compute_xpath_strip('/' + xpath)):
+            if index < count:
+                columns[index].append(value)
+                found = True
+    return [WIDE_VALUE_SEPARATOR.join(values) for values in columns] if found else None
+
+def _drop_unselected(results: list, selection, count: int) -> list:
+    """Rows matching one of the first `count` patterns of `selection`, with the attribute rows of those elements."""
+    kept = []
+    selected = False
+    for row in results:
+        if '/@' not in row[0]:
+            selected = any(index < count for index in selection.match_path(compute_xpath_strip('/' + row[0])))
+        if selected:
+            kept.append(row)
+    return kept
+
+def _pop_option(args: List[str], flag: str):
+    """Remove `flag <value>` from args and return the value (None if absent)."""
+    if flag not in args:
+        return None
+    idx = args.index(flag)
+    if idx + 1 >= len(args):
+        print(f"Missing value for {flag}")
+        raise SystemExit(1)
+    value = args[idx + 1]
+    del args[idx:idx + 2]
+    return value
+
 def main():
     import sys
+    from swift_iso20022_toolbox import instrumentation
+    from swift_iso20022_toolbox.sources import parse_sources
     
     # Parse command-line arguments
     args = sys.argv[1:]
@@ -181,89 +918,163 @@ def main():
     output_file = "xpaths.txt"
     with_labels = False
     strip_space = True
+    metrics_json = _pop_option(args, '--metrics-json')
+    metrics_prom = _pop_option(args, '--metrics-prom')
+    workers = int(_pop_option(args, '--workers') or 1)
+    store_path = _pop_option(args, '--store')
+    dedup_path = _pop_option(args, '--dedup')
+    backend = _pop_option(args, '--backend')
+    select = _pop_option(args, '--select')
+    sort_key = _pop_option(args, '--sort-key')
+    sort_memory = _pop_option(args, '--sort-memory')
+    format_option = _pop_option(args, '--format')
+    partition_option = _pop_option(args, '--partition-by')
+    xsd_folder = _pop_option(args, '--xsd-folder')
+    inst = instrumentation.enable('xml_to_xpath') if metrics_json or metrics_prom else instrumentation.get_instrumentation()
 
     # Check for flags
-    if '--sort' in args:
+    if '--sort' in args or sort_key or sort_memory:
         sort_results = True
-        args.remove('--sort')
+        if '--sort' in args:
+            args.remove('--sort')
     if '--with-labels' in args:
         with_labels = True
         args.remove('--with-labels')
     if '--no-strip' in args:
         strip_space = False
         args.remove('--no-strip')
+    wide = '--wide' in args
+    if wide:
+        args.remove('--wide')
+    text_only = '--text-only' in args
+    if text_only:
+        args.remove('--text-only')
+    quiet = '--quiet' in args
+    if quiet:
+        args.remove('--quiet')
+    typed = '--typed' in args
+    if typed:
+        args.remove('--typed')
+    attributes = typed or '--attributes' in args
+    if '--attributes' in args:
+        args.remove('--attributes')
     
-    if len(args) < 1 or len(args) > 2:
-        print("Usage: python xml_to_xpath.py <xml_file_or_directory> [output_file] [--sort] [--with-labels] [--no-strip]")
-        sys.exit(1)
+    help_requested = '-h' in args or '--help' in args
+    if help_requested or len(args) < 1 or len(args) > 2:
+        print("Usage: python xml_to_xpath.py <xml_file_directory_or_archive> [output_file] [--sort] [--sort-key <xpath|xpath_strip|file|msgid>] [--sort-memory <MB>] [--with-labels] [--no-strip] [--text-only] [--format <txt,csv,jsonl,xlsx,parquet>] [--partition-by <xsd,msg_type,credt,fr,to,bizsvc>] [--quiet] [--select <xpaths|@file> [--wide]] [--attributes] [--typed [--xsd-folder <dir>]] [--workers <n>] [--backend <etree|lxml|lxml-iterparse|expat>] [--store <db>] [--dedup <index>] [--metrics-json <file>] [--metrics-prom <file>]")
+        sys.exit(0 if help_requested else 1)
     
     input_path = args[0]
     if len(args) == 2:
         output_file = args[1]
+    try:
+        get_backend(backend)
+        formats = parse_formats(format_option) if format_option else None
+        partition_by = parse_partition_keys(partition_option) if partition_option else None
+        patterns = parse_patterns(select) if select is not None else None
+        selection = XPathSelection(patterns) if patterns is not None else None
+        # Rows are sorted within a memory budget, spilling sorted runs to disk (see external_sort.py)
+        sorter = ExternalSorter(sort_key or DEFAULT_SORT_KEY, float(sort_memory or DEFAULT_MEMORY_MB)) if sort_results and not wide else None
+    except (ValueError, ImportError, OSError) as e:
+        print(e)
+        sys.exit(1)
+    if wide and selection is None:
+        print("--wide requires --select")
+        sys.exit(1)
+    extraction = selection
+    if selection is not None and store_path:
+        # The store keeps whole messages: extract every row, and drop the unselected ones after storing below
+        extraction = None
+    elif selection is not None and dedup_path:
+        # Duplicate UETRs are found in the rows: extract them too, and drop them from the output below
+        extraction = XPathSelection(patterns + ['/Document/**/UETR'])
     
-    xml_files = find_xml_files(input_path)
-    if not xml_files:
+    typed_values = None
+    column_types = None
+    if wide:
+        columns = WIDE_FILE_HEADER.split(' | ') + (['Duplicate'] if dedup_path else []) + selection.patterns
+        console_title, console_columns = "Selected values, one line per message (namespaces stripped):", None
+    else:
+        columns = (OUTPUT_FILE_HEADER_DEDUP if dedup_path else OUTPUT_FILE_HEADER).split(' | ')
+        console_title, console_columns = "Generated XPaths, XPath_strip, Values, and File Info (namespaces stripped):", 5
+        if typed:
+            # Typed value columns from the XSD simple types (see typed_values.py)
+            from swift_iso20022_toolbox.typed_values import DEFAULT_XSD_FOLDER, TYPED_COLUMN_TYPES, TYPED_COLUMNS, TypedValues
+            typed_values = TypedValues(xsd_folder or DEFAULT_XSD_FOLDER)
+            columns += TYPED_COLUMNS
+            column_types = TYPED_COLUMN_TYPES
+    try:
+        # One pass over the rows writes the console echo and every output format (see sinks.py)
+        sink = open_sinks(output_file, formats or (['txt'] if text_only else DEFAULT_FORMATS), columns, with_labels,
+                          None if quiet else console_title, console_columns, skip_unavailable=formats is None,
+                          partition_by=partition_by, column_types=column_types)
+    except (ImportError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+
+    # Messages, not files: a bulk file yields one result per message, a malformed file at least one
+    messages_found = 0
+    store = None
+    if store_path:
+        from swift_iso20022_toolbox.store import ExtractStore
+        store = ExtractStore(store_path)
+    dedup = None
+    if dedup_path:
+        from swift_iso20022_toolbox.dedup import DuplicateIndex
+        dedup = DuplicateIndex(dedup_path)
+    # Folders, plain files and zip/tar/gzip archives (members are streamed, not extracted)
+    for results, xsd, msgid, fr, to, credt, bizmsgidr, bizsvc in parse_sources(input_path, strip_space=strip_space, workers=workers,
+                                                                                backend=backend, selection=extraction, attributes=attributes):
+        messages_found += 1
+        metadata = (xsd, msgid, fr, to, credt, bizmsgidr, bizsvc)
+        if dedup is not None:
+            metadata += (','.join(dedup.check_message(results, metadata)),)
+        if store is not None:
+            store.add(results, metadata[:7])
+        if extraction is not selection:
+            results = _drop_unselected(results, selection, len(patterns))
+        if wide:
+            values = wide_values(results, selection)
+            if values is not None:
+                with inst.stage('write'):
+                    sink.write((results[0][3], results[0][4], *metadata, *values))
+            continue
+        if typed_values is not None:
+            with inst.stage('typed'):
+                typed_rows = typed_values.convert(results, xsd)
+            items = [(row, metadata, typed_row) for row, typed_row in zip(results, typed_rows)]
+        else:
+            items = [(row, metadata) for row in results]
+        if sorter is not None:
+            sorter.extend(items)
+        else:
+            with inst.stage('write'):
+                sink.write_many(output_record(*item) for item in items)
+    if store is not None:
+        store.close()
+        print(f"Extracts appended to store: {store_path}")
+    if dedup is not None:
+        dedup.close()
+    if not messages_found:
         print(f"No XML files found in {input_path}")
         sys.exit(1)
-    all_results = []
-    file_metadata = []  # List of (xsd, msgid, fr, to, credt, bizmsgidr, bizsvc) for each file, repeated for each row
-    for xml_file in xml_files:
-        results, xsd, msgid, fr, to, credt, bizmsgidr, bizsvc = parse_xml_to_xpath_and_value(xml_file, strip_space=strip_space)
-        all_results.extend(results)
-        file_metadata.extend([(xsd, msgid, fr, to, credt, bizmsgidr, bizsvc)] * len(results))
-    if sort_results:
-        all_results, file_metadata = zip(*sorted(zip(all_results, file_metadata), key=lambda x: x[0][0])) if all_results else ([],[])
-    if all_results:
-        print("\nGenerated XPaths, XPath_strip, Values, and File Info (namespaces stripped):")
-        header = "XPath | XPath_strip | Value | File | Name"
-        print(header)
-        for xpath, xpath_strip, value, file_path, file_name in all_results:
-            if with_labels:
-                print(f"{xpath} | XPath_strip: {xpath_strip} | Value: {value} | File: {file_path} | Name: {file_name}")
-            else:
-                print(f"{xpath} | {xpath_strip} | {value} | {file_path} | {file_name}")
-        # Add isEmptyValue, XSD, MsgId, AppHdr fields to output file only
-        file_header = header + " | isEmptyValue | XSD | MsgId | Fr | To | CreDt | BizMsgIdr | BizSvc"
-        try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(file_header + '\n')
-                for (xpath, xpath_strip, value, file_path, file_name), (xsd, msgid, fr, to, credt, bizmsgidr, bizsvc) in zip(all_results, file_metadata):
-                    is_empty = str(value == '' or value is None)
-                    if with_labels:
-                        f.write(f"{xpath} | XPath_strip: {xpath_strip} | Value: {value} | File: {file_path} | Name: {file_name} | isEmptyValue: {is_empty} | XSD: {xsd} | MsgId: {msgid} | Fr: {fr} | To: {to} | CreDt: {credt} | BizMsgIdr: {bizmsgidr} | BizSvc: {bizsvc}\n")
-                    else:
-                        f.write(f"{xpath} | {xpath_strip} | {value} | {file_path} | {file_name} | {is_empty} | {xsd} | {msgid} | {fr} | {to} | {credt} | {bizmsgidr} | {bizsvc}\n")
-            print(f"\nXPaths, values, and file info have been written to: {output_file}")
-        except Exception as e:
-            print(f"Error writing to file {output_file}: {e}")
-        # DataFrame export
+    if sorter is not None:
+        with inst.stage('sort'):
+            rows = iter(sorter)
+        with inst.stage('write'):
+            sink.write_many(output_record(*item) for item in rows)
+        sorter.close()
+    with inst.stage('write'):
         try:
-            import pandas as pd
-            df = pd.DataFrame([
-                {
-                    "XPath": xpath,
-                    "XPath_strip": xpath_strip,
-                    "Value": value,
-                    "File": file_path,
-                    "Name": file_name,
-                    "isEmptyValue": value == '' or value is None,
-                    "XSD": xsd,
-                    "MsgId": msgid,
-                    "Fr": fr,
-                    "To": to,
-                    "CreDt": credt,
-                    "BizMsgIdr": bizmsgidr,
-                    "BizSvc": bizsvc
-                }
-                for (xpath, xpath_strip, value, file_path, file_name), (xsd, msgid, fr, to, credt, bizmsgidr, bizsvc) in zip(all_results, file_metadata)
-            ])
-            df.to_csv(output_file.replace('.txt', '.csv'), index=False)
-            df.to_excel(output_file.replace('.txt', '.xlsx'), index=False)
-            print(f"\nDataFrame exported to: {output_file.replace('.txt', '.csv')} and .xlsx")
-        except Exception as e:
-            print(f"Error exporting DataFrame: {e}")
+            sink.close()
+        except OSError as e:
+            print(f"Error writing output: {e}")
+    if sink.count:
+        written = ', '.join(sink.files())
+        print(f"\n{'Selected values' if wide else 'XPaths, values, and file info'} have been written to: {written}")
     else:
-        print("No XPaths found or error parsing XML.")
+        print("No selected XPaths found." if wide else "No XPaths found or error parsing XML.")
+    instrumentation.export(inst, json_log=metrics_json, prometheus=metrics_prom)
 
 if __name__ == "__main__":
     main()
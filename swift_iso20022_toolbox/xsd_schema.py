@@ -0,0 +1,267 @@
+"""
+ISO20022 XSD Schema Compiler
+----------------------------
+Compiles an ISO 20022 (CBPR+ usage guideline) XSD file into a tree of element nodes and a flat
+element-path index keyed the same way as the XPath_strip column of the XPath extractor
+(e.g. `/Document/FIToFICstmrCdtTrf/GrpHdr/MsgId`).
+
+Features:
+- Resolves named complexType/simpleType references, sequences, choices and simpleContent extensions.
+- Keeps cardinalities (minOccurs/maxOccurs), choice membership, attributes and simple type facets
+  (base type, enumerations, pattern, min/max length, fraction/total digits).
+- Compiled schemas are cached per file path and modification time (`load_schema`).
+
+Usage Example:
+    from swift_iso20022_toolbox.xsd_schema import load_schema
+    schema = load_schema('data/sample_xsd_plain_baseline/<file>.xsd')
+    node = schema.index['/Document/FIToFICstmrCdtTrf/GrpHdr/MsgId']
+"""
+import copy
+import os
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+
+XS = '{http://www.w3.org/2001/XMLSchema}'
+XSD_NAMESPACE_PREFIX = 'urn:iso:std:iso:20022:tech:xsd:'
+UNBOUNDED = None
+
+
+class SimpleType:
+    """Facets of an XSD simple type, flattened down to its xs: built-in base."""
+
+    __slots__ = ('name', 'base', 'enumerations', 'pattern', 'min_length', 'max_length',
+                 'fraction_digits', 'total_digits', 'min_inclusive')
+
+    def __init__(self, name: str, base: str = 'xs:string'):
+        self.name = name
+        self.base = base
+        self.enumerations = []
+        self.pattern = None
+        self.min_length = None
+        self.max_length = None
+        self.fraction_digits = None
+        self.total_digits = None
+        self.min_inclusive = None
+
+    def as_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class SchemaNode:
+    """One element declaration, resolved at its position in the message tree."""
+
+    __slots__ = ('name', 'path', 'type_name', 'min_occurs', 'max_occurs', 'choice',
+                 'simple_type', 'attributes', 'children')
+
+    def __init__(self, name: str, path: str, type_name: str, min_occurs: int = 1, max_occurs: Optional[int] = 1,
+                 choice: bool = False):
+        self.name = name
+        self.path = path
+        self.type_name = type_name
+        self.min_occurs = min_occurs
+        self.max_occurs = max_occurs
+        self.choice = choice
+        self.simple_type = None
+        self.attributes = []  # List of (name, SimpleType, required)
+        self.children = []
+
+    @property
+    def is_leaf(self) -> bool:
+        return not self.children
+
+    @property
+    def is_repeatable(self) -> bool:
+        return self.max_occurs is UNBOUNDED or self.max_occurs > 1
+
+    def cardinality(self) -> str:
+        """Return the cardinality in MyStandards notation, e.g. `[0..1]` or `[1..*]`."""
+        upper = '*' if self.max_occurs is UNBOUNDED else str(self.max_occurs)
+        return f"[{self.min_occurs}..{upper}]"
+
+
+class CompiledSchema:
+    """A compiled XSD: root element tree plus an index of element paths."""
+
+    def __init__(self, file_path: str, target_namespace: str, root: SchemaNode):
+        self.file_path = file_path
+        self.file_name = os.path.basename(file_path)
+        self.target_namespace = target_namespace
+        self.root = root
+        self.index = {}  # type: Dict[str, SchemaNode]
+        for node in self.iter_nodes():
+            self.index.setdefault(node.path, node)
+
+    @property
+    def base_message(self) -> str:
+        """Message definition identifier taken from the namespace, e.g. `pacs.008.001.08`."""
+        if self.target_namespace.startswith(XSD_NAMESPACE_PREFIX):
+            return self.target_namespace[len(XSD_NAMESPACE_PREFIX):]
+        return self.target_namespace
+
+    def iter_nodes(self):
+        """Yield all nodes depth-first, in document order."""
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def paths(self) -> List[str]:
+        return list(self.index)
+
+
+def _parse_occurs(value: Optional[str]) -> Optional[int]:
+    if value is None:
+        return 1
+    if value == 'unbounded':
+        return UNBOUNDED
+    return int(value)
+
+
+def _compile_simple_type(name: str, simple_types: dict, cache: dict) -> SimpleType:
+    """Resolve a named simple type (or xs: built-in) into its facets."""
+    if name in cache:
+        return cache[name]
+    if name.startswith('xs:') or name not in simple_types:
+        result = SimpleType(name, name if name.startswith('xs:') else 'xs:string')
+        cache[name] = result
+        return result
+    result = SimpleType(name)
+    cache[name] = result
+    restriction = simple_types[name].find(XS + 'restriction')
+    if restriction is None:
+        return result
+    base = restriction.get('base', 'xs:string')
+    if base.startswith('xs:'):
+        result.base = base
+    else:
+        parent = _compile_simple_type(base, simple_types, cache)
+        for slot in SimpleType.__slots__[1:]:
+            setattr(result, slot, getattr(parent, slot))
+        result.enumerations = list(parent.enumerations)
+    for facet in restriction:
+        tag = facet.tag[len(XS):] if facet.tag.startswith(XS) else facet.tag
+        value = facet.get('value')
+        if tag == 'enumeration':
+            result.enumerations.append(value)
+        elif tag == 'pattern':
+            result.pattern = value
+        elif tag == 'minLength':
+            result.min_length = int(value)
+        elif tag == 'maxLength':
+            result.max_length = int(value)
+        elif tag == 'length':
+            result.min_length = result.max_length = int(value)
+        elif tag == 'fractionDigits':
+            result.fraction_digits = int(value)
+        elif tag == 'totalDigits':
+            result.total_digits = int(value)
+        elif tag == 'minInclusive':
+            result.min_inclusive = value
+    return result
+
+
+def compile_xsd(file_path: str, max_depth: int = 40) -> CompiledSchema:
+    """
+    Compile an XSD file into a CompiledSchema rooted at its top-level element (usually `Document`).
+    Recursive type references are cut at the point where a type re-enters itself.
+    """
+    schema_root = ET.parse(file_path).getroot()
+    target_namespace = schema_root.get('targetNamespace', '')
+    complex_types = {el.get('name'): el for el in schema_root.findall(XS + 'complexType')}
+    simple_types = {el.get('name'): el for el in schema_root.findall(XS + 'simpleType')}
+    simple_cache = {}
+
+    def expand(node: SchemaNode, type_name: str, active: tuple):
+        if type_name not in complex_types:
+            node.simple_type = _compile_simple_type(type_name, simple_types, simple_cache)
+            return
+        if type_name in active or len(active) >= max_depth:
+            return
+        active = active + (type_name,)
+        for content in complex_types[type_name]:
+            tag = content.tag[len(XS):]
+            if tag in ('sequence', 'choice'):
+                for decl in content.iter(XS + 'element'):
+                    child_name = decl.get('name')
+                    child = SchemaNode(
+                        child_name,
+                        f"{node.path}/{child_name}",
+                        decl.get('type', 'xs:string'),
+                        min_occurs=_parse_occurs(decl.get('minOccurs')),
+                        max_occurs=_parse_occurs(decl.get('maxOccurs')),
+                        choice=(tag == 'choice'),
+                    )
+                    expand(child, child.type_name, active)
+                    node.children.append(child)
+            elif tag == 'simpleContent':
+                extension = content.find(XS + 'extension')
+                if extension is None:
+                    continue
+                node.simple_type = _compile_simple_type(extension.get('base', 'xs:string'), simple_types, simple_cache)
+                for attribute in extension.findall(XS + 'attribute'):
+                    node.attributes.append((
+                        attribute.get('name'),
+                        _compile_simple_type(attribute.get('type', 'xs:string'), simple_types, simple_cache),
+                        attribute.get('use') == 'required',
+                    ))
+
+    top = schema_root.find(XS + 'element')
+    if top is None:
+        raise ValueError(f"No top-level element declared in {file_path}")
+    root = SchemaNode(top.get('name'), '/' + top.get('name'), top.get('type', 'xs:string'))
+    expand(root, root.type_name, ())
+    return CompiledSchema(file_path, target_namespace, root)
+
+
+_SCHEMA_CACHE = {}
+
+
+def load_schema(file_path: str) -> CompiledSchema:
+    """Return the compiled schema for `file_path`, recompiling only when the file changed."""
+    file_path = os.path.abspath(file_path)
+    mtime = os.path.getmtime(file_path)
+    cached = _SCHEMA_CACHE.get(file_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    schema = compile_xsd(file_path)
+    _SCHEMA_CACHE[file_path] = (mtime, schema)
+    return schema
+
+
+def find_xsd_files(folder: str) -> List[str]:
+    """Return the sorted list of .xsd files in a folder."""
+    return sorted(
+        os.path.join(folder, fname) for fname in os.listdir(folder) if fname.lower().endswith('.xsd')
+    )
+
+
+def load_schema_folder(folder: str) -> List[CompiledSchema]:
+    """Compile every XSD in a folder (cached)."""
+    return [load_schema(path) for path in find_xsd_files(folder)]
+
+
+def merge_schemas(schemas: List[CompiledSchema]) -> CompiledSchema:
+    """
+    Return a schema whose index holds the element paths of all `schemas` (usage guideline variants of one
+    base message); a path in several variants keeps the node of the first. Root and file are the first
+    schema's. The compiled schemas themselves (shared through the load_schema cache) are not changed.
+    """
+    merged = copy.copy(schemas[0])
+    merged.index = dict(schemas[0].index)
+    for schema in schemas[1:]:
+        for path, node in schema.index.items():
+            merged.index.setdefault(path, node)
+    return merged
+
+
+def schemas_by_message(folder: str) -> Dict[str, CompiledSchema]:
+    """
+    Map each message definition identifier (e.g. `pacs.008.001.08`) to its compiled schema.
+    When several usage guidelines share a base message (e.g. the pacs.009 ADV, COV and core variants), their
+    indexes are merged (merge_schemas), so a path of any variant resolves.
+    """
+    variants = {}
+    for schema in load_schema_folder(folder):
+        variants.setdefault(schema.base_message, []).append(schema)
+    return {message: schemas[0] if len(schemas) == 1 else merge_schemas(schemas) for message, schemas in variants.items()}
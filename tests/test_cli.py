@@ -0,0 +1,74 @@
+"""Command line (swift_iso20022_toolbox/cli.py): subcommand dispatch and lazy imports of the heavy dependencies."""
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from swift_iso20022_toolbox import cli
+from swift_iso20022_toolbox.generate_messages import generate_corpus
+
+HEAVY_MODULES = ('pandas', 'streamlit', 'openpyxl')
+
+# Runs `iso20022 --help` and `iso20022 <command> --help` in one fresh interpreter and reports, per
+# command, its exit code and the heavy modules loaded so far
+HELP_SCRIPT = """
+import json, sys
+from swift_iso20022_toolbox import cli
+report = {}
+for command in [None] + [name for name in cli.COMMANDS if name != 'ui']:
+    try:
+        cli.main(['--help'] if command is None else [command, '--help'])
+        code = 0
+    except SystemExit as e:
+        code = e.code or 0
+    report[command or ''] = [code, sorted(m for m in %r if m in sys.modules)]
+print(json.dumps(report))
+""" % (HEAVY_MODULES,)
+
+
+def test_usage_lists_every_command(capsys):
+    cli.main([])
+    out = capsys.readouterr().out
+    assert out.startswith('Usage: iso20022 <command>')
+    assert all(f"  {name:<10} {help_text}" in out for name, (_, help_text) in cli.COMMANDS.items())
+    cli.main(['--version'])
+    assert capsys.readouterr().out == f"iso20022 {cli.VERSION}\n"
+
+
+def test_unknown_command(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(['extract'])
+    assert exit_info.value.code == 2
+    assert capsys.readouterr().out.startswith('Unknown command: extract')
+
+
+def test_command_modules_exist():
+    for name, (module, _) in cli.COMMANDS.items():
+        assert module is None or importlib.util.find_spec(module) is not None, name
+
+
+def test_dispatches_to_the_tool(tmp_path, monkeypatch):
+    files = generate_corpus(str(tmp_path / 'messages'), ['pacs.008'], messages=2)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['iso20022'])
+    cli.main(['xpath', str(tmp_path / 'messages'), 'out.txt', '--text-only', '--quiet'])
+    # The tool parses sys.argv itself, with the subcommand as program name
+    assert sys.argv == ['iso20022 xpath', str(tmp_path / 'messages'), 'out.txt', '--text-only', '--quiet']
+    assert set(os.listdir(tmp_path)) == {'messages', 'out.txt'}
+    with open(tmp_path / 'out.txt', encoding='utf-8') as f:
+        file_names = {line.split(' | ')[4] for line in f.read().splitlines()[1:]}
+    assert file_names == {os.path.basename(path) for path in files}
+
+
+def test_help_does_not_import_heavy_dependencies():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    completed = subprocess.run([sys.executable, '-c', HELP_SCRIPT], cwd=root, env=env, capture_output=True,
+                               text=True, timeout=300)
+    assert completed.returncode == 0, completed.stderr
+    report = json.loads(completed.stdout.splitlines()[-1])
+    assert set(report) == {''} | set(cli.COMMANDS) - {'ui'}
+    assert {command: result for command, result in report.items() if result != [0, []]} == {}
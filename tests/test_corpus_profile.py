@@ -0,0 +1,85 @@
+"""Corpus profile (swift_iso20022_toolbox/corpus_profile.py): fill rates, lengths and distinct-value sketches."""
+import pytest
+
+from swift_iso20022_toolbox.corpus_profile import REPORT_COLUMNS, SPARSE_LIMIT, CorpusProfile, DistinctSketch, profile_sources
+
+MESSAGE = """<?xml version="1.0" encoding="UTF-8"?>
+<Envelope>
+<AppHdr xmlns="urn:iso:std:iso:20022:tech:xsd:head.001.001.02"><MsgDefIdr>pacs.008.001.08</MsgDefIdr></AppHdr>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pacs.008.001.08"><FIToFICstmrCdtTrf>
+<GrpHdr><MsgId>{msgid}</MsgId></GrpHdr>
+<CdtTrfTxInf>{remittance}</CdtTrfTxInf>
+</FIToFICstmrCdtTrf></Document>
+</Envelope>
+"""
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    (tmp_path / 'a.xml').write_text(MESSAGE.format(msgid='M1', remittance='<RmtInf><Ustrd>INVOICE 42</Ustrd></RmtInf>'))
+    (tmp_path / 'b.xml').write_text(MESSAGE.format(msgid='MSG-0002', remittance=''))
+    return str(tmp_path)
+
+
+def _rows(profile: CorpusProfile) -> dict:
+    return {row[1]: dict(zip(REPORT_COLUMNS, row)) for row in profile.rows()}
+
+
+def test_fill_rate_and_lengths(corpus):
+    profile = profile_sources(corpus)
+    assert profile.messages == {'pacs.008': 2}
+    rows = _rows(profile)
+    ustrd = rows['/Document/FIToFICstmrCdtTrf/CdtTrfTxInf/RmtInf/Ustrd']
+    assert (ustrd['Messages'], ustrd['FillRate'], ustrd['MinLength'], ustrd['MaxLength']) == (1, 0.5, 10, 10)
+    msgid = rows['/Document/FIToFICstmrCdtTrf/GrpHdr/MsgId']
+    assert (msgid['FillRate'], msgid['MinLength'], msgid['MaxLength'], msgid['AvgLength']) == (1.0, 2, 8, 5.0)
+    assert (msgid['Len2-3'], msgid['Len8-15'], msgid['DistinctValues'], msgid['DistinctExact']) == (1, 1, 2, True)
+
+
+def test_selection_keeps_messages_without_selected_rows(corpus):
+    profile = profile_sources(corpus, selection=['/Document/FIToFICstmrCdtTrf/CdtTrfTxInf/RmtInf/Ustrd'])
+    assert profile.messages == {'pacs.008': 2}
+    assert _rows(profile)['/Document/FIToFICstmrCdtTrf/CdtTrfTxInf/RmtInf/Ustrd']['FillRate'] == 0.5
+
+
+def test_unparsable_file_is_not_counted(corpus, tmp_path):
+    (tmp_path / 'broken.xml').write_text('<Document><Unclosed>')
+    assert profile_sources(corpus).messages == {'pacs.008': 2}
+
+
+def test_merged_half_profiles_equal_one_pass(corpus, tmp_path):
+    whole = profile_sources(corpus)
+    merged = profile_sources(str(tmp_path / 'a.xml')).merge(profile_sources(str(tmp_path / 'b.xml')))
+    assert merged.rows() == whole.rows()
+
+
+def test_save_and_load_round_trip(corpus, tmp_path):
+    profile = profile_sources(corpus)
+    path = str(tmp_path / 'profile.json')
+    profile.save(path)
+    assert CorpusProfile.load(path).rows() == profile.rows()
+
+
+def test_sketch_is_exact_below_the_sparse_limit_and_close_above():
+    small = DistinctSketch()
+    for i in range(SPARSE_LIMIT):
+        small.add(f"value-{i % 100}")
+    assert small.exact and small.estimate() == 100
+    large = DistinctSketch()
+    for i in range(20000):
+        large.add(f"value-{i}")
+    assert not large.exact
+    assert abs(large.estimate() - 20000) / 20000 < 0.05
+
+
+def test_sketch_merge_and_serialization_match_a_single_sketch():
+    single, left, right = DistinctSketch(), DistinctSketch(), DistinctSketch()
+    for i in range(5000):
+        single.add(str(i))
+        (left if i % 2 else right).add(str(i))
+    # Overlapping values are counted once
+    for i in range(1000):
+        right.add(str(i))
+    left.merge(right)
+    assert left.estimate() == single.estimate()
+    assert DistinctSketch.from_dict(left.to_dict()).estimate() == single.estimate()
@@ -0,0 +1,99 @@
+"""Duplicate index (swift_iso20022_toolbox/dedup.py): identifier scopes, persistence, table growth and the Bloom filter."""
+import os
+
+import pytest
+
+from swift_iso20022_toolbox import dedup
+from swift_iso20022_toolbox.dedup import DuplicateIndex, _digest, message_identifiers
+from swift_iso20022_toolbox.generate_messages import generate_corpus
+from swift_iso20022_toolbox.xml_to_xpath import parse_messages
+
+UETR = '/Document/FIToFICstmrCdtTrf/CdtTrfTxInf/PmtId/UETR'
+
+
+def _identifiers(count: int, start: int = 0) -> list:
+    return [('MsgId', f"BANKBEBB|pacs.008|MSG{i:08d}") for i in range(start, start + count)]
+
+
+def test_identifier_scopes():
+    msgid = '/Document/FIToFICstmrCdtTrf/GrpHdr/MsgId'
+    results = [(UETR, UETR, 'u-1', 'a.xml', 'a.xml'), (UETR, UETR, 'u-1', 'a.xml', 'a.xml'),
+               (msgid, msgid, 'M1', 'a.xml', 'a.xml')]
+    metadata = ('pacs.008.001.08', 'M1', 'BANKBEBB', 'BANKDEFF', '2025-06-10T09:00:00', 'B1', 'swift.cbprplus.02')
+    assert message_identifiers(results, metadata) == [
+        ('BizMsgIdr', 'BANKBEBB|B1'), ('MsgId', 'BANKBEBB|pacs.008|M1'), ('UETR', 'pacs.008|u-1')]
+    # The notification of the same payment carries its UETR under another message type
+    notification = ('camt.054.001.08',) + metadata[1:]
+    assert message_identifiers(results, notification)[2] == ('UETR', 'camt.054|u-1')
+
+
+def test_resent_messages_are_flagged(tmp_path):
+    path, = generate_corpus(str(tmp_path / 'messages'), ['pacs.008'], messages=3, per_file=3)
+    index = DuplicateIndex(str(tmp_path / 'dedup.idx'))
+    assert [index.check_message(results, tuple(metadata)) for results, *metadata in parse_messages(path)] == [[]] * 3
+    for results, *metadata in parse_messages(path):
+        assert index.check_message(results, tuple(metadata)) == ['BizMsgIdr', 'MsgId', 'UETR']
+    index.close()
+
+
+def test_no_record_only_checks(tmp_path):
+    index = DuplicateIndex(str(tmp_path / 'dedup.idx'))
+    assert index.check_identifiers(_identifiers(2), record=False) == []
+    assert len(index) == 0 and not index.contains(*_identifiers(1)[0])
+    index.close()
+
+
+def test_persists_across_reopen(tmp_path):
+    path = str(tmp_path / 'dedup.idx')
+    index = DuplicateIndex(path)
+    for kind, value in _identifiers(100):
+        assert not index.seen(kind, value)
+    index.close()
+    index = DuplicateIndex(path)
+    assert len(index) == 100
+    assert all(index.contains(kind, value) for kind, value in _identifiers(100))
+    assert not any(index.contains(kind, value) for kind, value in _identifiers(100, start=100))
+    index.close()
+
+
+def test_table_grows_past_its_load_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(dedup, 'FLUSH_SIZE', 256)
+    path = str(tmp_path / 'dedup.idx')
+    index = DuplicateIndex(path, capacity=100)
+    slots = index.table.slots
+    identifiers = _identifiers(5000)
+    for kind, value in identifiers:
+        index.seen(kind, value)
+    index.flush()
+    assert index.table.slots >= 8 * slots and len(index) == 5000
+    assert len(index) <= dedup.MAX_LOAD * index.table.slots
+    assert os.path.getsize(path) == dedup.HEADER_SIZE + index.table.slots * dedup.SLOT_SIZE
+    assert os.path.getsize(path + '.bloom') == index.table.slots * dedup.BLOOM_BITS_PER_SLOT // 8
+    index.close()
+    index = DuplicateIndex(path, capacity=100)
+    assert all(index.contains(kind, value) for kind, value in identifiers)
+    assert not any(index.contains(kind, value) for kind, value in _identifiers(1000, start=5000))
+    index.close()
+
+
+@pytest.mark.parametrize('first_bloom', [True, False])
+def test_bloom_filter_has_no_false_negatives(tmp_path, monkeypatch, first_bloom):
+    monkeypatch.setattr(dedup, 'FLUSH_SIZE', 500)
+    path = str(tmp_path / 'dedup.idx')
+    identifiers = _identifiers(3000)
+    index = DuplicateIndex(path, capacity=100, bloom=first_bloom)
+    index.check_identifiers(identifiers)
+    index.close()
+    # A run without the Bloom filter leaves none that is stale; the reopened index builds it from the table
+    assert os.path.exists(path + '.bloom') == first_bloom
+    index = DuplicateIndex(path, capacity=100)
+    assert all(index.bloom.might_contain(_digest(kind, value)) for kind, value in identifiers)
+    assert index.check_identifiers(identifiers[::7]) == ['MsgId']
+    index.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.idx'
+    path.write_bytes(b'not an index' * 10)
+    with pytest.raises(ValueError, match='Not a duplicate index file'):
+        DuplicateIndex(str(path))
@@ -0,0 +1,57 @@
+"""External merge sort (swift_iso20022_toolbox/external_sort.py): same order as sorted() across spilled runs."""
+import os
+import random
+
+import pytest
+
+from swift_iso20022_toolbox import external_sort
+from swift_iso20022_toolbox.external_sort import ITEM_OVERHEAD, SORT_KEYS, ExternalSorter
+
+
+def _items(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        # Few distinct keys, so that stability is checked on many equal keys
+        xpath = f"Document/Elem{rng.randrange(20)}"
+        file_path = f"/in/file{rng.randrange(10)}.xml"
+        row = (xpath, '/' + xpath, str(i), file_path, os.path.basename(file_path))
+        metadata = ('pacs.008.001.08', f"MSG{rng.randrange(15)}" if rng.random() > 0.1 else '', 'FR', 'TO', '', '', '')
+        items.append((row, metadata))
+    return items
+
+
+@pytest.mark.parametrize('key', list(SORT_KEYS))
+def test_in_memory_sort_matches_sorted(key):
+    items = _items(500)
+    with ExternalSorter(key) as sorter:
+        sorter.extend(items)
+        assert list(sorter) == sorted(items, key=SORT_KEYS[key])
+        assert sorter._runs == []
+
+
+@pytest.mark.parametrize('key', list(SORT_KEYS))
+def test_spilled_runs_merge_like_sorted(key, tmp_path, monkeypatch):
+    # Small chunks and fan-in: runs span several chunks and are pre-merged before the final merge
+    monkeypatch.setattr(external_sort, 'CHUNK_SIZE', 7)
+    monkeypatch.setattr(external_sort, 'MAX_MERGE_FAN_IN', 3)
+    items = _items(2000, seed=1)
+    # About 50 items per run
+    sorter = ExternalSorter(key, memory_mb=50 * (ITEM_OVERHEAD + 60) / (1024 * 1024), tmp_dir=str(tmp_path))
+    sorter.extend(items)
+    assert len(sorter._runs) > external_sort.MAX_MERGE_FAN_IN
+    expected = sorted(items, key=SORT_KEYS[key])
+    assert list(sorter) == expected
+    assert len(sorter._runs) <= external_sort.MAX_MERGE_FAN_IN
+    # The sorted items can be read again, and more items can be added after reading
+    assert list(sorter) == expected
+    extra = _items(100, seed=2)
+    sorter.extend(extra)
+    assert list(sorter) == sorted(items + extra, key=SORT_KEYS[key]) and len(sorter) == 2100
+    sorter.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_unknown_key_is_rejected():
+    with pytest.raises(ValueError):
+        ExternalSorter('value')
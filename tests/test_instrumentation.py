@@ -0,0 +1,119 @@
+"""Instrumentation (swift_iso20022_toolbox/instrumentation.py): stage timings, counters, gauges and exports."""
+import json
+import os
+import sys
+
+import pytest
+
+from swift_iso20022_toolbox import instrumentation, xml_to_xpath
+from swift_iso20022_toolbox.generate_messages import generate_corpus
+from swift_iso20022_toolbox.instrumentation import Instrumentation, format_prometheus, get_instrumentation
+
+
+class _Clock:
+    """perf_counter replacement advanced by hand."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(instrumentation.time, 'perf_counter', clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def disabled():
+    yield
+    instrumentation.disable()
+
+
+def test_stage_timings_and_calls(clock):
+    inst = Instrumentation('test')
+    for seconds in (0.5, 1.5):
+        with inst.stage('parse'):
+            clock.now += seconds
+    with pytest.raises(RuntimeError):
+        with inst.stage('write'):
+            clock.now += 0.25
+            raise RuntimeError('failed write')
+    inst.add_time('request:xpath', 2.0)
+    clock.now += 1.0
+    snapshot = inst.snapshot()
+    assert snapshot['stages'] == {'parse': {'seconds': 2.0, 'calls': 2}, 'write': {'seconds': 0.25, 'calls': 1},
+                                  'request:xpath': {'seconds': 2.0, 'calls': 1}}
+    assert snapshot['total_seconds'] == 3.25 and snapshot['tool'] == 'test'
+
+
+def test_counters_and_gauges():
+    inst = Instrumentation('test')
+    inst.add('files')
+    inst.add('files')
+    inst.add('rows', 120)
+    inst.add('bytes', 2048)
+    inst.set_gauge('queue_depth', 5)
+    inst.set_gauge('queue_depth', 2)
+    snapshot = inst.snapshot()
+    assert snapshot['counters'] == {'files': 2, 'rows': 120, 'bytes': 2048}
+    assert snapshot['gauges'] == {'queue_depth': 2}
+    assert snapshot['peak_memory_bytes'] > 0
+
+
+def test_disabled_recorder_records_nothing():
+    inst = get_instrumentation()
+    assert not inst.enabled
+    with inst.stage('parse'):
+        inst.add('rows', 3)
+        inst.add_time('parse', 1.0)
+        inst.set_gauge('queue_depth', 1)
+    assert inst.snapshot() == {}
+    instrumentation.export(inst, json_log='unused.jsonl')
+
+
+def test_instrumented_restores_the_previous_recorder():
+    outer = instrumentation.enable('outer')
+    with instrumentation.instrumented('inner') as inner:
+        assert get_instrumentation() is inner
+        inner.add('rows')
+    assert get_instrumentation() is outer and 'rows' not in outer.counters
+
+
+def test_exports(tmp_path, clock):
+    inst = Instrumentation('xml_to_xpath')
+    with inst.stage('parse'):
+        clock.now += 0.125
+    inst.add('rows', 7)
+    inst.set_gauge('workers', 2)
+    json_log, prometheus = tmp_path / 'metrics.jsonl', tmp_path / 'metrics.prom'
+    instrumentation.export(inst, json_log=str(json_log), prometheus=str(prometheus))
+    instrumentation.export(inst, json_log=str(json_log))
+    runs = [json.loads(line) for line in json_log.read_text(encoding='utf-8').splitlines()]
+    assert len(runs) == 2 and runs[0]['counters'] == {'rows': 7}
+    text = prometheus.read_text(encoding='utf-8')
+    assert text == format_prometheus(runs[0])
+    assert 'iso20022_stage_seconds_total{tool="xml_to_xpath",stage="parse"} 0.125000' in text
+    assert 'iso20022_stage_calls_total{tool="xml_to_xpath",stage="parse"} 1' in text
+    assert 'iso20022_rows_total{tool="xml_to_xpath"} 7' in text
+    assert '# TYPE iso20022_workers gauge\niso20022_workers{tool="xml_to_xpath"} 2' in text
+
+
+def test_extractor_metrics(tmp_path, monkeypatch):
+    files = generate_corpus(str(tmp_path / 'messages'), ['pacs.008', 'camt.053'], messages=2, entries=2)
+    metrics = tmp_path / 'metrics.jsonl'
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['xml_to_xpath', str(tmp_path / 'messages'), 'out.txt', '--text-only',
+                                      '--quiet', '--metrics-json', str(metrics)])
+    xml_to_xpath.main()
+    run, = [json.loads(line) for line in metrics.read_text(encoding='utf-8').splitlines()]
+    with open(tmp_path / 'out.txt', encoding='utf-8') as f:
+        rows = sum(1 for _ in f) - 1
+    assert run['tool'] == 'xml_to_xpath'
+    assert run['counters']['files'] == len(files) and run['counters']['rows'] == rows
+    assert run['counters']['bytes'] == sum(os.path.getsize(path) for path in files)
+    assert {'parse', 'write'} <= set(run['stages'])
+    assert all(stage['calls'] >= 1 and stage['seconds'] >= 0 for stage in run['stages'].values())
@@ -0,0 +1,28 @@
+"""Regression cases (swift_iso20022_toolbox/regression.py): golden outputs and absolute time/memory budgets."""
+import pytest
+
+from swift_iso20022_toolbox import regression
+
+
+@pytest.fixture(scope='module')
+def inputs(tmp_path_factory):
+    work_dir = str(tmp_path_factory.mktemp('regression').resolve())
+    return regression.generate_inputs(work_dir), work_dir
+
+
+@pytest.mark.parametrize('case', [
+    pytest.param(case, id=case['name'], marks=[pytest.mark.slow] if case.get('slow') else [])
+    for case in regression.CASES
+])
+def test_case_matches_golden_and_budget(case, inputs):
+    folders, work_dir = inputs
+    record = regression.run_case(case, folders, work_dir)
+    if record['status'] == 'skipped':
+        pytest.skip(record['reason'])
+    assert record['status'] == 'ok', record.get('reasons')
+    golden = regression.read_golden(case['golden'])
+    assert golden is not None, f"missing golden file {case['golden']}"
+    output = record.pop('output')
+    assert output == golden, regression._first_difference(golden, output)
+    # Without history, only the absolute budgets apply
+    assert regression.check_budgets(record, regression.load_budgets(), [], '') == []
@@ -0,0 +1,126 @@
+"""Schema release diff (swift_iso20022_toolbox/schema_diff.py): guideline matching, element changes and the digest skip."""
+import os
+import shutil
+
+import pytest
+
+from swift_iso20022_toolbox.schema_diff import (
+    GuidelineIndex,
+    diff_guidelines,
+    diff_releases,
+    guideline_key,
+    summary_rows,
+)
+
+XSD_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'data', 'sample_xsd_plain_baseline')
+PACS_009 = 'CBPRPlus_SR2025_(Combined)_CBPRPlus-pacs_009_001_08_FinancialInstitutionCreditTransfer_20250601_2205_iso15.xsd'
+PACS_004 = 'CBPRPlus_SR2025_(Combined)_CBPRPlus-pacs_004_001_09_PaymentReturn_20250601_2205_iso15.xsd'
+CAMT_057 = 'CBPRPlus_SR2025_(Combined)_CBPRPlus-camt_057_001_06_NotificationToReceive_20250601_2205_iso15.xsd'
+GROUP_HEADER = '/Document/FICdtTrf/GrpHdr'
+
+
+class _CountingDict(dict):
+    """Element table that counts field lookups."""
+
+    lookups = 0
+
+    def __getitem__(self, key):
+        self.lookups += 1
+        return super().__getitem__(key)
+
+
+def _guideline(key: str, elements: dict, version: str = 'pacs.008.001.08') -> GuidelineIndex:
+    guideline = GuidelineIndex(key, version, f"{key}.xsd")
+    for path, fields in elements.items():
+        guideline.add(path, dict(fields))
+    guideline.elements = _CountingDict(guideline.elements)
+    return guideline
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('CBPRPlus_SR2025_(Combined)_CBPRPlus-pacs_008_001_08_STP_FIToFICustomerCreditTransfer_20250601_2205_iso15.xsd',
+     ('pacs.008_STP_FIToFICustomerCreditTransfer', 'pacs.008.001.08')),
+    ('CBPRPlus-pacs.008.001.09_STP_FIToFICustomerCreditTransfer',
+     ('pacs.008_STP_FIToFICustomerCreditTransfer', 'pacs.008.001.09')),
+    ('head.001.001.02.xsd', ('head.001', 'head.001.001.02')),
+    ('Other_Guideline.xlsx', ('Other_Guideline', '')),
+])
+def test_guideline_key(name, expected):
+    assert guideline_key(name) == expected
+
+
+def test_added_removed_and_changed_elements():
+    old = _guideline('pacs.008', {'/Document/A': {'cardinality': '[1..1]', 'type': 'Max35Text'},
+                                  '/Document/B': {'cardinality': '[0..1]'},
+                                  '/Document/C': {'cardinality': '[0..1]'}})
+    new = _guideline('pacs.008', {'/Document/A': {'cardinality': '[0..1]', 'type': 'Max35Text', 'pattern': '[A-Z]+'},
+                                  '/Document/C': {'cardinality': '[0..1]'},
+                                  '/Document/D': {'cardinality': '[1..1]'}}, version='pacs.008.001.09')
+    versions = ['xsd', 'pacs.008', 'pacs.008.001.08', 'pacs.008.001.09']
+    assert list(diff_guidelines({'pacs.008': old}, {'pacs.008': new}, 'xsd')) == [
+        versions + ['/Document/A', 'changed', 'cardinality', '[1..1]', '[0..1]'],
+        versions + ['/Document/A', 'changed', 'pattern', '', '[A-Z]+'],
+        versions + ['/Document/B', 'removed', '', '', ''],
+        versions + ['/Document/D', 'added', '', '', ''],
+    ]
+    # Unchanged elements are settled by their digests
+    assert old.elements.lookups == new.elements.lookups == 1
+
+
+def test_unchanged_guidelines_are_skipped_by_digest():
+    elements = {f'/Document/E{i}': {'cardinality': '[0..1]', 'type': 'Max35Text'} for i in range(100)}
+    old, new = _guideline('pacs.008', elements), _guideline('pacs.008', elements)
+    assert old.digest == new.digest
+    assert list(diff_guidelines({'pacs.008': old}, {'pacs.008': new}, 'xsd')) == []
+    assert old.elements.lookups == new.elements.lookups == 0
+    # The same value under another field is a change
+    moved = _guideline('pacs.008', {'/Document/E0': {'type': '[0..1]', 'cardinality': 'Max35Text'}})
+    assert moved.digest != _guideline('pacs.008', {'/Document/E0': elements['/Document/E0']}).digest
+
+
+def test_guidelines_of_one_release_only():
+    old = {'camt.057': _guideline('camt.057', {'/Document/A': {}}, version='camt.057.001.06')}
+    new = {'pacs.009': _guideline('pacs.009', {'/Document/A': {}}, version='pacs.009.001.08')}
+    assert list(diff_guidelines(old, new, 'xsd')) == [
+        ['xsd', 'camt.057', 'camt.057.001.06', '', '', 'removed', '', 'camt.057.xsd', ''],
+        ['xsd', 'pacs.009', '', 'pacs.009.001.08', '', 'added', '', '', 'pacs.009.xsd'],
+    ]
+
+
+def _copy(name: str, folder, rename: str = None, edits=()) -> None:
+    with open(os.path.join(XSD_FOLDER, name), encoding='utf-8') as f:
+        text = f.read()
+    for old, new in edits:
+        assert old in text
+        text = text.replace(old, new)
+    with open(os.path.join(folder, rename or name), 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def test_xsd_releases(tmp_path):
+    old_release, new_release = tmp_path / 'SR2025', tmp_path / 'SR2026'
+    old_release.mkdir()
+    new_release.mkdir()
+    for name in (PACS_009, PACS_004, CAMT_057):
+        shutil.copy(os.path.join(XSD_FOLDER, name), old_release)
+    shutil.copy(os.path.join(XSD_FOLDER, PACS_004), new_release)
+    # pacs.009 upgraded to version 09: NbOfTxs removed, CreDtTm optional and a new element after it
+    _copy(PACS_009, new_release, rename=PACS_009.replace('pacs_009_001_08', 'pacs_009_001_09'), edits=[
+        ('<xs:element name="NbOfTxs" type="Max15NumericText_fixed"/>', ''),
+        ('<xs:element name="CreDtTm" type="CBPR_DateTime"/>',
+         '<xs:element maxOccurs="1" minOccurs="0" name="CreDtTm" type="CBPR_DateTime"/>'
+         '<xs:element name="BtchBookgDtTm" type="CBPR_DateTime"/>'),
+    ])
+    rows = diff_releases(str(old_release), str(new_release))
+    versions = ['xsd', 'pacs.009_FinancialInstitutionCreditTransfer', 'pacs.009.001.08', 'pacs.009.001.09']
+    assert rows == [
+        ['xsd', 'camt.057_NotificationToReceive', 'camt.057.001.06', '', '', 'removed', '', CAMT_057, ''],
+        versions + [GROUP_HEADER + '/CreDtTm', 'changed', 'cardinality', '[1..1]', '[0..1]'],
+        versions + [GROUP_HEADER + '/NbOfTxs', 'removed', '', '', ''],
+        versions + [GROUP_HEADER + '/BtchBookgDtTm', 'added', '', '', ''],
+    ]
+    summary = {entry['Guideline']: entry for entry in summary_rows(rows)}
+    assert summary['camt.057_NotificationToReceive']['Guideline change'] == 'removed'
+    pacs_009 = summary['pacs.009_FinancialInstitutionCreditTransfer']
+    assert (pacs_009['Added'], pacs_009['Removed'], pacs_009['Changed']) == (1, 1, 1)
+    assert 'pacs.004_PaymentReturn' not in summary
@@ -0,0 +1,86 @@
+"""XPath selection (swift_iso20022_toolbox/selection.py): pattern syntax, subtree pruning and selected extraction."""
+import pytest
+
+from swift_iso20022_toolbox.generate_messages import generate_corpus
+from swift_iso20022_toolbox.selection import DEAD, XPathSelection, get_selection, parse_patterns
+from swift_iso20022_toolbox.xml_to_xpath import compute_xpath_strip, parse_messages, wide_values
+
+MSGID = '/Document/FIToFICstmrCdtTrf/GrpHdr/MsgId'
+UETR = '/Document/FIToFICstmrCdtTrf/CdtTrfTxInf/PmtId/UETR'
+
+
+@pytest.mark.parametrize('pattern, path, matches', [
+    (MSGID, MSGID, True),
+    (MSGID, MSGID + '/Extra', False),
+    ('/AppHdr/Fr/*/*/BICFI', '/AppHdr/Fr/FIId/FinInstnId/BICFI', True),
+    ('/AppHdr/Fr/*/*/BICFI', '/AppHdr/Fr/FIId/BICFI', False),
+    ('/AppHdr/Fr/*/*/BICFI', '/AppHdr/Fr/FIId/FinInstnId/Othr/BICFI', False),
+    ('/Document/**/UETR', UETR, True),
+    ('/Document//UETR', UETR, True),
+    ('/Document//UETR', '/Document/UETR', True),  # `**` also matches no element
+    ('/Document//UETR', '/AppHdr/UETR', False),
+    ('/Document//UETR', UETR + '/Sub', False),
+    ('UETR', UETR, True),
+    ('UETR', '/AppHdr/UETR', True),
+    ('Ntry/Amt', '/Document/BkToCstmrStmt/Stmt/Ntry/Amt', True),
+    ('Ntry/Amt', '/Document/BkToCstmrStmt/Stmt/Ntry/Dtls/Amt', False),
+    ('/Document/BkToCstmrStmt/Stmt/Bal/**', '/Document/BkToCstmrStmt/Stmt/Bal/Amt', True),
+    ('/Document/BkToCstmrStmt/Stmt/Bal/**', '/Document/BkToCstmrStmt/Stmt/Bal', True),
+    ('/Document/BkToCstmrStmt/Stmt/Bal/**', '/Document/BkToCstmrStmt/Stmt/Ntry/Amt', False),
+    ('/Document/**/**//Amt', '/Document/A/B/Amt', True),
+])
+def test_patterns(pattern, path, matches):
+    assert XPathSelection([pattern]).match_path(path) == ((0,) if matches else ())
+
+
+def test_several_patterns_match_one_path():
+    selection = XPathSelection(['/Document//UETR', 'MsgId', 'UETR', '/AppHdr/**'])
+    assert selection.match_path(UETR) == (0, 2)
+    assert selection.match_path(MSGID) == (1,)
+    assert selection.match_path('/AppHdr/BizMsgIdr') == (3,)
+
+
+def test_dead_subtrees_are_pruned():
+    selection = XPathSelection(['/Document/FIToFICstmrCdtTrf/GrpHdr/MsgId'])
+    document = selection.step(selection.initial, 'Document')
+    assert document != DEAD and selection.descends(document) and not selection.accepts(document)
+    assert selection.step(selection.initial, 'AppHdr') == DEAD
+    group_header = selection.step(selection.step(document, 'FIToFICstmrCdtTrf'), 'GrpHdr')
+    assert selection.step(group_header, 'CreDtTm') == DEAD
+    msgid = selection.step(group_header, 'MsgId')
+    assert selection.accepts(msgid) == (0,) and not selection.descends(msgid)
+    # Transitions are computed once
+    assert selection.step(group_header, 'MsgId') == msgid
+    # A globstar keeps every element below it alive
+    anywhere = XPathSelection(['UETR'])
+    state = anywhere.initial
+    for tag in ['Document', 'FIToFICstmrCdtTrf', 'CdtTrfTxInf']:
+        state = anywhere.step(state, tag)
+        assert state != DEAD and anywhere.descends(state)
+
+
+def test_parse_patterns(tmp_path):
+    assert parse_patterns(' /AppHdr/BizMsgIdr, UETR ,,') == ['/AppHdr/BizMsgIdr', 'UETR']
+    path = tmp_path / 'fields.txt'
+    path.write_text('# Identifiers\n/AppHdr/BizMsgIdr\n\n  UETR  \n', encoding='utf-8')
+    assert parse_patterns(f'@{path}') == ['/AppHdr/BizMsgIdr', 'UETR']
+    with pytest.raises(ValueError, match='No XPath patterns'):
+        XPathSelection(['', ''])
+    assert get_selection(['UETR']) is get_selection(('UETR',))
+    assert get_selection(None) is None
+
+
+def test_selected_extraction_matches_filtered_rows(tmp_path):
+    path, = generate_corpus(str(tmp_path), ['pacs.008'], messages=2, per_file=2)
+    patterns = ['/AppHdr/BizMsgIdr', '/Document//UETR', 'IntrBkSttlmAmt', MSGID]
+    selection = XPathSelection(patterns)
+    full = list(parse_messages(path))
+    selected = list(parse_messages(path, selection=patterns))
+    assert len(selected) == len(full) == 2
+    for (all_rows, *metadata), (rows, *selected_metadata) in zip(full, selected):
+        assert selected_metadata == metadata
+        expected = [row for row in all_rows if selection.match_path(compute_xpath_strip('/' + row[0]))]
+        assert rows == expected
+        assert {row[1].rsplit('/', 1)[-1] for row in rows} == {'BizMsgIdr', 'UETR', 'IntrBkSttlmAmt', 'MsgId'}
+        values = wide_values(rows, selection)
+        assert len(values) == 4 and all(values) and values[3] == metadata[1]
@@ -0,0 +1,175 @@
+"""Extraction service (swift_iso20022_toolbox/service.py): HTTP requests and responses, batching and metrics."""
+import asyncio
+import io
+import json
+import zipfile
+from concurrent.futures import Future
+
+import pytest
+
+from swift_iso20022_toolbox.generate_messages import generate_corpus
+from swift_iso20022_toolbox.service import Batcher, ExtractionService, run_batch
+
+
+@pytest.fixture(scope='module')
+def service():
+    service = ExtractionService(workers=1)
+    # As in main(): workers forked later would inherit the sockets of the connections open at that time
+    service.warm_up()
+    yield service
+    service.close()
+
+
+def _exchange(service, *requests: bytes) -> list:
+    """Send raw requests over one connection; return (status, headers, body) per response read."""
+    async def exchange():
+        handlers = []
+
+        async def handle(reader, writer):
+            handlers.append(asyncio.current_task())
+            await service.handle(reader, writer)
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        responses = []
+        try:
+            for request in requests:
+                writer.write(request)
+                await writer.drain()
+                status_line = await reader.readline()
+                if not status_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers['content-length']))
+                responses.append((int(status_line.split()[1]), headers, body))
+        finally:
+            writer.close()
+            # The handler ends on the closed connection
+            await asyncio.gather(*handlers)
+            server.close()
+            await server.wait_closed()
+        return responses
+    return asyncio.run(exchange())
+
+
+def _post(target: str, body: bytes) -> bytes:
+    return f"POST {target} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+
+
+def _get(target: str) -> bytes:
+    return f"GET {target} HTTP/1.1\r\nHost: test\r\n\r\n".encode('latin-1')
+
+
+def _read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_xpath_returns_rows_and_metadata(service, tmp_path):
+    path, = generate_corpus(str(tmp_path), ['pacs.008'], messages=1, entries=2)
+    (status, headers, body), = _exchange(service, _post('/xpath?name=m.xml&annotate=1', _read(path)))
+    assert status == 200 and headers['content-type'] == 'application/json'
+    response = json.loads(body)
+    assert response['file_name'] == 'm.xml'
+    assert response['metadata']['XSD'] == 'pacs.008.001.08'
+    assert response['columns'] == ['XPath', 'XPath_strip', 'Value', 'Type', 'Cardinality']
+    assert response['messages'] == [{'metadata': response['metadata'], 'first_row': 0, 'row_count': len(response['rows'])}]
+    msgid = next(row for row in response['rows'] if row[1] == '/Document/FIToFICstmrCdtTrf/GrpHdr/MsgId')
+    assert msgid[2] == response['metadata']['MsgId'] and msgid[3] and msgid[4] == '[1..1]'
+
+
+def test_xpath_bulk_payload_has_metadata_per_message(service, tmp_path):
+    path, = generate_corpus(str(tmp_path), ['pacs.008'], messages=3, per_file=3)
+    (status, _, body), = _exchange(service, _post('/xpath?name=bulk.xml', _read(path)))
+    assert status == 200
+    response = json.loads(body)
+    messages = response['messages']
+    assert len(messages) == 3 and response['metadata'] == messages[0]['metadata']
+    assert len({message['metadata']['MsgId'] for message in messages}) == 3
+    assert sum(message['row_count'] for message in messages) == len(response['rows'])
+    for message in messages:
+        rows = response['rows'][message['first_row']:message['first_row'] + message['row_count']]
+        assert [row[2] for row in rows if row[1] == '/Document/FIToFICstmrCdtTrf/GrpHdr/MsgId'] == [message['metadata']['MsgId']]
+
+
+def test_client_errors(service):
+    responses = _exchange(
+        service,
+        _post('/xpath?name=bad.xml', b'<Document><Unclosed>'),
+        _post('/xsd-meta?lines=many', b'<xs:schema/>'),
+        _get('/nowhere'),
+        _get('/xpath'),
+    )
+    assert [status for status, _, _ in responses] == [400, 400, 404, 405]
+    assert 'bad.xml' in json.loads(responses[0][2])['error']
+    assert all(headers['connection'] == 'keep-alive' for _, headers, _ in responses)
+
+
+@pytest.mark.parametrize('request_bytes, status', [
+    (b"POST /xpath HTTP/1.1\r\nContent-Length: ten\r\n\r\n<Document/>", 400),
+    (b"POST /xpath HTTP/1.1\r\n\r\n<Document/>", 411),
+    (b"PUT /xpath HTTP/1.1\r\nContent-Length: 11\r\n\r\n<Document/>", 405),
+])
+def test_unread_body_is_rejected_and_closes(service, request_bytes, status):
+    # The body was not read, so the connection is out of sync and the next request is not answered
+    responses = _exchange(service, request_bytes, _get('/health'))
+    assert [(code, headers['connection']) for code, headers, _ in responses] == [(status, 'close')]
+
+
+def test_xsd_meta_accepts_a_zip(service):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('a.xsd', '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"/>')
+        zf.writestr('b.xsd', '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"/>')
+    (status, _, body), = _exchange(service, _post('/xsd-meta?lines=5', archive.getvalue()))
+    assert status == 200 and len(json.loads(body)['records']) == 2
+
+
+def test_schema_and_metrics(service):
+    schema, missing, health, metrics = _exchange(
+        service, _get('/schema?msg=pacs.009.001.08'), _get('/schema?msg=none'), _get('/health'), _get('/metrics'))
+    assert schema[0] == 200 and json.loads(schema[2])['elements']
+    assert missing[0] == 404
+    assert json.loads(health[2]) == {'status': 'ok', 'workers': 1}
+    assert metrics[0] == 200 and metrics[1]['content-type'].startswith('text/plain')
+    snapshot = service.snapshot()
+    assert snapshot['stages']['request:schema']['calls'] >= 2
+    assert snapshot['counters']['requests'] >= 3 and snapshot['counters']['errors'] >= 1
+    assert 'latency_p99_seconds_schema' in snapshot['gauges']
+
+
+class _InlinePool:
+    """Runs submitted batches synchronously and remembers their sizes."""
+
+    def __init__(self):
+        self.batches = []
+
+    def submit(self, fn, jobs):
+        self.batches.append(len(jobs))
+        future = Future()
+        future.set_result(fn(jobs))
+        return future
+
+
+@pytest.mark.parametrize('window, max_size, workers, expected', [
+    (0.0, 32, 2, [3, 3]),  # Same tick, spread over the workers
+    (0.0, 4, 1, [4, 2]),  # max_size flushes early
+    (0.01, 32, 1, [6]),
+])
+def test_batcher_groups_requests(window, max_size, workers, expected):
+    pool = _InlinePool()
+
+    async def submit_all():
+        batcher = Batcher(pool, window, max_size, workers)
+        futures = [batcher.submit(('schema', b'', {'msg': str(i)})) for i in range(6)]
+        return await asyncio.gather(*futures)
+    outcomes = asyncio.run(submit_all())
+    assert sorted(pool.batches, reverse=True) == expected
+    assert [status for status, _ in outcomes] == [404] * 6
+    assert outcomes == run_batch([('schema', b'', {'msg': str(i)}) for i in range(6)])
@@ -0,0 +1,220 @@
+"""Output sinks (swift_iso20022_toolbox/sinks.py): round-trips of every file format, the xlsx sheet rollover and partitions."""
+import csv
+import json
+import os
+import shutil
+import zipfile
+
+import pytest
+
+from swift_iso20022_toolbox import sinks
+from swift_iso20022_toolbox.sinks import (
+    ExcelSink,
+    PartitionedSink,
+    TextSink,
+    open_sinks,
+    output_path,
+    parse_formats,
+    parse_partition_keys,
+    partition_files,
+    read_manifest,
+)
+
+COLUMNS = ['XPath', 'Value', 'File']
+RECORDS = [
+    ('/Document/A', 'one', 'a.xml'),
+    ('/Document/B', 'comma, "quoted"', 'a.xml'),
+    ('/Document/C', 'é €', 'b.xml'),
+]
+
+
+def _write(output_file: str, formats: list, records=RECORDS, **kwargs) -> list:
+    with open_sinks(output_file, formats, COLUMNS, **kwargs) as sink:
+        sink.write_many(records)
+    return sink.files()
+
+
+def test_output_paths():
+    assert output_path('out/xpaths.txt', 'txt') == 'out/xpaths.txt'
+    assert output_path('out/xpaths.txt', 'csv') == 'out/xpaths.csv'
+    assert output_path('out/xpaths.txt', 'jsonl') == 'out/xpaths.jsonl'
+    assert output_path('out/xpaths.txt', 'xlsx') == 'out/xpaths.xlsx'
+    assert parse_formats(' TXT, csv ') == ['txt', 'csv']
+    with pytest.raises(ValueError, match="Unknown output format: 'pdf'"):
+        parse_formats('txt,pdf')
+
+
+def test_text_round_trip(tmp_path):
+    path = str(tmp_path / 'xpaths.txt')
+    assert _write(path, ['txt']) == [path]
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert lines == [' | '.join(COLUMNS)] + [' | '.join(record) for record in RECORDS]
+
+
+def test_text_with_labels(tmp_path):
+    path = str(tmp_path / 'xpaths.txt')
+    _write(path, ['txt'], with_labels=True)
+    with open(path, encoding='utf-8') as f:
+        assert f.read().splitlines()[1] == '/Document/A | Value: one | File: a.xml'
+
+
+def test_csv_and_jsonl_round_trip(tmp_path):
+    path = str(tmp_path / 'xpaths.txt')
+    files = _write(path, ['csv', 'jsonl'])
+    assert files == [str(tmp_path / 'xpaths.csv'), str(tmp_path / 'xpaths.jsonl')]
+    with open(files[0], encoding='utf-8', newline='') as f:
+        assert [tuple(row) for row in csv.reader(f)] == [tuple(COLUMNS)] + RECORDS
+    with open(files[1], encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == [dict(zip(COLUMNS, record)) for record in RECORDS]
+
+
+def test_xlsx_round_trip(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    pytest.importorskip('xlsxwriter')
+    path = str(tmp_path / 'xpaths.txt')
+    # Values that look like formulas, URLs or numbers stay strings
+    records = RECORDS + [('/Document/D', '=1+1', 'https://example.com'), ('/Document/E', '00123', 'c.xml')]
+    files = _write(path, ['xlsx'], records=records)
+    assert files == [str(tmp_path / 'xpaths.xlsx')]
+    workbook = openpyxl.load_workbook(files[0], read_only=True)
+    assert [tuple(row) for row in workbook['Sheet1'].iter_rows(values_only=True)] == [tuple(COLUMNS)] + records
+    workbook.close()
+
+
+def test_xlsx_rolls_over_to_new_sheets(tmp_path, monkeypatch):
+    openpyxl = pytest.importorskip('openpyxl')
+    pytest.importorskip('xlsxwriter')
+    monkeypatch.setattr(sinks, 'EXCEL_MAX_ROWS', 3)
+    path = str(tmp_path / 'xpaths.xlsx')
+    records = [(f'/Document/X{i}', str(i), 'a.xml') for i in range(5)]
+    with ExcelSink(path, COLUMNS, batch_size=2) as sink:
+        sink.write_many(records)
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    assert workbook.sheetnames == ['Sheet1', 'Sheet2', 'Sheet3']
+    sheets = [[tuple(row) for row in workbook[name].iter_rows(values_only=True)] for name in workbook.sheetnames]
+    workbook.close()
+    # Every sheet repeats the header, then holds at most EXCEL_MAX_ROWS - 1 records
+    assert all(rows[0] == tuple(COLUMNS) for rows in sheets)
+    assert [record for rows in sheets for record in rows[1:]] == records
+
+
+def test_xlsx_is_written_in_constant_memory(tmp_path):
+    pytest.importorskip('xlsxwriter')
+    path = str(tmp_path / 'xpaths.xlsx')
+    sink = ExcelSink(path, COLUMNS, batch_size=2)
+    sink.write_many(RECORDS[:2])  # One full batch: the header and two rows are written
+    # A constant-memory worksheet keeps only the current row: the earlier ones are already in its temporary file
+    assert sink.sheet.constant_memory and list(sink.sheet.table) == [2]
+    sink.close()
+    with zipfile.ZipFile(path) as zf:
+        assert 'xl/worksheets/sheet1.xml' in zf.namelist()
+
+
+def test_batches_and_no_empty_files(tmp_path):
+    path = str(tmp_path / 'xpaths.txt')
+    sink = TextSink(path, COLUMNS, batch_size=2)
+    sink.write(RECORDS[0])
+    assert sink.count == 1 and not os.path.exists(path)
+    sink.write(RECORDS[1])
+    assert sink.count == 2 and os.path.exists(path)
+    sink.close()
+    assert _write(str(tmp_path / 'empty.txt'), ['txt', 'csv', 'jsonl'], records=[]) == []
+    assert sorted(os.listdir(tmp_path)) == ['xpaths.txt']
+
+
+def test_console_echo_is_not_a_file(tmp_path, capsys):
+    path = str(tmp_path / 'xpaths.txt')
+    files = _write(path, ['txt'], console_title='Results', console_columns=2)
+    assert files == [path]
+    out = capsys.readouterr().out.splitlines()
+    assert out[1:4] == ['Results', 'XPath | Value', '/Document/A | one']
+
+
+PARTITION_COLUMNS = ['XPath', 'Value', 'XSD', 'CreDt']
+PARTITION_RECORDS = [
+    ('/Document/A', '1', 'pacs.008.001.08', '2025-06-10T09:00:00'),
+    ('/Document/B', '2', 'pacs.008.001.08', '2025-06-11T09:00:00'),
+    ('/Document/C', '3', 'camt.053.001.08', '2025-06-10T10:00:00'),
+    ('/Document/D', '4', 'pacs.008.001.08', '2025-06-10T23:59:59'),
+    ('/Document/E', '5', 'pacs.008.001.08', None),
+]
+
+
+def _partitioned(root: str, records=PARTITION_RECORDS, formats=('txt',), **kwargs) -> PartitionedSink:
+    sink = PartitionedSink(root, ['msg_type', 'credt'], list(formats), PARTITION_COLUMNS, **kwargs)
+    sink.write_many(records)
+    sink.close()
+    return sink
+
+
+def _values(paths: list) -> list:
+    values = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            values.extend(line.split(' | ')[1] for line in f.read().splitlines()[1:])
+    return sorted(values)
+
+
+def test_partition_manifest(tmp_path):
+    root = str(tmp_path / 'xpaths')
+    assert _partitioned(root, formats=('txt', 'csv')).count == 5
+    manifest = read_manifest(root)
+    assert manifest['partition_by'] == ['msg_type', 'credt'] and manifest['columns'] == PARTITION_COLUMNS
+    assert manifest['formats'] == ['csv', 'txt'] and manifest['rows'] == 5
+    assert [(entry['path'], entry['values'], entry['rows'], entry['files']) for entry in manifest['partitions']] == [
+        ('msg_type=camt.053/credt=2025-06-10', {'msg_type': 'camt.053', 'credt': '2025-06-10'}, 1,
+         ['part-00000.txt', 'part-00000.csv']),
+        ('msg_type=pacs.008/credt=2025-06-10', {'msg_type': 'pacs.008', 'credt': '2025-06-10'}, 2,
+         ['part-00000.txt', 'part-00000.csv']),
+        ('msg_type=pacs.008/credt=2025-06-11', {'msg_type': 'pacs.008', 'credt': '2025-06-11'}, 1,
+         ['part-00000.txt', 'part-00000.csv']),
+        ('msg_type=pacs.008/credt=__empty__', {'msg_type': 'pacs.008', 'credt': ''}, 1,
+         ['part-00000.txt', 'part-00000.csv']),
+    ]
+    for entry in manifest['partitions']:
+        for name in entry['files']:
+            assert os.path.isfile(os.path.join(root, *entry['path'].split('/'), name))
+
+
+def test_partition_pruning(tmp_path):
+    root = str(tmp_path / 'xpaths')
+    _partitioned(root)
+    assert _values(partition_files(root, msg_type='pacs.008', credt='2025-06-10')) == ['1', '4']
+    assert _values(partition_files(root, credt=['2025-06-10', '2025-06-11'])) == ['1', '2', '3', '4']
+    assert _values(partition_files(root, msg_type='camt.053')) == ['3']
+    assert partition_files(root, msg_type='pacs.009') == []
+    assert partition_files(root, fmt='csv') == []
+    with pytest.raises(ValueError, match='Not a partition key'):
+        partition_files(root, fr='BANKBEBB')
+
+
+def test_pruning_reads_only_the_manifest(tmp_path):
+    root = str(tmp_path / 'xpaths')
+    _partitioned(root)
+    # Partitions left out by the filters are never opened, so removing them changes nothing
+    shutil.rmtree(os.path.join(root, 'msg_type=camt.053'))
+    assert _values(partition_files(root, msg_type='pacs.008', credt='2025-06-11')) == ['2']
+
+
+def test_partition_parts_and_append(tmp_path, monkeypatch):
+    root = str(tmp_path / 'xpaths')
+    monkeypatch.setattr(sinks, 'MAX_OPEN_PARTITIONS', 1)
+    _partitioned(root, rows_per_file=1)
+    entry = read_manifest(root)['partitions'][1]
+    assert entry['rows'] == 2 and entry['files'] == ['part-00000.txt', 'part-00001.txt']
+    # A second run adds part files to the same partitions
+    _partitioned(root, records=PARTITION_RECORDS[:1])
+    manifest = read_manifest(root)
+    assert manifest['rows'] == 6 and manifest['partitions'][1]['files'][-1] == 'part-00002.txt'
+    assert _values(partition_files(root, msg_type='pacs.008', credt='2025-06-10')) == ['1', '1', '4']
+    with pytest.raises(ValueError, match='choose another output folder'):
+        PartitionedSink(root, ['xsd'], ['txt'], PARTITION_COLUMNS)
+
+
+def test_partition_keys():
+    assert parse_partition_keys('XSD, credt') == ['xsd', 'credt']
+    with pytest.raises(ValueError, match='Unknown partition key'):
+        parse_partition_keys('xsd,weekday')
+    with pytest.raises(ValueError, match='no Fr column'):
+        PartitionedSink('unused', ['fr'], ['txt'], PARTITION_COLUMNS)
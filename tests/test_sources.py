@@ -0,0 +1,29 @@
+"""Input sources (swift_iso20022_toolbox/sources.py): in-memory archives of uploaded files."""
+import glob
+import os
+
+from swift_iso20022_toolbox.benchmark import DEFAULT_XSD_FOLDER
+from swift_iso20022_toolbox.extract_xsd_versions import extract_xsd_records
+from swift_iso20022_toolbox.sources import memory_archive, read_sources
+
+
+def test_memory_archive_reads_back_every_file():
+    files = [('a.xsd', b'<a/>'), ('nested/b.xsd', b'<b/>'), ('notes.txt', b'skipped')]
+    assert [(name, content) for _, name, content in read_sources('uploads.zip', ('.xsd',), fileobj=memory_archive(files))] == \
+        [('a.xsd', b'<a/>'), ('b.xsd', b'<b/>')]
+
+
+def test_xsd_records_from_uploads_match_the_folder(tmp_path):
+    paths = sorted(glob.glob(os.path.join(DEFAULT_XSD_FOLDER, '*.xsd')))[:3]
+    for path in paths:
+        with open(path, 'rb') as src, open(tmp_path / os.path.basename(path), 'wb') as dst:
+            dst.write(src.read())
+
+    def uploads():
+        for path in paths:
+            with open(path, 'rb') as f:
+                yield os.path.basename(path), f.read()
+    from_memory = extract_xsd_records('uploads.zip', 100, fileobj=memory_archive(uploads()))
+    from_folder = extract_xsd_records(str(tmp_path), 100)
+    assert len(from_memory) == 3
+    assert sorted(from_memory, key=lambda record: record['file_name']) == sorted(from_folder, key=lambda record: record['file_name'])
@@ -0,0 +1,80 @@
+"""Extract store (swift_iso20022_toolbox/store.py): loading, lookups, read-only opening and `--store` with `--select`."""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+from swift_iso20022_toolbox import xml_to_xpath
+from swift_iso20022_toolbox.generate_messages import generate_corpus
+from swift_iso20022_toolbox.store import ExtractStore
+from swift_iso20022_toolbox.xml_to_xpath import parse_messages
+
+MSGID = '/Document/FIToFICstmrCdtTrf/GrpHdr/MsgId'
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    return generate_corpus(str(tmp_path / 'messages'), ['pacs.008', 'camt.053'], messages=2, entries=2)
+
+
+def _load(path: str, files: list) -> int:
+    store = ExtractStore(path)
+    count = store.add_all(message for file in files for message in parse_messages(file))
+    store.close()
+    return count
+
+
+def test_load_and_find(corpus, tmp_path):
+    path = str(tmp_path / 'extracts.db')
+    assert _load(path, corpus) == 4
+    store = ExtractStore(path, read_only=True)
+    pacs = store.find_messages(msg_type='pacs.008')
+    assert len(pacs) == 2 and {message['msg_type'] for message in pacs} == {'pacs.008'}
+    first = pacs[0]
+    assert store.find_messages(msgid=first['msgid'], msg_type='pacs.008') == [first]
+    assert store.find_messages(xpath_strip=MSGID, value=first['msgid']) == [first]
+    rows, *metadata = next(parse_messages(first['file']))
+    assert [tuple(field.values()) for field in store.message_fields(first['id'])] == [row[:3] for row in rows]
+    assert store.stats()['messages'] == 4
+    store.close()
+
+
+def test_reloading_a_file_replaces_its_messages(corpus, tmp_path):
+    path = str(tmp_path / 'extracts.db')
+    _load(path, corpus)
+    _load(path, corpus[:1])
+    store = ExtractStore(path, read_only=True)
+    assert store.stats()['messages'] == 4
+    assert len(store.find_messages(file=corpus[0])) == 1
+    store.close()
+
+
+def test_read_only_store_does_not_create_or_write(corpus, tmp_path):
+    missing = str(tmp_path / 'missing.db')
+    with pytest.raises(sqlite3.OperationalError):
+        ExtractStore(missing, read_only=True)
+    assert not os.path.exists(missing)
+    path = str(tmp_path / 'extracts.db')
+    _load(path, corpus[:1])
+    store = ExtractStore(path, read_only=True)
+    rows, *metadata = next(parse_messages(corpus[1]))
+    with pytest.raises(sqlite3.OperationalError):
+        store.add(rows, tuple(metadata))
+    store.close()
+
+
+def test_store_with_select_keeps_whole_messages(corpus, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / 'extracts.db')
+    monkeypatch.setattr(sys, 'argv', ['xml_to_xpath', str(tmp_path / 'messages'), 'out.txt', '--text-only', '--quiet',
+                                      '--select', MSGID, '--store', path])
+    xml_to_xpath.main()
+    with open(tmp_path / 'out.txt', encoding='utf-8') as f:
+        output = f.read().splitlines()[1:]
+    assert len(output) == 2 and all(f' | {MSGID} | ' in line for line in output)
+    store = ExtractStore(path, read_only=True)
+    assert store.stats()['messages'] == 4
+    message = store.find_messages(msg_type='pacs.008')[0]
+    assert len(store.message_fields(message['id'])) == len(next(parse_messages(message['file']))[0])
+    store.close()
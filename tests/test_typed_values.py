@@ -0,0 +1,65 @@
+"""Typed value columns (swift_iso20022_toolbox/typed_values.py) on the baseline XSDs."""
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from swift_iso20022_toolbox.typed_values import TypedValues, parse_decimal
+
+PACS008 = 'pacs.008.001.08'
+TX = '/Document/FIToFICstmrCdtTrf/CdtTrfTxInf'
+
+
+@pytest.fixture(scope='module')
+def typed():
+    return TypedValues()
+
+
+@pytest.mark.parametrize('xpath_strip, kind', [
+    (f'{TX}/IntrBkSttlmAmt', 'decimal'),
+    (f'{TX}/IntrBkSttlmAmt/@Ccy', 'code'),
+    (f'{TX}/IntrBkSttlmDt', 'date'),
+    ('/Document/FIToFICstmrCdtTrf/GrpHdr/CreDtTm', 'datetime'),
+    (f'{TX}/ChrgBr', 'code'),
+    ('/Document/FIToFICstmrCdtTrf/GrpHdr/MsgId', 'string'),
+    ('/AppHdr/CreDt', 'datetime'),
+    ('/Document/NoSuchElement', 'string'),
+])
+def test_kinds_from_xsd_simple_types(typed, xpath_strip, kind):
+    assert typed.kind(PACS008, xpath_strip) == kind
+
+
+def test_variants_of_a_message_are_merged(typed):
+    # Only in the pacs.009 COV guideline; the ADV guideline comes first in sorted order
+    assert typed.kind('pacs.009.001.08', '/Document/FICdtTrf/CdtTrfTxInf/UndrlygCstmrCdtTrf/InstdAmt') == 'decimal'
+    assert typed.kind('pacs.009.001.08', '/Document/FICdtTrf/CdtTrfTxInf/IntrBkSttlmAmt') == 'decimal'
+
+
+def test_convert_types_values_and_attaches_currency(typed):
+    rows = [(xpath, xpath, value, 'f.xml', 'f.xml') for xpath, value in [
+        (f'{TX}/IntrBkSttlmAmt', '1234.56'),
+        (f'{TX}/IntrBkSttlmAmt/@Ccy', 'EUR'),
+        (f'{TX}/IntrBkSttlmDt', '2025-06-01'),
+        ('/Document/FIToFICstmrCdtTrf/GrpHdr/CreDtTm', '2025-06-01T10:00:00.123Z'),
+        (f'{TX}/ChrgBr', 'SHAR'),
+        ('/Document/FIToFICstmrCdtTrf/GrpHdr/MsgId', 'MSG1'),
+    ]]
+    columns = typed.convert(rows, PACS008)
+    assert columns[0] == ('decimal', Decimal('1234.56'), None, None, None, 'EUR')
+    assert columns[1] == ('code', None, None, None, 'EUR', None)
+    assert columns[2][2] == date(2025, 6, 1)
+    assert columns[3][3] == datetime(2025, 6, 1, 10, 0, 0, 123000, tzinfo=timezone.utc)
+    assert columns[4][4] == 'SHAR'
+    assert columns[5] == ('string', None, None, None, None, None)
+
+
+def test_unconvertible_values_are_left_out(typed):
+    rows = [(f'{TX}/IntrBkSttlmAmt', f'{TX}/IntrBkSttlmAmt', value, 'f.xml', 'f.xml')
+            for value in ('NaN', 'Infinity', '1.123456789012', '12,5', '10.50')]
+    assert [columns[1] for columns in typed.convert(rows, PACS008)] == [None, None, None, None, Decimal('10.50')]
+
+
+def test_parse_decimal_keeps_trailing_zeros_beyond_scale():
+    assert parse_decimal('1.12345678900') == Decimal('1.123456789')
+    with pytest.raises(ValueError):
+        parse_decimal('1e40')
@@ -0,0 +1,92 @@
+"""Watch-folder ingestion (swift_iso20022_toolbox/watch.py): checkpoints, restarts and changed files."""
+import json
+import os
+from concurrent.futures import Future
+
+import pytest
+
+from swift_iso20022_toolbox.generate_messages import generate_corpus
+from swift_iso20022_toolbox.watch import MANIFEST_NAME, PARTITION_FILE_NAME, CheckpointManifest, WatchDaemon, _extract_file
+
+
+@pytest.fixture
+def folders(tmp_path):
+    inbound = tmp_path / 'inbound'
+    generate_corpus(str(inbound), ['pacs.008'], messages=3, entries=2)
+    return str(inbound), str(tmp_path / 'output')
+
+
+def _run_once(inbound, output):
+    daemon = WatchDaemon(inbound, output, workers=1, status_interval=3600)
+    daemon.run(once=True)
+    return daemon
+
+
+def _output_rows(output):
+    rows = []
+    for partition in sorted(os.listdir(output)):
+        path = os.path.join(output, partition, PARTITION_FILE_NAME)
+        if os.path.isfile(path):
+            with open(path, encoding='utf-8') as f:
+                rows.extend(f.read().splitlines()[1:])
+    return rows
+
+
+def _manifest(output):
+    with open(os.path.join(output, MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)['files']
+
+
+def test_restart_processes_only_new_and_changed_files(folders):
+    inbound, output = folders
+    daemon = _run_once(inbound, output)
+    assert daemon.inst.counters['files'] == 3
+    first_rows = _output_rows(output)
+    files = _manifest(output)
+    assert sorted(files) == sorted(os.path.join(inbound, name) for name in os.listdir(inbound))
+    assert sum(entry['rows'] for entry in files.values()) == len(first_rows)
+
+    # Nothing changed: a restart processes nothing
+    assert 'files' not in _run_once(inbound, output).inst.counters
+    assert _output_rows(output) == first_rows
+
+    changed = sorted(files)[0]
+    with open(changed, 'a', encoding='utf-8') as f:
+        f.write('\n')
+    daemon = _run_once(inbound, output)
+    assert daemon.inst.counters['files'] == 1
+    assert _manifest(output)[changed]['signature'] == [os.path.getsize(changed), os.stat(changed).st_mtime_ns]
+
+
+def test_file_changed_while_processed_is_queued_again(folders):
+    inbound, output = folders
+    daemon = WatchDaemon(inbound, output, workers=1)
+    path = os.path.join(inbound, sorted(os.listdir(inbound))[0])
+    future = Future()
+    future.set_result(_extract_file(path, True))
+    # The job was submitted before the file was rewritten
+    daemon.in_flight[future] = (path, [0, 0])
+    daemon.collect(timeout=0)
+    assert daemon.manifest.files[path]['signature'] == [0, 0]
+    assert list(daemon.backlog) == [path]
+    daemon.writer.close()
+
+
+def test_manifest_save_is_atomic(tmp_path, monkeypatch):
+    path = str(tmp_path / MANIFEST_NAME)
+    manifest = CheckpointManifest(path)
+    manifest.record('/in/a.xml', [1, 2], 10, '2025-01-01')
+    manifest.save()
+    assert not manifest.dirty
+
+    def failing_dump(*args, **kwargs):
+        raise OSError('disk full')
+    monkeypatch.setattr(json, 'dump', failing_dump)
+    manifest.record('/in/b.xml', [3, 4], 5, '2025-01-01')
+    with pytest.raises(OSError):
+        manifest.save()
+    monkeypatch.undo()
+    # The previous checkpoint is intact
+    assert list(CheckpointManifest(path).files) == ['/in/a.xml']
+    assert os.listdir(tmp_path) == [MANIFEST_NAME]
+    assert manifest.dirty
@@ -0,0 +1,42 @@
+"""XML parser backends (swift_iso20022_toolbox/xml_backends.py) return the same rows and metadata."""
+import os
+
+import pytest
+
+from swift_iso20022_toolbox import sources
+from swift_iso20022_toolbox.benchmark import DEFAULT_EDGE_CASE_FOLDER, check_backends
+from swift_iso20022_toolbox.generate_messages import generate_corpus
+from swift_iso20022_toolbox.xml_backends import available_backends
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    folder = str(tmp_path_factory.mktemp('corpus'))
+    paths = generate_corpus(folder, messages=2, entries=20, seed=0)
+    paths += generate_corpus(folder, ['pacs.008'], messages=50, per_file=50, seed=0)
+    return folder, paths
+
+
+def test_backends_match_etree_on_corpus_and_edge_cases(corpus):
+    edge_cases = sorted(os.path.join(DEFAULT_EDGE_CASE_FOLDER, name) for name in os.listdir(DEFAULT_EDGE_CASE_FOLDER))
+    result = check_backends(corpus[1] + edge_cases)
+    assert 'etree' in result['backends'] and 'expat' in result['backends']
+    assert result['mismatches'] == []
+
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_split_bulk_messages_match_streamed_messages(corpus, backend, monkeypatch):
+    bulk = [path for path in corpus[1] if '_bulk_' in path][0]
+    expected = list(sources.parse_sources(bulk, backend=backend))
+    # Split the bulk file into message batches for the workers, whatever its size
+    monkeypatch.setattr(sources, 'BULK_SPLIT_BYTES', 0)
+    assert list(sources.parse_sources(bulk, workers=2, backend=backend)) == expected
+
+
+@pytest.mark.parametrize('name', ['split_parents.xml', 'prefixed_batch.xml', 'documents_only.xml', 'root_document.xml',
+                                  'latin1.xml'])
+def test_split_edge_cases_match_streamed_messages(name, monkeypatch):
+    path = os.path.join(DEFAULT_EDGE_CASE_FOLDER, name)
+    expected = list(sources.parse_sources(path))
+    monkeypatch.setattr(sources, 'BULK_SPLIT_BYTES', 0)
+    assert list(sources.parse_sources(path, workers=2)) == expected